@@ -1,12 +1,16 @@
 from decimal import Decimal
 
 from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
 from django.utils.translation import ngettext
 
+from .listings import listing_key, rebuild_listings, refresh_listings
 from .models import (
     Auction,
     Bid,
     Category,
+    EditionLot,
     Item,
     ItemCollaborator,
     ItemFile,
@@ -60,27 +64,40 @@ class TokenAdmin(admin.ModelAdmin):
         "on_sale",
     )
     readonly_fields = ["owner_name"]
+    ordering = ("collectible", "owner", "on_sale", "token_number")
     actions = ["remove_from_sale"]
 
     def get_queryset(self, request):
         return self.model.objects.with_supply()
 
+    def save_model(self, request, obj, form, change):
+        keys = [listing_key(obj)]
+        if change:
+            keys.insert(0, listing_key(Token.objects.get(pk=obj.pk)))
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            refresh_listings(keys)
+
+    def delete_model(self, request, obj):
+        key = listing_key(obj)
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            refresh_listings([key])
+
+    @transaction.atomic
     def remove_from_sale(self, request, queryset):
-        token_list = []
-        auction_ids = []
-        for token in queryset:
-            if token.sell_type == ItemSellType.AUCTION.value and token.auction:
-                auction_ids.append(token.auction.id)
-                token.auction = None
-            token.on_sale = False
-            token.price = Decimal("0.00")
-            token.sell_type = ItemSellType.NONE.value
-            token_list.append(token)
-
+        tokens = Token.objects.filter(pk__in=queryset.values("pk"))
+        auction_ids = list(tokens.filter(auction__isnull=False).values_list("auction_id", flat=True))
+        collectible_ids = set(tokens.values_list("collectible_id", flat=True).order_by().distinct())
+        off_sale = {"on_sale": False, "price": Decimal("0.00"), "sell_type": ItemSellType.NONE.value}
+        # Only the selected tokens leave the sale. Editions of their listings still held in lots stay
+        # on sale, and rebuilding the listings splits one out to represent a listing left without tokens.
+        # Detach the tokens before deleting their auctions, which would otherwise cascade to them.
+        updated_count = tokens.update(auction=None, updated_at=timezone.now(), **off_sale)
+        Item.objects.filter(pk__in=collectible_ids).mark_modified()
         if auction_ids:
             Auction.objects.filter(id__in=auction_ids).delete()
-        Token.objects.bulk_update(token_list, ["auction", "on_sale", "price", "sell_type"], batch_size=1000)
-        updated_count = len(token_list)
+        rebuild_listings(collectible_ids)
 
         self.message_user(
             request,
@@ -96,6 +113,30 @@ class TokenAdmin(admin.ModelAdmin):
     remove_from_sale.short_description = "Remove from sale"
 
 
+class EditionLotAdmin(admin.ModelAdmin):
+    list_display = (
+        "collectible",
+        "first_mint_id",
+        "first_token_number",
+        "count",
+        "owner",
+        "price",
+        "sell_type",
+        "on_sale",
+    )
+    ordering = ("collectible", "owner", "on_sale", "first_token_number")
+
+    # Lots are split into tokens by items.lots, which keeps the listings in step.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 class BidAdmin(admin.ModelAdmin):
     list_display = ["created_at", "bidder"]
     readonly_fields = ("created_at",)
@@ -107,6 +148,7 @@ class AuctionAdmin(admin.ModelAdmin):
         "start_date",
         "starting_bidding_price",
         "current_bidding_price",
+        "bid_count",
     )
 
     def item_title(self, obj):
@@ -118,5 +160,6 @@ class AuctionAdmin(admin.ModelAdmin):
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Item, ItemAdmin)
 admin.site.register(Token, TokenAdmin)
+admin.site.register(EditionLot, EditionLotAdmin)
 admin.site.register(Auction, AuctionAdmin)
 admin.site.register(Bid, BidAdmin)
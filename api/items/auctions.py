@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache
+from .listings import listing_key, refresh_listings
+from .models import Auction, AuctionStatus, Item, ItemSellType, Listing, Token
+
+
+def settle_auction(auction, token=None):
+    """
+    Transfers an ended auction's token to the highest bidder and takes it off sale.
+
+    The auction and token rows must already be locked by the caller, in that order.
+
+    returns: The settled token, or None if the auction has no token.
+    rtype: Token
+    """
+    if token is not None:
+        previous_key = listing_key(token)
+        if auction.highest_bid_id:
+            token.owner_id = auction.highest_bidder_id
+        token.on_sale = False
+        token.is_sold = True
+        token.auction = None
+        token.sell_type = ItemSellType.NONE.value
+        token.price = 0
+        token.save()
+        refresh_listings([previous_key, listing_key(token)])
+
+    auction.status = AuctionStatus.SETTLED.value
+    auction.save(update_fields=["status", "updated_at"])
+    return token
+
+
+def start_due_auctions(batch_size, now=None):
+    """
+    Flips one batch of scheduled auctions whose start date has passed to live.
+
+    Rows locked by another worker are skipped, so several workers can run at once.
+
+    returns: Number of auctions started.
+    rtype: int
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        auction_ids = list(
+            Auction.objects.select_for_update(skip_locked=True)
+            .filter(status=AuctionStatus.SCHEDULED.value, start_date__lte=now, end_date__gt=now)
+            .order_by("start_date")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if auction_ids:
+            Auction.objects.filter(id__in=auction_ids).update(status=AuctionStatus.LIVE.value, updated_at=now)
+            Item.objects.filter(sold_set__auction_id__in=auction_ids).mark_modified()
+            Listing.objects.filter(token__auction_id__in=auction_ids, on_sale=True).update(is_live=True)
+            cache.bump(cache.TOKENS, cache.ITEMS)
+    return len(auction_ids)
+
+
+def finalize_ended_auctions(batch_size, now=None):
+    """
+    Settles one batch of auctions whose end date has passed.
+
+    Rows locked by another worker, or by a user finalizing through the API, are skipped.
+
+    returns: Number of auctions settled.
+    rtype: int
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        auctions = list(
+            Auction.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(status__in=[AuctionStatus.SCHEDULED.value, AuctionStatus.LIVE.value], end_date__lt=now)
+            .select_related("highest_bid")
+            .order_by("end_date")[:batch_size]
+        )
+        tokens = {
+            token.auction_id: token
+            for token in Token.objects.select_for_update().filter(auction__in=auctions).order_by("id")
+        }
+        for auction in auctions:
+            settle_auction(auction, tokens.get(auction.id))
+    return len(auctions)
@@ -0,0 +1,84 @@
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+from utils.replicas import reads_from
+
+# Namespaces of cached responses. A response is stored under the current version of
+# every namespace it reads, so bumping one version invalidates all of them at once.
+TOKENS = "tokens"
+ITEMS = "items"
+CATEGORIES = "categories"
+
+
+def _version_key(namespace):
+    return f"cache-version:{namespace}"
+
+
+def _versions(namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, 1, timeout=None)
+            versions[key] = cache.get(key, 1)
+    return ".".join(str(versions[key]) for key in keys)
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.set(_version_key(namespace), 1, timeout=None)
+
+
+def bump(*namespaces):
+    """
+    Invalidates every cached response stored under the given namespaces.
+
+    The version is bumped once the current transaction commits, so a concurrent
+    read can't cache the data from before the write under the new version.
+    """
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def _response_key(request, namespaces):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f"{request.build_absolute_uri(request.path)}?{query}"
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f"response:{'.'.join(namespaces)}:{_versions(namespaces)}:{digest}"
+
+
+def cache_anonymous_response(*namespaces):
+    """
+    Caches the data of successful anonymous GET responses of a view method,
+    keyed by the normalized query parameters and the namespace versions. Misses are served
+    from the primary: a lagging replica's data would be stored under versions bumped after it.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view_method(self, request, *args, **kwargs)
+
+            key = _response_key(request, namespaces)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            with reads_from(None):
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
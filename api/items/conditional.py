@@ -0,0 +1,62 @@
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .likes import Like, get_like_buffer
+from .models import Item, Token
+
+
+def items_version(items, user=None):
+    """
+    Reads the items' modified_at and like counts, and which of them `user` likes, in one query.
+    Likes don't write the items until they are flushed, so the version adds the buffered changes.
+
+    returns: The latest modified_at, or None if there are no items, and a version of the likes.
+    rtype: tuple[datetime, str]
+    """
+    if user is not None and user.is_authenticated:
+        is_liked = Exists(Like.objects.filter(item_id=OuterRef("pk"), user_id=user.pk))
+    else:
+        is_liked = Value(False, output_field=BooleanField())
+    rows = sorted(items.annotate(is_liked=is_liked).values_list("pk", "modified_at", "likes_count", "is_liked"))
+    pending = get_like_buffer().pending([row[0] for row in rows])
+    likes = ".".join(f"{max(count + pending[pk], 0)}{'l' if liked else ''}" for pk, _, count, liked in rows)
+    return max((row[1] for row in rows), default=None), likes
+
+
+def conditional_on_items(get_items, per_user=False):
+    """
+    Answers If-None-Match / If-Modified-Since on a view method with 304 from the
+    items' version, before the view loads or serializes anything.
+
+    `get_items(request, **kwargs)` returns the Item queryset the response is built from.
+    Set `per_user` when the response differs per authenticated user.
+    """
+
+    def version(request, **kwargs):
+        if not hasattr(request, "_items_version"):
+            user = request.user if per_user else None
+            request._items_version = items_version(get_items(request, **kwargs), user)
+        return request._items_version
+
+    def last_modified(request, *args, **kwargs):
+        return version(request, **kwargs)[0]
+
+    def etag(request, *args, **kwargs):
+        modified, likes = version(request, **kwargs)
+        if modified is None:
+            return None
+        etag = f"{modified.timestamp():.6f}-{likes}"
+        if per_user and request.user.is_authenticated:
+            etag = f"{etag}-{request.user.pk}"
+        return etag
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified))
+
+
+def item_by_pk(request, pk, **kwargs):
+    return Item.objects.filter(pk=pk)
+
+
+def item_by_token_pk(request, pk, **kwargs):
+    return Item.objects.filter(pk__in=Token.objects.filter(pk=pk).values("collectible_id"))
@@ -0,0 +1,81 @@
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Responses a client is expected to retry; they are not stored against the key.
+RETRIABLE_STATUS_CODES = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+def _is_retriable(response):
+    return response.status_code in RETRIABLE_STATUS_CODES or response.status_code >= 500
+
+
+def idempotent(view_method):
+    """
+    Replays the stored response when an authenticated request repeats its `Idempotency-Key` header.
+
+    The key row is inserted in the same transaction as the view's writes, so
+    a concurrent duplicate waits on the unique index and then replays the first
+    request's response instead of running the view a second time.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return Response(
+                data={IDEMPOTENCY_HEADER: ["Key must be at most 255 characters"]}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        request_path = f"{request.method} {request.path}"
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(user=request.user, key=key, request_path=request_path)
+            except IntegrityError:
+                return _replay(IdempotencyKey.objects.get(user=request.user, key=key), request_path)
+
+            response = view_method(self, request, *args, **kwargs)
+            if _is_retriable(response):
+                transaction.set_rollback(True)
+                return response
+
+            record.status_code = response.status_code
+            record.response_data = response.data
+            record.save(update_fields=["status_code", "response_data"])
+            return response
+
+    return wrapper
+
+
+def _replay(record, request_path):
+    if record.request_path != request_path:
+        return Response(
+            data={IDEMPOTENCY_HEADER: ["Key was already used for a different request"]},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(data=record.response_data, status=record.status_code, headers={REPLAYED_HEADER: "true"})
+
+
+def purge_expired_keys():
+    """
+    Deletes stored responses older than IDEMPOTENCY_KEY_TTL.
+
+    returns: Number of deleted keys.
+    rtype: int
+    """
+    expired = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - settings.IDEMPOTENCY_KEY_TTL)
+    deleted, _ = expired.delete()
+    return deleted
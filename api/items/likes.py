@@ -0,0 +1,275 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import cache
+from .models import Item, LikeFlush, Listing, Token
+
+Like = Item.likes.through
+
+
+class LocalLikeBuffer:
+    """
+    In-process stand-in for RedisLikeBuffer, for caches other than Redis such as the local
+    memory cache of development and tests. No other process sees it, so the process that
+    buffers the changes flushes them itself, at most every LIKE_FLUSH_SECONDS.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def add(self, item_id, delta):
+        with self.lock:
+            self.deltas[item_id] += delta
+
+    def pending(self, item_ids):
+        with self.lock:
+            buffers = [self.deltas, *self.claimed.values()]
+            return {item_id: sum(deltas[item_id] for deltas in buffers) for item_id in item_ids}
+
+    def is_due(self):
+        return time.monotonic() - self.claimed_at >= settings.LIKE_FLUSH_SECONDS
+
+    def claim(self):
+        with self.lock:
+            self.claimed_at = time.monotonic()
+            if self.deltas:
+                self.claimed[uuid.uuid4().hex], self.deltas = self.deltas, Counter()
+
+    def claims(self):
+        with self.lock:
+            return list(self.claimed)
+
+    def claimed_deltas(self, key):
+        with self.lock:
+            return dict(self.claimed.get(key, {}))
+
+    def release(self, key):
+        with self.lock:
+            self.claimed.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.deltas, self.claimed, self.claimed_at = Counter(), {}, time.monotonic()
+
+
+class RedisLikeBuffer:
+    """
+    Buffers like count changes in a Redis hash of item id to delta, shared by every process.
+    A flush claims the hash by renaming it to a key of its own, so likes made while it runs
+    start a new one and concurrent flushes never claim the same changes.
+    """
+
+    PENDING = "likes:pending"
+    # Set of the claimed hashes that aren't released yet
+    CLAIMS = "likes:claims"
+    CLAIM_SCRIPT = """
+        if redis.call("EXISTS", KEYS[1]) == 0 then
+            return 0
+        end
+        redis.call("RENAME", KEYS[1], ARGV[1])
+        redis.call("SADD", KEYS[2], ARGV[1])
+        return 1
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def add(self, item_id, delta):
+        self.client.hincrby(self.PENDING, item_id, delta)
+
+    def pending(self, item_ids):
+        item_ids = list(item_ids)
+        if not item_ids:
+            return {}
+        pipeline = self.client.pipeline(transaction=False)
+        for key in [self.PENDING, *self.claims()]:
+            pipeline.hmget(key, item_ids)
+        counts = {item_id: 0 for item_id in item_ids}
+        for deltas in pipeline.execute():
+            for item_id, delta in zip(item_ids, deltas):
+                counts[item_id] += int(delta or 0)
+        return counts
+
+    def is_due(self):
+        return False
+
+    def claim(self):
+        self.client.eval(self.CLAIM_SCRIPT, 2, self.PENDING, self.CLAIMS, f"likes:claim:{uuid.uuid4().hex}")
+
+    def claims(self):
+        return [key.decode() if isinstance(key, bytes) else key for key in self.client.smembers(self.CLAIMS)]
+
+    def claimed_deltas(self, key):
+        return {int(item_id): int(delta) for item_id, delta in self.client.hgetall(key).items()}
+
+    def release(self, key):
+        pipeline = self.client.pipeline()
+        pipeline.delete(key)
+        pipeline.srem(self.CLAIMS, key)
+        pipeline.execute()
+
+    def clear(self):
+        self.client.delete(self.PENDING, self.CLAIMS, *self.claims())
+
+
+_local_buffer = LocalLikeBuffer()
+
+
+def get_like_buffer():
+    if settings.CACHES["default"]["BACKEND"].startswith("django_redis."):
+        from django_redis import get_redis_connection
+
+        return RedisLikeBuffer(get_redis_connection("default"))
+    return _local_buffer
+
+
+def record_likes(deltas):
+    """
+    Buffers like count changes, by item id, once the current transaction commits.
+    """
+    deltas = {item_id: delta for item_id, delta in deltas.items() if delta}
+
+    def add():
+        buffer = get_like_buffer()
+        for item_id, delta in deltas.items():
+            buffer.add(item_id, delta)
+        if buffer.is_due():
+            flush_likes()
+
+    if deltas:
+        transaction.on_commit(add)
+
+
+def likes_counts(item_ids):
+    """
+    returns: The flushed like count of each item plus its buffered changes.
+    rtype: dict[int, int]
+    """
+    pending = get_like_buffer().pending(item_ids)
+    counts = Item.objects.filter(pk__in=item_ids).values_list("pk", "likes_count")
+    return {item_id: max(count + pending[item_id], 0) for item_id, count in counts}
+
+
+def apply_likes(deltas, batch_size):
+    """
+    Adds like count changes to Item.likes_count, advancing the items' modified_at, and copies
+    the counts onto the items' listings, batch_size items per UPDATE.
+    """
+    deltas = [(item_id, delta) for item_id, delta in deltas.items() if delta]
+    for start in range(0, len(deltas), batch_size):
+        batch = deltas[start : start + batch_size]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Item._meta.db_table} "
+                "SET likes_count = GREATEST(likes_count + changes.delta, 0), modified_at = %s "
+                f"FROM (VALUES {', '.join(['(%s, %s)'] * len(batch))}) AS changes (id, delta) "
+                f"WHERE {Item._meta.db_table}.id = changes.id",
+                [timezone.now(), *(value for change in batch for value in change)],
+            )
+        counts = Item.objects.filter(pk=OuterRef("collectible_id")).values("likes_count")
+        Listing.objects.filter(collectible_id__in=[item_id for item_id, _ in batch]).update(likes=Subquery(counts))
+
+
+def flush_likes(batch_size=1000):
+    """
+    Claims the buffered like count changes and applies them, along with any claimed by an
+    earlier flush that didn't finish. Each claim is recorded as a LikeFlush in the
+    transaction that applies it, so it's applied once however often it's flushed.
+
+    The feed caches are invalidated once per flush rather than once per like.
+
+    returns: Number of items whose like count changed.
+    rtype: int
+    """
+    buffer = get_like_buffer()
+    buffer.claim()
+    item_ids = set()
+    for key in buffer.claims():
+        deltas = buffer.claimed_deltas(key)
+        with transaction.atomic():
+            # A concurrent flush of the same claim waits here until the first one commits.
+            _, created = LikeFlush.objects.get_or_create(key=key)
+            if created:
+                apply_likes(deltas, batch_size)
+                item_ids.update(item_id for item_id, delta in deltas.items() if delta)
+        buffer.release(key)
+    if item_ids:
+        cache.bump(cache.TOKENS, cache.ITEMS)
+    LikeFlush.objects.filter(created_at__lt=timezone.now() - timedelta(days=1)).delete()
+    return len(item_ids)
+
+
+class LikesCountField(serializers.Field):
+    """
+    Serializes an item's flushed like count plus its buffered changes. The changes of every
+    item of the serialized page are read from the buffer at once, with the first of them.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(source="*", read_only=True, **kwargs)
+
+    def page_item_ids(self):
+        instances = self.root.instance or []
+        if isinstance(instances, (Item, Token)):
+            instances = [instances]
+        ids = set()
+        for instance in instances:
+            if isinstance(instance, Token):
+                ids.add(instance.collectible_id)
+            elif isinstance(instance, Item):
+                ids.add(instance.pk)
+        return ids
+
+    def to_representation(self, item):
+        pending = self.context.setdefault("pending_likes", {})
+        if item.pk not in pending:
+            pending.update(get_like_buffer().pending(self.page_item_ids() | {item.pk}))
+        return max(item.likes_count + pending[item.pk], 0)
+
+
+def liked_item_ids(user, item_ids):
+    """
+    returns: Which of `item_ids` the user liked, in one query.
+    rtype: set[int]
+    """
+    if not user.is_authenticated:
+        return set()
+    return set(Like.objects.filter(user_id=user.id, item_id__in=item_ids).values_list("item_id", flat=True))
+
+
+def toggle_like(item_id, user_id):
+    """
+    Unlikes the item if the user liked it and likes it otherwise, with a DELETE and, when it
+    deletes nothing, an INSERT ... ON CONFLICT instead of reading the like first. The like count
+    change is buffered until the next flush_likes and the item row is not written, so likes of
+    a popular item don't queue on it. Must be called inside a transaction.
+
+    returns: Whether the item is now liked, or None if it doesn't exist.
+    rtype: bool
+    """
+    if Like.objects.filter(item_id=item_id, user_id=user_id).delete()[0]:
+        liked, delta = False, -1
+    else:
+        with connection.cursor() as cursor:
+            # Selecting from the item table inserts nothing for missing items.
+            cursor.execute(
+                f"INSERT INTO {Like._meta.db_table} (item_id, user_id) "
+                f"SELECT id, %s FROM {Item._meta.db_table} WHERE id = %s ON CONFLICT DO NOTHING",
+                [user_id, item_id],
+            )
+            delta = cursor.rowcount
+        if not delta and not Item.objects.filter(pk=item_id).exists():
+            return None
+        liked = True
+    record_likes({item_id: delta})
+    return liked
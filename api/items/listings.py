@@ -0,0 +1,166 @@
+from django.db import connections, router
+from django.db.models import Count, F, Sum
+
+from . import cache
+from .lots import group_lots, lot_supply, take_editions
+from .models import AuctionStatus, EditionLot, Item, ItemSellType, Listing, Token
+
+
+def listing_key(token):
+    """
+    Returns the (collectible, owner, on_sale) group a token is listed under.
+    """
+    return (token.collectible_id, token.owner_id, token.on_sale)
+
+
+def _current_price(token):
+    if token.auction is not None:
+        return token.auction.current_bidding_price
+    return token.price
+
+
+def _is_live(token):
+    if not token.on_sale:
+        return False
+    if token.sell_type != ItemSellType.AUCTION.value:
+        return True
+    return token.auction is not None and token.auction.status == AuctionStatus.LIVE.value
+
+
+def _head_fields(token):
+    return {
+        "sell_type": token.sell_type,
+        "price": token.price,
+        "current_price": _current_price(token),
+        "is_live": _is_live(token),
+    }
+
+
+def _listing_fields(token, supply, likes):
+    return {"token": token, "supply": supply, "likes": likes, **_head_fields(token)}
+
+
+def _count_likes(collectible_id):
+    # The count as of the last items.likes flush, which copies it onto the listings
+    return Item.objects.filter(pk=collectible_id).values_list("likes_count", flat=True).first() or 0
+
+
+def refresh_listing(collectible_id, owner_id, on_sale):
+    """
+    Recomputes the listing row of a single (collectible, owner, on_sale) group.
+
+    Must be called inside the transaction that changed the group's tokens.
+
+    returns: The refreshed listing, or None if the group no longer has tokens.
+    rtype: Listing
+    """
+    group = {"collectible_id": collectible_id, "owner_id": owner_id, "on_sale": on_sale}
+    # Lock the row before reading the tokens so concurrent refreshes of a group see each other's commits.
+    list(Listing.objects.select_for_update().filter(**group).values_list("pk", flat=True))
+
+    tokens = Token.objects.filter(**group)
+    lots = EditionLot.objects.filter(**group)
+    head = tokens.select_related("auction").order_by("token_number", "id").first()
+    if head is None:
+        # A group whose remaining editions are all in lots is represented by the first of them.
+        head = next(iter(take_editions(lots)), None)
+    if head is None:
+        Listing.objects.filter(**group).delete()
+        return None
+
+    # The head token may have just moved here from a group that is refreshed after this one.
+    Listing.objects.filter(token=head).exclude(**group).delete()
+    listing, _ = Listing.objects.update_or_create(
+        defaults=_listing_fields(head, tokens.count() + lot_supply(lots), _count_likes(collectible_id)),
+        **group,
+    )
+    return listing
+
+
+def take_from_listing(collectible_id, owner_id, on_sale, token_id):
+    """
+    Takes a token that just left its (collectible, owner, on_sale) group out of the group's listing.
+
+    The supply is decremented in a single UPDATE instead of rebuilding the row from the group's
+    tokens. The UPDATE still locks the listing row until the transaction commits, so purchases
+    of one listing take turns one transaction at a time, and the work after this call lengthens
+    every other buyer's wait. The head is recomputed only if it was the token taken, and moves
+    to the first edition no other buyer is holding. Must be called inside the transaction that
+    moved the token.
+    """
+    group = {"collectible_id": collectible_id, "owner_id": owner_id, "on_sale": on_sale}
+    listing = Listing.objects.filter(**group, supply__gt=1)
+    if listing.exclude(token_id=token_id).update(supply=F("supply") - 1):
+        return
+
+    using = router.db_for_write(Listing)
+    quote = connections[using].ops.quote_name
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {quote(Listing._meta.db_table)} SET supply = supply - 1, token_id = COALESCE((
+                SELECT id FROM {quote(Token._meta.db_table)}
+                WHERE collectible_id = %s AND owner_id = %s AND on_sale = %s
+                ORDER BY token_number, id LIMIT 1 FOR SHARE SKIP LOCKED
+            ), token_id)
+            WHERE collectible_id = %s AND owner_id = %s AND on_sale = %s AND supply > 1 AND token_id = %s
+            RETURNING id, token_id
+            """,
+            [collectible_id, owner_id, on_sale, collectible_id, owner_id, on_sale, token_id],
+        )
+        row = cursor.fetchone()
+    if row is None or row[1] == token_id:
+        # The last edition was taken, or every remaining one is held by other buyers.
+        refresh_listing(**group)
+        return
+    pk, head_id = row
+    Listing.objects.filter(pk=pk).update(**_head_fields(Token.objects.select_related("auction").get(pk=head_id)))
+
+
+def refresh_listings(keys):
+    """
+    Recomputes the listing rows of every (collectible, owner, on_sale) key given.
+    """
+    for key in dict.fromkeys(keys):
+        refresh_listing(*key)
+
+
+def rebuild_listings(collectible_ids):
+    """
+    Rebuilds every listing row of the given collectibles from their tokens and lots.
+
+    Used by the bulk write paths (minting, admin actions) where refreshing
+    group by group would cost one round trip per token.
+    """
+    collectible_ids = list(collectible_ids)
+    Listing.objects.filter(collectible_id__in=collectible_ids).delete()
+
+    tokens = Token.objects.filter(collectible_id__in=collectible_ids)
+    supplies = {
+        (row["collectible"], row["owner"], row["on_sale"]): row["supply"]
+        for row in tokens.order_by().values("collectible", "owner", "on_sale").annotate(supply=Count("pk"))
+    }
+    lots = EditionLot.objects.filter(collectible_id__in=collectible_ids).order_by()
+    for row in lots.values("collectible", "owner", "on_sale").annotate(supply=Sum("count")):
+        key = (row["collectible"], row["owner"], row["on_sale"])
+        if key not in supplies:
+            # A group whose editions are all in lots is represented by the first of them.
+            take_editions(group_lots(*key))
+        supplies[key] = supplies.get(key, 0) + row["supply"]
+    likes = dict(Item.objects.filter(pk__in=collectible_ids).values_list("pk", "likes_count"))
+    heads = (
+        tokens.select_related("auction")
+        .order_by("collectible", "owner", "on_sale", "token_number", "id")
+        .distinct("collectible", "owner", "on_sale")
+    )
+    listings = [
+        Listing(
+            collectible_id=head.collectible_id,
+            owner_id=head.owner_id,
+            on_sale=head.on_sale,
+            **_listing_fields(head, supplies[listing_key(head)], likes.get(head.collectible_id, 0)),
+        )
+        for head in heads
+    ]
+    Listing.objects.bulk_create(listings, batch_size=1000)
+    cache.bump(cache.TOKENS, cache.ITEMS)
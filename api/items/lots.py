@@ -0,0 +1,74 @@
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import EditionLot, Item, Token
+
+
+def group_lots(collectible_id, owner_id, on_sale):
+    """
+    returns: The lots of a (collectible, owner, on_sale) listing group.
+    rtype: EditionLot QuerySet
+    """
+    return EditionLot.objects.filter(collectible_id=collectible_id, owner_id=owner_id, on_sale=on_sale)
+
+
+def lot_supply(lots):
+    """
+    returns: Number of editions in `lots`.
+    rtype: int
+    """
+    return lots.aggregate(count=Sum("count"))["count"] or 0
+
+
+def take_editions(lots, count=1, skip_locked=False):
+    """
+    Turns up to `count` editions from the front of the first of `lots` into tokens.
+    Must be called inside a transaction.
+
+    returns: The created tokens; none if there are no lots or, with `skip_locked`, if every lot is locked.
+    rtype: list[Token]
+    """
+    lot = lots.select_for_update(skip_locked=skip_locked).order_by("first_token_number").first()
+    if lot is None:
+        return []
+    count = min(count, lot.count)
+    tokens = Token.objects.bulk_create(
+        [lot.token(number) for number in range(lot.first_token_number, lot.first_token_number + count)]
+    )
+    if count == lot.count:
+        lot.delete()
+    else:
+        lot.first_token_number += count
+        lot.first_mint_id += count
+        lot.count -= count
+        lot.save(update_fields=["first_token_number", "first_mint_id", "count", "updated_at"])
+    return tokens
+
+
+def move_editions(lots, limit=None, **fields):
+    """
+    Applies `fields` to the first `limit` editions of `lots` in token number order, or all of
+    them, splitting the lot that straddles `limit`. Must be called inside a transaction.
+
+    returns: Number of editions changed.
+    rtype: int
+    """
+    moved, whole = 0, []
+    for lot in lots.select_for_update().order_by("first_token_number"):
+        if limit is not None and moved + lot.count > limit:
+            part = lot.run(lot.first_token_number, lot.first_token_number + limit - moved)
+            if part.count:
+                for name, value in fields.items():
+                    setattr(part, name, value)
+                part.save()
+                lot.first_token_number += part.count
+                lot.first_mint_id += part.count
+                lot.count -= part.count
+                lot.save(update_fields=["first_token_number", "first_mint_id", "count", "updated_at"])
+                moved += part.count
+            break
+        whole.append(lot.pk)
+        moved += lot.count
+    if EditionLot.objects.filter(pk__in=whole).update(**fields, updated_at=timezone.now()):
+        Item.objects.filter(lots__pk__in=whole).mark_modified()
+    return moved
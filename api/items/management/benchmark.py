@@ -0,0 +1,112 @@
+"""
+Helpers shared by the marketplace benchmark commands.
+
+The benchmarks fork worker processes that each open their own database
+connection, so they exercise row locking the way concurrent gunicorn
+workers do. They create their own users and items under a run prefix and
+delete them when done.
+"""
+import multiprocessing
+import time
+from decimal import Decimal
+
+import nanoid
+from django.contrib.auth import get_user_model
+from django.db import connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from items.listings import rebuild_listings
+from items.models import Item, ItemSellType, Token
+
+User = get_user_model()
+
+
+def run_prefix():
+    return f"bench-{nanoid.generate(alphabet='abcdefghijklmnopqrstuvwxyz', size=6)}"
+
+
+def create_users(prefix, count):
+    User.objects.bulk_create(
+        [User(username=f"{prefix}-{i}", first_name=prefix, wallet_token=f"{prefix}-{i}") for i in range(count)],
+        batch_size=1000,
+    )
+    return list(User.objects.filter(username__startswith=f"{prefix}-").order_by("id").values_list("id", flat=True))
+
+
+def create_items(
+    prefix, creator_id, count, editions=1, sell_type=ItemSellType.INSTANT_BUY.value, price="1.00", auctions=None
+):
+    """
+    Creates `count` items of `editions` on-sale tokens each, optionally attaching one auction per item.
+    """
+    items = Item.objects.bulk_create(
+        [Item(title=f"{prefix}-{i}", royalties=Decimal("0"), creator_id=creator_id) for i in range(count)]
+    )
+    tokens = []
+    for index, item in enumerate(items):
+        for number in range(1, editions + 1):
+            tokens.append(
+                Token(
+                    collectible=item,
+                    owner_id=creator_id,
+                    token_number=number,
+                    mint_id=number,
+                    sell_type=sell_type,
+                    price=Decimal(price),
+                    on_sale=True,
+                    auction=auctions[index] if auctions and number == 1 else None,
+                )
+            )
+    Token.objects.bulk_create(tokens, batch_size=1000)
+    rebuild_listings([item.id for item in items])
+    return items
+
+
+def cleanup(prefix):
+    Item.objects.filter(title__startswith=f"{prefix}-").delete()
+    User.objects.filter(username__startswith=f"{prefix}-").delete()
+
+
+def call_view(view, method, user_id, path, data=None, headers=None, **kwargs):
+    """
+    Calls a view in-process as `user_id` and returns (status_code, data, seconds).
+    """
+    factory = APIRequestFactory()
+    request = getattr(factory, method)(path, data or {}, format="json", **(headers or {}))
+    force_authenticate(request, user=User.objects.get(id=user_id))
+    started = time.perf_counter()
+    response = view(request, **kwargs)
+    return response.status_code, getattr(response, "data", None), time.perf_counter() - started
+
+
+def run_workers(target, jobs, processes):
+    """
+    Runs `target(job)` for every job across forked processes and returns the results in order.
+    """
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes, initializer=connections.close_all) as pool:
+        return pool.map(target, jobs, chunksize=1)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(stdout, title, elapsed, latencies, counts):
+    """
+    Writes throughput and latency figures for a benchmark run.
+    """
+    total = sum(counts.values())
+    stdout.write(title)
+    stdout.write(f"  requests:     {total} in {elapsed:.2f}s ({total / elapsed:.1f}/s)")
+    for label, count in counts.items():
+        stdout.write(f"  {label + ':':<13} {count} ({count / elapsed:.1f}/s)")
+    stdout.write(
+        f"  latency:      p50 {percentile(latencies, 0.5) * 1000:.1f}ms"
+        f" p99 {percentile(latencies, 0.99) * 1000:.1f}ms max {max(latencies, default=0) * 1000:.1f}ms"
+    )
@@ -0,0 +1,106 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from items.management import benchmark
+from items.models import Auction, AuctionStatus, Bid, ItemSellType
+from items.views import TokenViewSet
+
+place_bid_view = TokenViewSet.as_view({"post": "place_bid"})
+
+
+def bid_worker(job):
+    bidder_ids, targets, rounds, seed = job
+    rng = random.Random(seed)
+    results = []
+    for _ in range(rounds):
+        for bidder_id in bidder_ids:
+            token_id, auction_id = rng.choice(targets)
+            auction = Auction.objects.only("current_bid", "starting_bidding_price").get(pk=auction_id)
+            bid_value = auction.current_bidding_price + Decimal(rng.randint(1, 100)) / 100
+            status_code, _, seconds = benchmark.call_view(
+                place_bid_view,
+                "post",
+                bidder_id,
+                f"/api/tokens/{token_id}/place-bid/",
+                {"auction": auction_id, "bid_value": str(bid_value)},
+                pk=token_id,
+            )
+            results.append((status_code, seconds))
+    return results
+
+
+class Command(BaseCommand):
+    help = "Drives concurrent bidders at one or many auctions and reports bids/sec and latency percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bidders", type=int, default=300)
+        parser.add_argument("--auctions", type=int, default=1, help="Spread bidders over this many auctions.")
+        parser.add_argument("--rounds", type=int, default=5, help="Bids placed by every bidder.")
+        parser.add_argument("--processes", type=int, default=32, help="Concurrent bidding processes.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated users, items and bids.")
+
+    def handle(self, *args, **options):
+        prefix = benchmark.run_prefix()
+        now = timezone.now()
+        user_ids = benchmark.create_users(prefix, options["bidders"] + 1)
+        seller_id, bidder_ids = user_ids[0], user_ids[1:]
+        auctions = Auction.objects.bulk_create(
+            [
+                Auction(
+                    start_date=now - timedelta(minutes=1),
+                    end_date=now + timedelta(days=1),
+                    starting_bidding_price=1,
+                    status=AuctionStatus.LIVE.value,
+                )
+                for _ in range(options["auctions"])
+            ]
+        )
+        items = benchmark.create_items(
+            prefix, seller_id, options["auctions"], sell_type=ItemSellType.AUCTION.value, auctions=auctions
+        )
+        targets = [(item.sold_set.get().id, auction.id) for item, auction in zip(items, auctions)]
+
+        processes = options["processes"]
+        jobs = [
+            (bidder_ids[index::processes], targets, options["rounds"], index)
+            for index in range(processes)
+            if bidder_ids[index::processes]
+        ]
+        try:
+            started = time.perf_counter()
+            results = [result for chunk in benchmark.run_workers(bid_worker, jobs, processes) for result in chunk]
+            elapsed = time.perf_counter() - started
+
+            counts = {"accepted": 0, "outbid": 0, "contention": 0, "errors": 0}
+            labels = {200: "accepted", 400: "outbid", 409: "contention"}
+            for status_code, _ in results:
+                counts[labels.get(status_code, "errors")] += 1
+            benchmark.report(
+                self.stdout,
+                f"{options['bidders']} bidders x {options['rounds']} bids on {options['auctions']} auction(s),"
+                f" {processes} processes",
+                elapsed,
+                [seconds for _, seconds in results],
+                counts,
+            )
+            self.check_bid_order(auctions)
+        finally:
+            if not options["keep"]:
+                Auction.objects.filter(id__in=[auction.id for auction in auctions]).delete()
+                benchmark.cleanup(prefix)
+
+    def check_bid_order(self, auctions):
+        for auction in Auction.objects.filter(id__in=[auction.id for auction in auctions]):
+            values = list(Bid.objects.filter(auction=auction).order_by("id").values_list("bid_value", flat=True))
+            increasing = all(lower < higher for lower, higher in zip(values, values[1:]))
+            highest = Bid.objects.filter(auction=auction).aggregate(Max("bid_value"))["bid_value__max"]
+            if not increasing or highest != auction.current_bid or len(values) != auction.bid_count:
+                self.stderr.write(self.style.ERROR(f"Auction {auction.id} accepted bids out of order."))
+                return
+        self.stdout.write(self.style.SUCCESS("Every auction accepted strictly increasing bids."))
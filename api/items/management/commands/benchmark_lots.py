@@ -0,0 +1,65 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from items.listings import rebuild_listings
+from items.management import benchmark
+from items.minting import create_mint_job, run_mint_job
+from items.models import EditionLot, Item, ItemSellType, Listing, MintJob, Token
+from items.serializers import ItemSerializer
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Times minting, listing and reading an item as its edition count grows, with and without lots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--editions", default="100,1000,10000,100000", help="Comma separated edition counts.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated user, items and tokens.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["editions"].split(",")]
+        prefix = benchmark.run_prefix()
+        (creator_id,) = benchmark.create_users(prefix, 1)
+        items = iter(benchmark.create_items(prefix, creator_id, 2 * len(sizes), editions=0))
+
+        columns = ("editions", "storage", "rows", "mint", "listings", "item", "supply")
+        self.stdout.write(" ".join(f"{column:>9}" for column in columns))
+        try:
+            for editions in sizes:
+                for in_lots in (False, True):
+                    item = Item.objects.select_related("creator").get(pk=next(items).pk)
+                    with transaction.atomic():
+                        ids = [{"from_id": 1, "to_id": editions}]
+                        job = create_mint_job(item, item.creator, ids, ItemSellType.INSTANT_BUY.value, Decimal("1.00"))
+                        MintJob.objects.filter(pk=job.pk).update(in_lots=in_lots)
+                    _, mint_seconds = timed(run_mint_job, job.pk)
+                    # As autovacuum would after a bulk load, so the plans below see the new rows.
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"ANALYZE {Token._meta.db_table}, {EditionLot._meta.db_table}")
+                    with transaction.atomic():
+                        _, listing_seconds = timed(rebuild_listings, [item.id])
+                    _, item_seconds = timed(lambda: ItemSerializer(Item.objects.with_details().get(pk=item.pk)).data)
+                    head_id = Listing.objects.get(collectible=item).token_id
+                    supply, supply_seconds = timed(lambda: Token.objects.with_supply().get(pk=head_id).supply)
+
+                    rows = Token.objects.filter(collectible=item).count()
+                    rows += EditionLot.objects.filter(collectible=item).count()
+                    assert supply == editions, f"supply {supply} != {editions}"
+                    self.stdout.write(
+                        f"{editions:>9} {'lots' if in_lots else 'tokens':>9} {rows:>9}"
+                        + "".join(
+                            f" {seconds * 1000:>7.1f}ms"
+                            for seconds in (mint_seconds, listing_seconds, item_seconds, supply_seconds)
+                        )
+                    )
+        finally:
+            if not options["keep"]:
+                benchmark.cleanup(prefix)
@@ -0,0 +1,84 @@
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from items.listings import rebuild_listings
+from items.management import benchmark
+from items.minting import create_mint_job, run_mint_job
+from items.models import Item, ItemSellType, Token
+
+
+def object_mint(item, ids, sell_type, price):
+    """
+    The mint path replaced by items.minting: one dict and one Token per edition, saved with bulk_create.
+    """
+    tokens = []
+    default_token_data = {
+        "collectible": item,
+        "owner": item.creator,
+        "sell_type": sell_type,
+        "on_sale": sell_type != ItemSellType.NONE.value,
+        "price": price,
+    }
+    token_number = 1
+    for id_range in ids:
+        for i in range(id_range["from_id"], id_range["to_id"] + 1):
+            token_data = default_token_data.copy()
+            token_data.update({"token_number": token_number, "mint_id": i})
+            token_number += 1
+            tokens.append(Token(**token_data))
+    Token.objects.bulk_create(tokens, batch_size=1000)
+    rebuild_listings([item.id])
+
+
+def copy_mint(item, ids, sell_type, price):
+    job = create_mint_job(item, item.creator, ids, sell_type, price)
+    run_mint_job(job.pk)
+
+
+class Command(BaseCommand):
+    help = "Times minting one large edition with bulk_create objects against streaming it with COPY."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--editions", type=int, default=50000)
+        parser.add_argument("--ranges", type=int, default=1, help="Mint id ranges the editions are split into.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated user, items and tokens.")
+
+    def handle(self, *args, **options):
+        editions, range_count = options["editions"], options["ranges"]
+        size = -(-editions // range_count)
+        ids = [{"from_id": start + 1, "to_id": min(start + size, editions)} for start in range(0, editions, size)]
+        prefix = benchmark.run_prefix()
+        (creator_id,) = benchmark.create_users(prefix, 1)
+        items = iter(benchmark.create_items(prefix, creator_id, 4, editions=0))
+        self.stdout.write(
+            f"Minting {editions} editions in {len(ids)} ranges, COPY chunks of {settings.MINT_CHUNK_SIZE}"
+        )
+        try:
+            for label, mint in (("bulk_create", object_mint), ("COPY", copy_mint)):
+                item = Item.objects.select_related("creator").get(pk=next(items).pk)
+                started = time.perf_counter()
+                with transaction.atomic():
+                    mint(item, ids, ItemSellType.INSTANT_BUY.value, Decimal("1.00"))
+                elapsed = time.perf_counter() - started
+
+                # Traced separately: tracemalloc slows allocation-heavy code down.
+                item = Item.objects.select_related("creator").get(pk=next(items).pk)
+                tracemalloc.start()
+                with transaction.atomic():
+                    mint(item, ids, ItemSellType.INSTANT_BUY.value, Decimal("1.00"))
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                minted = Token.objects.filter(collectible=item).count()
+                self.stdout.write(
+                    f"  {label + ':':<13} {elapsed:.2f}s ({editions / elapsed:.0f} tokens/s),"
+                    f" peak Python memory {peak / 2**20:.1f}MiB, {minted} tokens"
+                )
+        finally:
+            if not options["keep"]:
+                benchmark.cleanup(prefix)
@@ -0,0 +1,116 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from items.management import benchmark
+from items.models import Listing, Token
+from items.views import TokenViewSet
+
+purchase_view = TokenViewSet.as_view({"post": "purchase"})
+
+
+def purchase_worker(job):
+    buyer_ids, item_id, seller_id, price, retries = job
+    results = []
+    for buyer_id in buyer_ids:
+        # Like the marketplace feed, buy the listing's current representative token; SKIP LOCKED
+        # moves buyers racing for the same representative onto the other free editions. They still
+        # queue on the listing row, which each purchase holds until it commits.
+        listing = Listing.objects.filter(collectible_id=item_id, owner_id=seller_id, on_sale=True).first()
+        token_id = listing.token_id if listing else Token.objects.filter(collectible_id=item_id).first().id
+        for attempt in range(retries + 1):
+            status_code, data, seconds = benchmark.call_view(
+                purchase_view,
+                "post",
+                buyer_id,
+                f"/api/tokens/{token_id}/purchase/",
+                {"price": price},
+                headers={"HTTP_IDEMPOTENCY_KEY": f"purchase-{buyer_id}"},
+                pk=token_id,
+            )
+            purchased_id = data["old_token"]["id"] if status_code == 200 else None
+            results.append((buyer_id, attempt, status_code, purchased_id, seconds))
+    return results
+
+
+class Command(BaseCommand):
+    help = "Races concurrent buyers for the editions of one instant-buy listing and checks no edition sells twice."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=1000)
+        parser.add_argument("--editions", type=int, default=100)
+        parser.add_argument("--processes", type=int, default=32, help="Concurrent buying processes.")
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=1,
+            help="Times every buyer resends its purchase with the same Idempotency-Key.",
+        )
+        parser.add_argument("--keep", action="store_true", help="Keep the generated users, items and tokens.")
+
+    def handle(self, *args, **options):
+        prefix = benchmark.run_prefix()
+        user_ids = benchmark.create_users(prefix, options["buyers"] + 1)
+        seller_id, buyer_ids = user_ids[0], user_ids[1:]
+        (item,) = benchmark.create_items(prefix, seller_id, 1, editions=options["editions"], price="5.00")
+
+        processes = options["processes"]
+        jobs = [
+            (buyer_ids[index::processes], item.id, seller_id, "5.00", options["retries"])
+            for index in range(processes)
+            if buyer_ids[index::processes]
+        ]
+        try:
+            started = time.perf_counter()
+            results = [result for chunk in benchmark.run_workers(purchase_worker, jobs, processes) for result in chunk]
+            elapsed = time.perf_counter() - started
+
+            counts = {"purchased": 0, "sold out": 0, "contention": 0, "errors": 0}
+            labels = {200: "purchased", 400: "sold out", 409: "contention"}
+            outcomes = {}
+            for buyer_id, attempt, status_code, _, _ in results:
+                if attempt == 0:
+                    counts[labels.get(status_code, "errors")] += 1
+                outcomes[buyer_id] = labels.get(status_code, "errors")
+            benchmark.report(
+                self.stdout,
+                f"{options['buyers']} buyers racing for {options['editions']} editions, {processes} processes",
+                elapsed,
+                [seconds for *_, seconds in results],
+                counts,
+            )
+            # Purchases of the listing commit one at a time, so first attempts that queue longer than
+            # PURCHASE_LOCK_TIMEOUT_MS get a 409 and are expected to buy when retried.
+            final = {label: list(outcomes.values()).count(label) for label in counts}
+            self.stdout.write("  after retries: " + ", ".join(f"{label} {count}" for label, count in final.items()))
+            self.check_purchases(item, seller_id, results)
+        finally:
+            if not options["keep"]:
+                benchmark.cleanup(prefix)
+
+    def check_purchases(self, item, seller_id, results):
+        # A 409 is not stored against the key, so the first other response is the one retries must replay.
+        outcomes = {}
+        replay_mismatches = 0
+        for buyer_id, _, status_code, purchased_id, _ in results:
+            if status_code == 409:
+                continue
+            if buyer_id not in outcomes:
+                outcomes[buyer_id] = (status_code, purchased_id)
+            elif outcomes[buyer_id] != (status_code, purchased_id):
+                replay_mismatches += 1
+
+        sold = Token.objects.filter(collectible=item).exclude(owner_id=seller_id)
+        purchased_ids = [purchased_id for _, purchased_id in outcomes.values() if purchased_id]
+        problems = []
+        if len(purchased_ids) != len(set(purchased_ids)):
+            problems.append("an edition was sold to more than one buyer")
+        if sold.count() != len(purchased_ids):
+            problems.append(f"{sold.count()} editions changed owner but {len(purchased_ids)} purchases succeeded")
+        if replay_mismatches:
+            problems.append(f"{replay_mismatches} retries did not replay the original response")
+
+        for problem in problems:
+            self.stderr.write(self.style.ERROR(problem))
+        if not problems:
+            self.stdout.write(self.style.SUCCESS(f"{len(purchased_ids)} editions sold once each; retries replayed."))
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.fields.json import KeyTextTransform
+
+from items.media import MEDIA_FIELDS, build_media_info
+
+
+def build(job):
+    try:
+        return job, build_media_info(*job), None
+    except Exception as error:
+        return job, False, error
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Probes the size, type, dimensions, duration and hash of item files that changed since they were probed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Files probed at a time.")
+        parser.add_argument("--force", action="store_true", help="Also probe files whose info is up to date.")
+
+    def handle(self, *args, **options):
+        jobs = list(self.pending_jobs(options["force"]))
+        self.stdout.write(f"Probing {len(jobs)} files.")
+
+        probed = failed = 0
+        # Files are read from storage and probed by ffprobe, so threads are enough.
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for (model_label, pk, _, name), stored, error in executor.map(build, jobs):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"{model_label} {pk} ({name}): {error}")
+                probed += stored
+        self.stdout.write(self.style.SUCCESS(f"Probed {probed} files, {failed} failed."))
+
+    def pending_jobs(self, force):
+        for model_label, field_name in MEDIA_FIELDS.items():
+            files = apps.get_model(model_label).objects.exclude(**{field_name: ""})
+            if not force:
+                files = files.annotate(probed=KeyTextTransform("source", f"{field_name}_info")).filter(
+                    Q(probed__isnull=True) | ~Q(probed=F(field_name))
+                )
+            for pk, name in files.order_by("pk").values_list("pk", field_name).iterator():
+                yield model_label, pk, field_name, name
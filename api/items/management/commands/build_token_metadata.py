@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from items.metadata import build_documents
+from items.models import Token
+
+
+class Command(BaseCommand):
+    help = "Builds the metadata documents of tokens that have none, so crawlers never wait on a build."
+
+    def add_arguments(self, parser):
+        parser.add_argument("item_ids", nargs="*", type=int, help="Only build the documents of these items.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        tokens = Token.objects.filter(metadata__isnull=True).order_by("id")
+        if options["item_ids"]:
+            tokens = tokens.filter(collectible_id__in=options["item_ids"])
+
+        built = 0
+        last_id = 0
+        while True:
+            token_ids = list(tokens.filter(id__gt=last_id).values_list("id", flat=True)[: options["batch_size"]])
+            if not token_ids:
+                break
+            built += len(build_documents(Token.objects.filter(id__in=token_ids)))
+            last_id = token_ids[-1]
+        self.stdout.write(self.style.SUCCESS(f"Built {built} token metadata documents."))
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+
+from items.media import AUDIO_EXTENSIONS, build_waveform
+from items.models import Item
+
+
+def build(job):
+    try:
+        return job, build_waveform(*job), None
+    except Exception as error:
+        return job, False, error
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Computes the waveform peaks of audio items that have none or whose file1 changed since."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Tracks decoded at a time.")
+        parser.add_argument("--force", action="store_true", help="Also recompute up to date waveforms.")
+
+    def handle(self, *args, **options):
+        extensions = "|".join(extension.lstrip(".") for extension in AUDIO_EXTENSIONS)
+        items = Item.objects.filter(file1__iregex=rf"\.({extensions})$")
+        if not options["force"]:
+            items = items.exclude(waveform__source=F("file1"))
+        jobs = list(items.order_by("pk").values_list("pk", "file1"))
+        self.stdout.write(f"Computing the waveforms of {len(jobs)} audio items.")
+
+        built = failed = 0
+        # ffmpeg decodes in its own process and NumPy releases the GIL, so threads are enough.
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for (pk, name), stored, error in executor.map(build, jobs):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"Item {pk} ({name}): {error}")
+                built += stored
+        self.stdout.write(self.style.SUCCESS(f"Computed {built} waveforms, {failed} failed."))
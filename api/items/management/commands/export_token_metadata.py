@@ -0,0 +1,130 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import urljoin
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from items.metadata import build_document, lot_edition
+from items.models import EditionLot, Token
+
+CHECKPOINT_NAME = ".checkpoint.json"
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes every token's metadata document to DEFAULT_FILE_STORAGE as <prefix>/<item_id>/<token_number>, "
+        "so a static base URI can serve tokenURI. Interrupted runs resume from a checkpoint kept next to the files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="metadata", help="Storage directory the documents are written to.")
+        parser.add_argument(
+            "--base-url", default="", help="Makes relative file URLs absolute, e.g. https://nft.example."
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "Only export tokens whose token, lot or item changed since the last completed run. "
+                "Renaming an owner, creator or category changes their tokens, lots and items."
+            ),
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Tokens loaded and checkpointed at a time.")
+        parser.add_argument("--workers", type=int, default=16, help="Concurrent storage writes.")
+
+    def handle(self, *args, **options):
+        self.prefix = options["prefix"].strip("/")
+        self.base_url = options["base_url"]
+        checkpoint = self.read_checkpoint()
+
+        if checkpoint.get("last_id") is not None:
+            self.stdout.write(f"Resuming the run from {checkpoint['started_at']} after token {checkpoint['last_id']}.")
+        else:
+            since = checkpoint.get("completed_started_at") if options["incremental"] else None
+            checkpoint = {
+                "started_at": timezone.now().isoformat(),
+                "since": since,
+                "last_id": 0,
+                "completed_started_at": checkpoint.get("completed_started_at"),
+            }
+
+        tokens = Token.objects.filter(id__gt=checkpoint["last_id"])
+        if checkpoint["since"]:
+            since = parse_datetime(checkpoint["since"])
+            tokens = tokens.filter(Q(updated_at__gte=since) | Q(collectible__updated_at__gte=since))
+        token_ids = tokens.order_by("id").values_list("id", flat=True).iterator(chunk_size=options["batch_size"])
+
+        # Editions still in lots are exported after the tokens, a lot at a time.
+        lots = EditionLot.objects.filter(id__gt=checkpoint.get("last_lot_id", 0))
+        if checkpoint["since"]:
+            lots = lots.filter(Q(updated_at__gte=since) | Q(collectible__updated_at__gte=since))
+        lots = lots.select_related("owner", "collectible__category", "collectible__creator").prefetch_related(
+            "collectible__files"
+        )
+
+        exported = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for batch in batched(token_ids, options["batch_size"]):
+                documents = self.build_documents(batch)
+                # Wait for the batch before checkpointing so a crash never skips a token.
+                list(executor.map(self.write_document, documents))
+                exported += len(documents)
+                checkpoint["last_id"] = batch[-1]
+                self.write_checkpoint(checkpoint)
+
+            # Lots are few compared to their editions, and iterator() would skip the prefetch.
+            for lot in lots.order_by("id"):
+                numbers = range(lot.first_token_number, lot.end_token_number)
+                for batch in batched(numbers, options["batch_size"]):
+                    documents = [(lot.collectible.item_id, build_document(lot_edition(lot, n))) for n in batch]
+                    list(executor.map(self.write_document, documents))
+                    exported += len(documents)
+                checkpoint["last_lot_id"] = lot.id
+                self.write_checkpoint(checkpoint)
+
+        self.write_checkpoint({"completed_started_at": checkpoint["started_at"]})
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} token metadata documents to {self.prefix}/."))
+
+    def build_documents(self, token_ids):
+        tokens = (
+            Token.objects.filter(id__in=token_ids)
+            .select_related("owner", "collectible__category", "collectible__creator")
+            .prefetch_related("collectible__files")
+        )
+        return [(token.collectible.item_id, build_document(token)) for token in tokens]
+
+    def write_document(self, item_document):
+        item_id, document = item_document
+        if self.base_url:
+            if document["file1"]:
+                document["file1"] = urljoin(self.base_url, document["file1"])
+            document["files"] = [urljoin(self.base_url, url) for url in document["files"] if url]
+        self.save(f"{item_id}/{document['token_number']}", json.dumps(document))
+
+    def save(self, name, content):
+        path = f"{self.prefix}/{name}"
+        # Storages rename instead of overwriting an existing file
+        default_storage.delete(path)
+        default_storage.save(path, ContentFile(content.encode()))
+
+    def read_checkpoint(self):
+        path = f"{self.prefix}/{CHECKPOINT_NAME}"
+        if not default_storage.exists(path):
+            return {}
+        with default_storage.open(path) as checkpoint:
+            return json.load(checkpoint)
+
+    def write_checkpoint(self, checkpoint):
+        self.save(CHECKPOINT_NAME, json.dumps(checkpoint))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from items.auctions import finalize_ended_auctions, start_due_auctions
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts scheduled auctions and settles ended ones in batches. "
+        "Batches lock with SKIP LOCKED, so several workers can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when there is no work.")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--once", action="store_true", help="Process every due auction, then exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        while True:
+            close_old_connections()
+            started = start_due_auctions(batch_size)
+            settled = finalize_ended_auctions(batch_size)
+            if started or settled:
+                self.stdout.write(f"Started {started} and settled {settled} auctions.")
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from items.likes import flush_likes
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the like count changes buffered in Redis to the items and their listings every LIKE_FLUSH_SECONDS. "
+        "Without Redis each web process flushes its own changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Items updated per statement.")
+        parser.add_argument("--once", action="store_true", help="Flush once, then exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            flushed = flush_likes(options["batch_size"])
+            if flushed:
+                self.stdout.write(f"Flushed the like counts of {flushed} items.")
+            if options["once"]:
+                return
+            time.sleep(settings.LIKE_FLUSH_SECONDS)
@@ -0,0 +1,53 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.fields.json import KeyTextTransform
+
+from items.renditions import IMAGE_FIELDS, generate_renditions
+
+
+def generate(job):
+    try:
+        return job, generate_renditions(*job), None
+    except Exception as error:
+        return job, False, error
+
+
+class Command(BaseCommand):
+    help = "Generates the missing or outdated renditions of existing cover and profile images across a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="Worker processes.")
+        parser.add_argument("--force", action="store_true", help="Also regenerate up to date renditions.")
+
+    def handle(self, *args, **options):
+        jobs = list(self.pending_jobs(options["force"]))
+        self.stdout.write(f"Generating the renditions of {len(jobs)} images.")
+        # Forked workers must open their own connections instead of sharing the parent's.
+        connections.close_all()
+
+        generated = failed = 0
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=options["workers"], mp_context=context) as executor:
+            for (model_label, pk, field_name, _), stored, error in executor.map(generate, jobs, chunksize=8):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"{model_label} {pk} {field_name}: {error}")
+                generated += stored
+        self.stdout.write(self.style.SUCCESS(f"Generated the renditions of {generated} images, {failed} failed."))
+
+    def pending_jobs(self, force):
+        for model_label, fields in IMAGE_FIELDS.items():
+            model = apps.get_model(model_label)
+            for field_name in fields:
+                images = model.objects.exclude(**{field_name: ""})
+                if not force:
+                    images = images.annotate(rendered=KeyTextTransform("source", f"{field_name}_renditions")).filter(
+                        Q(rendered__isnull=True) | ~Q(rendered=F(field_name))
+                    )
+                for pk, name in images.order_by("pk").values_list("pk", field_name).iterator():
+                    yield model_label, pk, field_name, name
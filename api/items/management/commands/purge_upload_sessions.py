@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from items.uploads import purge_expired_uploads
+
+
+class Command(BaseCommand):
+    help = "Aborts upload sessions left open for longer than UPLOAD_SESSION_TTL and deletes their parts."
+
+    def handle(self, *args, **options):
+        aborted = purge_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Aborted {aborted} expired upload sessions."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from items.listings import rebuild_listings
+from items.models import Item
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the denormalized listing rows from tokens, bids and likes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("item_ids", nargs="*", type=int, help="Only rebuild the listings of these items.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        item_ids = options["item_ids"] or list(Item.objects.order_by("id").values_list("id", flat=True))
+        batch_size = options["batch_size"]
+        for start in range(0, len(item_ids), batch_size):
+            with transaction.atomic():
+                rebuild_listings(item_ids[start : start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt listings of {len(item_ids)} items."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from items.minting import run_mint_job
+from items.models import MintJob, MintStatus
+
+
+class Command(BaseCommand):
+    help = "Resumes failed mint jobs, and with --running the ones a stopped worker left running."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--running", action="store_true", help="Also resume running jobs; only when no worker is running them."
+        )
+
+    def handle(self, *args, **options):
+        statuses = [MintStatus.PENDING.value, MintStatus.FAILED.value]
+        if options["running"]:
+            statuses.append(MintStatus.RUNNING.value)
+        resumed = skipped = failed = 0
+        for job in MintJob.objects.filter(status__in=statuses).order_by("pk"):
+            self.stdout.write(f"Resuming {job}: {job.minted} of {job.total} minted.")
+            try:
+                # Jobs another worker claimed in the meantime are left to it.
+                if run_mint_job(job.pk, statuses):
+                    resumed += 1
+                else:
+                    skipped += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"Mint job {job.pk}: {error}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Completed {resumed} mint jobs, {failed} failed, {skipped} claimed by other workers.")
+        )
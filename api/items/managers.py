@@ -1,23 +1,184 @@
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
-class TokenManager(models.Manager):
+class ItemQuerySet(models.QuerySet):
+    def mark_modified(self):
+        """
+        Advances the items' modified_at, which conditional GETs compare, after writes to the
+        rows shown with them that don't save the items: tokens, auctions, bids and lots.
+
+        returns: Number of updated items.
+        rtype: int
+        """
+        return self.update(modified_at=timezone.now())
+
+    def with_token_sold(self):
+        """
+        Returns a queryset with the sold token count read by Item.token_sold.
+
+        The count is a correlated subquery, so a page only counts the tokens of its own items.
+
+        returns: Item QuerySet with sold_count field.
+        rtype: Item QuerySet
+        """
+        token_model = self.model._meta.get_field("sold_set").related_model
+        sold_count = (
+            token_model._default_manager.filter(collectible=models.OuterRef("pk"), is_sold=True)
+            .order_by()
+            .values("collectible")
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        )
+        return self.annotate(sold_count=Coalesce(models.Subquery(sold_count), 0))
+
+    def with_details(self, user=None):
+        """
+        Returns a queryset that loads what ItemSerializer reads for every item of a page
+        (unsold tokens with their auctions, files, collaborators, creator, sold count and
+        whether `user` liked it) in a fixed number of queries.
+
+        returns: Item QuerySet with unsold_tokens, sold_count and is_liked fields.
+        rtype: Item QuerySet
+        """
+        token_model = self.model._meta.get_field("sold_set").related_model
+        unsold_tokens = token_model.objects.filter(is_sold=False).select_related("auction").order_by("token_number")
+        if user is not None and user.is_authenticated:
+            is_liked = models.Exists(
+                self.model.likes.through.objects.filter(item_id=models.OuterRef("pk"), user_id=user.id)
+            )
+        else:
+            is_liked = models.Value(False, output_field=models.BooleanField())
+
+        return (
+            self.with_token_sold()
+            .annotate(is_liked=is_liked)
+            .select_related("creator")
+            .prefetch_related(
+                "files",
+                "collaborators",
+                models.Prefetch("sold_set", queryset=unsold_tokens, to_attr="unsold_tokens"),
+            )
+        )
+
+
+class ItemManager(models.Manager.from_queryset(ItemQuerySet)):
+    pass
+
+
+class TokenQuerySet(models.QuerySet):
     def with_supply(self):
         """
-        Returns a queryset with a supply field.
+        Returns a queryset with a supply field, counting the editions of each token's
+        listing group that are still in lots.
 
         returns: Token QuerySet with supply field.
         rtype: Token QuerySet
         """
+        group = {
+            "owner": models.OuterRef("owner"),
+            "collectible": models.OuterRef("collectible"),
+            "on_sale": models.OuterRef("on_sale"),
+        }
+        lot_model = self.model._meta.get_field("collectible").related_model._meta.get_field("lots").related_model
+        tokens = (
+            self.model._default_manager.filter(**group)
+            .values("collectible", "owner")
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        )
+        lots = (
+            lot_model._default_manager.filter(**group)
+            .order_by()
+            .values("collectible", "owner")
+            .annotate(count=models.Sum("count"))
+            .values("count")
+        )
         return self.annotate(
-            supply=models.Subquery(
-                self.filter(
-                    owner=models.OuterRef("owner"),
-                    collectible=models.OuterRef("collectible"),
-                    on_sale=models.OuterRef("on_sale"),
-                )
-                .values("collectible", "owner")
-                .annotate(count=models.Count("pk"))
-                .values("count")
+            supply=models.ExpressionWrapper(
+                models.Subquery(tokens) + Coalesce(models.Subquery(lots), 0), output_field=models.IntegerField()
+            )
+        )
+
+    def listed(self):
+        """
+        Returns the representative token of every listing with its listing fields.
+
+        returns: Token QuerySet with supply, current_price and likes fields.
+        rtype: Token QuerySet
+        """
+        return (
+            self.filter(listing__isnull=False)
+            .select_related("listing")
+            .annotate(
+                supply=models.F("listing__supply"),
+                current_price=models.F("listing__current_price"),
+                likes=models.F("listing__likes"),
             )
         )
+
+    def with_collectible(self):
+        """
+        Returns a queryset that loads every token's collectible with its creator,
+        files, collaborators and sold count in a fixed number of queries per page.
+
+        rtype: Token QuerySet
+        """
+        item_model = self.model._meta.get_field("collectible").related_model
+        collectibles = (
+            item_model.objects.with_token_sold().select_related("creator").prefetch_related("files", "collaborators")
+        )
+        return self.prefetch_related(models.Prefetch("collectible", queryset=collectibles))
+
+
+class TokenManager(models.Manager.from_queryset(TokenQuerySet)):
+    pass
+
+
+class AuctionQuerySet(models.QuerySet):
+    def refresh_bids(self):
+        """
+        Recomputes the bid columns Bid.save() keeps on each auction (current bid, highest bid
+        and bid count) from the auction's bids, for the writes that bypass it.
+
+        returns: Number of updated auctions.
+        rtype: int
+        """
+        bid_model = self.model._meta.get_field("bid_set").related_model
+        bids = bid_model._default_manager.filter(auction=models.OuterRef("pk"))
+        # The first of the highest bids is the one Bid.save() keeps.
+        highest_bids = bids.order_by("-bid_value", "created_at", "pk")
+        bid_count = bids.order_by().values("auction").annotate(count=models.Count("pk")).values("count")
+        token_model = self.model._meta.get_field("token").related_model
+        item_model = token_model._meta.get_field("collectible").related_model
+        item_model.objects.filter(
+            pk__in=token_model.objects.filter(auction__in=self.values("pk")).values("collectible_id")
+        ).mark_modified()
+        return self.update(
+            current_bid=models.Subquery(highest_bids.values("bid_value")[:1]),
+            highest_bid=models.Subquery(highest_bids.values("pk")[:1]),
+            bid_count=Coalesce(models.Subquery(bid_count), 0),
+            updated_at=timezone.now(),
+        )
+
+
+class AuctionManager(models.Manager.from_queryset(AuctionQuerySet)):
+    pass
+
+
+class BidQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Inserts the bids and recomputes the bid columns of their auctions, which Bid.save()
+        would otherwise have updated bid by bid. The listings showing the auctions' current
+        price are left to the caller.
+        """
+        bids = super().bulk_create(objs, *args, **kwargs)
+        auction_model = self.model._meta.get_field("auction").related_model
+        auction_model._default_manager.filter(pk__in={bid.auction_id for bid in bids}).refresh_bids()
+        return bids
+
+
+class BidManager(models.Manager.from_queryset(BidQuerySet)):
+    pass
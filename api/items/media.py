@@ -0,0 +1,226 @@
+import hashlib
+import json
+import mimetypes
+import posixpath
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+from utils.tasks import defer
+
+from . import cache, metadata
+from .models import Item, Waveform
+
+# Matches the audio types the token page plays
+AUDIO_EXTENSIONS = (".mp3", ".ogg", ".wav")
+
+# Media file fields by model label. What's probed from them is stored in `<field>_info`.
+MEDIA_FIELDS = {"items.Item": "file1", "items.ItemFile": "file"}
+
+
+def is_audio(name):
+    return posixpath.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+
+
+@contextmanager
+def local_copy(file):
+    """
+    Copies a stored file to a temporary file for tools that need a seekable local path,
+    such as ffmpeg with containers that keep their index at the end.
+
+    returns: The path, the size in bytes and the SHA-256 of the content.
+    rtype: tuple[str, int, str]
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix=posixpath.splitext(file.name)[1]) as local:
+        with file.open("rb") as source:
+            for chunk in source.chunks():
+                digest.update(chunk)
+                local.write(chunk)
+        local.flush()
+        yield local.name, local.tell(), digest.hexdigest()
+
+
+def decode_audio(path):
+    """
+    Decodes an audio file to mono 16-bit samples at WAVEFORM_SAMPLE_RATE with ffmpeg.
+
+    rtype: numpy.ndarray
+    """
+    command = [
+        settings.FFMPEG_BINARY,
+        *("-v", "error", "-nostdin", "-i", path, "-vn", "-ac", "1"),
+        *("-ar", str(settings.WAVEFORM_SAMPLE_RATE), "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"),
+    ]
+    result = subprocess.run(command, capture_output=True, check=True, timeout=settings.FFMPEG_TIMEOUT_SECONDS)
+    return np.frombuffer(result.stdout, dtype="<i2")
+
+
+def compute_peaks(samples, count):
+    """
+    Splits `samples` into `count` equal slices and returns each slice's (min, max),
+    scaled so the loudest sample is ±127.
+
+    returns: `count` interleaved (min, max) int8 pairs.
+    rtype: bytes
+    """
+    if samples.size == 0:
+        return bytes(2 * count)
+    # Pad with silence to a multiple of count so the slices are the rows of one array.
+    slices = np.pad(samples, (0, -samples.size % count)).reshape(count, -1)
+    peaks = np.stack([slices.min(axis=1), slices.max(axis=1)], axis=1).astype(np.int32)
+    loudest = max(int(np.abs(peaks).max()), 1)
+    return np.rint(peaks * (127 / loudest)).astype(np.int8).tobytes()
+
+
+def build_waveform(item_id, source_name):
+    """
+    Computes and stores the waveform of an item's audio file1, unless file1 was
+    replaced after the waveform was scheduled.
+
+    returns: Whether the waveform was stored.
+    rtype: bool
+    """
+    item = Item.objects.filter(pk=item_id).only("file1").first()
+    if item is None or item.file1.name != source_name:
+        return False
+
+    with local_copy(item.file1) as (path, _, _):
+        samples = decode_audio(path)
+
+    Waveform.objects.update_or_create(
+        item_id=item_id,
+        defaults={
+            "source": source_name,
+            "peaks": compute_peaks(samples, settings.WAVEFORM_PEAKS),
+            "duration": samples.size / settings.WAVEFORM_SAMPLE_RATE,
+        },
+    )
+    return True
+
+
+def schedule_waveform(item):
+    """
+    Computes the waveform of an audio item in the background once the current transaction
+    commits, unless it's up to date.
+    """
+    if not is_audio(item.file1.name):
+        return
+    if not Waveform.objects.filter(item_id=item.pk, source=item.file1.name).exists():
+        defer(build_waveform, item.pk, item.file1.name)
+
+
+def probe(path, name):
+    """
+    Reads the content type, dimensions, duration and codec of a media file.
+    Images are read with Pillow and audio and video with ffprobe; other files only get a content type.
+
+    rtype: dict
+    """
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    info = {"content_type": content_type, "width": None, "height": None, "duration": None, "codec": None}
+    if content_type.startswith("image/"):
+        try:
+            with Image.open(path) as image:
+                info.update(width=image.width, height=image.height, codec=image.format.lower())
+        except UnidentifiedImageError:
+            pass
+        return info
+
+    command = [settings.FFPROBE_BINARY, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+    try:
+        result = subprocess.run(command, capture_output=True, check=True, timeout=settings.FFMPEG_TIMEOUT_SECONDS)
+    except subprocess.SubprocessError:
+        return info
+    probed = json.loads(result.stdout)
+    streams = probed.get("streams", [])
+    # Cover art embedded in audio files is reported as a one-frame video stream.
+    video = next(
+        (
+            stream
+            for stream in streams
+            if stream["codec_type"] == "video" and not stream.get("disposition", {}).get("attached_pic")
+        ),
+        None,
+    )
+    audio = next((stream for stream in streams if stream["codec_type"] == "audio"), None)
+    if video or audio:
+        info["codec"] = (video or audio).get("codec_name")
+    if video:
+        info.update(width=video.get("width"), height=video.get("height"))
+    if probed.get("format", {}).get("duration"):
+        info["duration"] = float(probed["format"]["duration"])
+    return info
+
+
+def build_media_info(model_label, pk, field_name, source_name):
+    """
+    Probes and stores the size, content type, dimensions, duration, codec and SHA-256 of
+    a media file field, unless the file was replaced after the probe was scheduled.
+
+    returns: Whether the info was stored.
+    rtype: bool
+    """
+    model = apps.get_model(model_label)
+    is_item = model is Item
+    instance = model.objects.filter(pk=pk).only(*([field_name] if is_item else [field_name, "item_id"])).first()
+    if instance is None or getattr(instance, field_name).name != source_name:
+        return False
+
+    with local_copy(getattr(instance, field_name)) as (path, size, sha256):
+        info = {"source": source_name, "size": size, "sha256": sha256, **probe(path, source_name)}
+    # Only store it if the file is still the one that was probed.
+    stored = model.objects.filter(pk=pk, **{field_name: source_name}).update(**{f"{field_name}_info": info})
+    if stored:
+        item_id = pk if is_item else instance.item_id
+        now = timezone.now()
+        Item.objects.filter(pk=item_id).update(updated_at=now, modified_at=now)
+        metadata.invalidate_documents(token__collectible_id=item_id)
+        cache.bump(cache.TOKENS, cache.ITEMS)
+    return bool(stored)
+
+
+def schedule_media_info(instance):
+    """
+    Probes the instance's media file in the background once the current transaction commits,
+    unless its info is up to date.
+    """
+    field_name = MEDIA_FIELDS[instance._meta.label]
+    file = getattr(instance, field_name)
+    if file and getattr(instance, f"{field_name}_info").get("source") != file.name:
+        defer(build_media_info, instance._meta.label, instance.pk, field_name, file.name)
+
+
+def media_info(instance, field_name):
+    """
+    returns: What was probed from a media file field, or None until it's probed.
+    rtype: dict
+    """
+    file = getattr(instance, field_name)
+    info = getattr(instance, f"{field_name}_info")
+    if not file or info.get("source") != file.name:
+        return None
+    return {key: value for key, value in info.items() if key != "source"}
+
+
+class MediaInfoField(serializers.Field):
+    """
+    Serializes what was probed from a media file field, or from each file of a related
+    manager when `related` is set, with null for files that aren't probed yet.
+    """
+
+    def __init__(self, field_name, related=None, **kwargs):
+        self.media_field = field_name
+        self.related = related
+        super().__init__(source="*", read_only=True, **kwargs)
+
+    def to_representation(self, instance):
+        if self.related:
+            return [media_info(related, self.media_field) for related in getattr(instance, self.related).all()]
+        return media_info(instance, self.media_field)
@@ -0,0 +1,139 @@
+from django.db.models import F, Q
+from utils.replicas import reads_from
+
+from . import media
+from .models import EditionLot, Token, TokenMetadata
+
+
+def _file_url(file):
+    return file.url if file else None
+
+
+def build_document(token):
+    """
+    Returns the ERC721 metadata document of a token. File URLs are kept as the
+    storage returns them and made absolute per request by `render_document`.
+
+    rtype: dict
+    """
+    collectible = token.collectible
+    return {
+        "token_number": token.token_number,
+        "name": collectible.title,
+        "description": collectible.description,
+        "category": collectible.category.name if collectible.category else None,
+        "file1": _file_url(collectible.file1),
+        "file1_info": media.media_info(collectible, "file1"),
+        "files": [_file_url(item_file.file) for item_file in collectible.files.all()],
+        "files_info": [media.media_info(item_file, "file") for item_file in collectible.files.all()],
+        "creator": collectible.creator.display_name,
+        "owner": token.owner.display_name,
+        "is_360_video": collectible.is_360_video,
+    }
+
+
+def build_documents(tokens):
+    """
+    Builds and stores the metadata documents of the given tokens.
+
+    returns: The stored rows.
+    rtype: list[TokenMetadata]
+    """
+    tokens = tokens.select_related("owner", "collectible__category", "collectible__creator").prefetch_related(
+        "collectible__files"
+    )
+    rows = [
+        TokenMetadata(
+            token=token,
+            item_id=token.collectible.item_id,
+            token_number=token.token_number,
+            document=build_document(token),
+        )
+        for token in tokens
+    ]
+    TokenMetadata.objects.bulk_create(rows, ignore_conflicts=True)
+    return rows
+
+
+def lot_edition(lot, token_number):
+    """
+    returns: An unsaved token for an edition still held in `lot`, with the lot's collectible and owner.
+    rtype: Token
+    """
+    token = lot.token(token_number)
+    token.collectible, token.owner = lot.collectible, lot.owner
+    return token
+
+
+def build_lot_documents(item_id, token_numbers):
+    """
+    Builds, without storing them, the metadata rows of an item's editions that are still held
+    in lots. Reading a document doesn't split its edition out of the lot; only buying,
+    relisting or auctioning it does.
+
+    rtype: list[TokenMetadata]
+    """
+    numbers = sorted(token_numbers)
+    lots = (
+        EditionLot.objects.filter(collectible__item_id=item_id)
+        .alias(end_token_number=F("first_token_number") + F("count"))
+        .filter(first_token_number__lte=numbers[-1], end_token_number__gt=numbers[0])
+        .select_related("owner", "collectible__category", "collectible__creator")
+        .prefetch_related("collectible__files")
+    )
+    return [
+        TokenMetadata(
+            item_id=item_id,
+            token_number=number,
+            document=build_document(lot_edition(lot, number)),
+            built_at=max(lot.updated_at, lot.collectible.updated_at),
+        )
+        for lot in lots
+        for number in numbers
+        if lot.first_token_number <= number < lot.end_token_number
+    ]
+
+
+def get_documents(item_id, token_numbers):
+    """
+    Returns the stored metadata rows of an item's tokens, building the missing ones.
+    Stored rows may be read from a replica, but missing ones are built from the primary
+    so a lagging replica's tokens are never stored.
+
+    returns: Rows in the order of `token_numbers`; unknown token numbers are left out.
+    rtype: list[TokenMetadata]
+    """
+    rows = {
+        row.token_number: row for row in TokenMetadata.objects.filter(item_id=item_id, token_number__in=token_numbers)
+    }
+    missing = [token_number for token_number in token_numbers if token_number not in rows]
+    if missing:
+        with reads_from(None):
+            tokens = Token.objects.filter(collectible__item_id=item_id, token_number__in=missing)
+            rows.update({row.token_number: row for row in build_documents(tokens)})
+        missing = [token_number for token_number in missing if token_number not in rows]
+    if missing:
+        rows.update({row.token_number: row for row in build_lot_documents(item_id, missing)})
+    return [rows[token_number] for token_number in token_numbers if token_number in rows]
+
+
+def render_document(request, document):
+    """
+    Returns a copy of a stored document with absolute file URLs.
+    """
+    rendered = dict(document)
+    if rendered["file1"]:
+        rendered["file1"] = request.build_absolute_uri(rendered["file1"])
+    rendered["files"] = [request.build_absolute_uri(url) for url in rendered["files"] if url]
+    return rendered
+
+
+def invalidate_documents(**filters):
+    """
+    Deletes the stored documents of the tokens matching `filters`; they are rebuilt on next read.
+    """
+    TokenMetadata.objects.filter(**filters).delete()
+
+
+def invalidate_user_documents(user_id):
+    TokenMetadata.objects.filter(Q(token__owner_id=user_id) | Q(token__collectible__creator_id=user_id)).delete()
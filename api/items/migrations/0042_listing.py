@@ -0,0 +1,93 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def backfill_listings(apps, schema_editor):
+    Item = apps.get_model("items", "Item")
+    Listing = apps.get_model("items", "Listing")
+    Token = apps.get_model("items", "Token")
+
+    supplies = {
+        (row["collectible"], row["owner"], row["on_sale"]): row["supply"]
+        for row in Token.objects.order_by().values("collectible", "owner", "on_sale").annotate(supply=Count("pk"))
+    }
+    likes = dict(
+        Item.likes.through.objects.order_by().values("item_id").annotate(count=Count("pk")).values_list("item_id", "count")
+    )
+    heads = (
+        Token.objects.select_related("auction")
+        .order_by("collectible", "owner", "on_sale", "token_number", "id")
+        .distinct("collectible", "owner", "on_sale")
+    )
+    listings = []
+    for head in heads.iterator():
+        auction = head.auction
+        current_price = head.price
+        if auction is not None:
+            highest_bid = auction.bid_set.order_by("-bid_value").first()
+            current_price = highest_bid.bid_value if highest_bid else auction.starting_bidding_price
+        listings.append(
+            Listing(
+                collectible_id=head.collectible_id,
+                owner_id=head.owner_id,
+                on_sale=head.on_sale,
+                token=head,
+                sell_type=head.sell_type,
+                price=head.price,
+                current_price=current_price,
+                supply=supplies[(head.collectible_id, head.owner_id, head.on_sale)],
+                likes=likes.get(head.collectible_id, 0),
+                auction_start_date=auction.start_date if auction else None,
+                auction_end_date=auction.end_date if auction else None,
+            )
+        )
+    Listing.objects.bulk_create(listings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('items', '0041_token_mint_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Listing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_sale', models.BooleanField(default=False)),
+                ('sell_type', models.IntegerField(choices=[(0, 'NONE'), (1, 'INSTANT_BUY'), (2, 'AUCTION')])),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('current_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('supply', models.PositiveIntegerField(default=0)),
+                ('likes', models.PositiveIntegerField(default=0)),
+                ('auction_start_date', models.DateTimeField(blank=True, null=True)),
+                ('auction_end_date', models.DateTimeField(blank=True, null=True)),
+                ('collectible', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listings', to='items.item')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listings', to=settings.AUTH_USER_MODEL)),
+                ('token', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='listing', to='items.token')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['on_sale', 'current_price'], name='listing_on_sale_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['on_sale', 'likes'], name='listing_on_sale_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['owner', 'on_sale'], name='listing_owner_on_sale_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='listing',
+            constraint=models.UniqueConstraint(fields=('collectible', 'owner', 'on_sale'), name='unique_listing_group'),
+        ),
+        migrations.RunPython(backfill_listings, migrations.RunPython.noop),
+    ]
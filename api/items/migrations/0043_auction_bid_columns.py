@@ -0,0 +1,45 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_bid_columns(apps, schema_editor):
+    Auction = apps.get_model("items", "Auction")
+    Bid = apps.get_model("items", "Bid")
+
+    bids = Bid.objects.filter(auction=OuterRef("pk"))
+    highest_bids = bids.order_by("-bid_value", "created_at")
+    Auction.objects.update(
+        current_bid=Subquery(highest_bids.values("bid_value")[:1]),
+        highest_bid=Subquery(highest_bids.values("pk")[:1]),
+        bid_count=Coalesce(Subquery(bids.order_by().values("auction").annotate(count=Count("pk")).values("count")), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0042_listing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auction',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='auction',
+            name='current_bid',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='auction',
+            name='highest_bid',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='items.bid'),
+        ),
+        migrations.RunPython(backfill_bid_columns, migrations.RunPython.noop),
+    ]
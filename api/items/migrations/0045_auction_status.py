@@ -0,0 +1,74 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:21
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+SCHEDULED, LIVE, SETTLED = 0, 1, 2
+AUCTION = 2
+
+
+def backfill_auction_status(apps, schema_editor):
+    Auction = apps.get_model("items", "Auction")
+    Listing = apps.get_model("items", "Listing")
+
+    now = timezone.now()
+    Auction.objects.filter(start_date__lte=now).update(status=LIVE)
+    Auction.objects.filter(token__isnull=True).update(status=SETTLED)
+    Listing.objects.filter(
+        Q(on_sale=True),
+        ~Q(sell_type=AUCTION) | Q(token__auction__status=LIVE),
+    ).update(is_live=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0044_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_on_sale_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_on_sale_likes_idx',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='auction_end_date',
+        ),
+        migrations.RemoveField(
+            model_name='listing',
+            name='auction_start_date',
+        ),
+        migrations.AddField(
+            model_name='auction',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'SCHEDULED'), (1, 'LIVE'), (2, 'SETTLED')], default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='is_live',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['status', 'start_date'], name='auction_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['status', 'end_date'], name='auction_status_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_live', 'current_price'], name='listing_live_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_live', 'likes'], name='listing_live_likes_idx'),
+        ),
+        migrations.RunPython(backfill_auction_status, migrations.RunPython.noop),
+    ]
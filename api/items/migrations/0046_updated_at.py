@@ -0,0 +1,28 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0045_auction_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='token',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
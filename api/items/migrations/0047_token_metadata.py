@@ -0,0 +1,29 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:28
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0046_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenMetadata',
+            fields=[
+                ('token', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metadata', serialize=False, to='items.token')),
+                ('item_id', models.CharField(max_length=9)),
+                ('token_number', models.PositiveIntegerField()),
+                ('document', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tokenmetadata',
+            index=models.Index(fields=['item_id', 'token_number'], name='token_metadata_lookup_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+SEARCH_CONFIG = "english"
+
+
+def backfill_search_vectors(apps, schema_editor):
+    Item = apps.get_model("items", "Item")
+    Category = apps.get_model("items", "Category")
+    User = apps.get_model("users", "User")
+
+    creator_name = Subquery(
+        User.objects.filter(pk=OuterRef("creator_id"))
+        .annotate(name=Concat("first_name", Value(" "), "last_name"))
+        .values("name")[:1]
+    )
+    category_name = Subquery(Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1])
+    Item.objects.update(
+        search_vector=SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(creator_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0047_token_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='item_search_vector_idx'),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:32
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0048_item_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='item_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0049_item_title_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='token',
+            options={},
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_featured', True)), fields=['id'], name='item_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_topseller', True)), fields=['id'], name='item_topseller_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_super_featured', True)), fields=['id'], name='item_super_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_live', True)), fields=['collectible', 'owner'], name='listing_live_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='token',
+            index=models.Index(fields=['collectible', 'owner', 'on_sale', 'token_number'], name='token_group_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='token',
+            index=models.Index(fields=['collectible', 'is_sold'], name='token_collectible_sold_idx'),
+        ),
+    ]
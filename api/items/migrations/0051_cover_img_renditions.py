@@ -0,0 +1,18 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0050_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='cover_img_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
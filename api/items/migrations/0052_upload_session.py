@@ -0,0 +1,33 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('items', '0051_cover_img_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.IntegerField(choices=[(0, 'FILE1'), (1, 'ITEM_FILE')])),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('part_size', models.PositiveIntegerField()),
+                ('content_type', models.CharField(blank=True, default='', max_length=255)),
+                ('upload_id', models.CharField(blank=True, default='', max_length=1024)),
+                ('status', models.IntegerField(choices=[(0, 'OPEN'), (1, 'COMPLETED'), (2, 'ABORTED')], default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='items.item')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0052_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Waveform',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='waveform', serialize=False, to='items.item')),
+                ('source', models.CharField(max_length=255)),
+                ('peaks', models.BinaryField()),
+                ('duration', models.FloatField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0053_waveform'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='file1_info',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='itemfile',
+            name='file_info',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_last_token_numbers(apps, schema_editor):
+    Item = apps.get_model("items", "Item")
+    Token = apps.get_model("items", "Token")
+    tokens = Token.objects.filter(collectible=OuterRef("pk")).order_by().values("collectible")
+    last = tokens.annotate(last=Max("token_number"))
+    Item.objects.update(last_token_number=Coalesce(Subquery(last.values("last")), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('items', '0054_media_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='last_token_number',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_last_token_numbers, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='MintJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ids', models.JSONField()),
+                ('sell_type', models.IntegerField(choices=[(0, 'NONE'), (1, 'INSTANT_BUY'), (2, 'AUCTION')])),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('first_token_number', models.PositiveIntegerField()),
+                ('total', models.PositiveIntegerField()),
+                ('minted', models.PositiveIntegerField(default=0)),
+                ('status', models.IntegerField(choices=[(0, 'PENDING'), (1, 'RUNNING'), (2, 'COMPLETED'), (3, 'FAILED')], default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('auction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='items.auction')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mint_jobs', to='items.item')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mint_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
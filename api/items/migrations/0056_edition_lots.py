@@ -0,0 +1,40 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('items', '0055_mint_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mintjob',
+            name='in_lots',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='EditionLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sell_type', models.IntegerField(choices=[(0, 'NONE'), (1, 'INSTANT_BUY'), (2, 'AUCTION')])),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('on_sale', models.BooleanField(default=False)),
+                ('first_token_number', models.PositiveIntegerField()),
+                ('first_mint_id', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('collectible', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='items.item')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='editionlot',
+            index=models.Index(fields=['collectible', 'owner', 'on_sale', 'first_token_number'], name='lot_group_idx'),
+        ),
+    ]
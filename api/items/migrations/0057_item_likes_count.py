@@ -0,0 +1,28 @@
+# Generated by Django 3.2.4 on 2026-10-18 13:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_likes_counts(apps, schema_editor):
+    Item = apps.get_model("items", "Item")
+    likes = Item.likes.through.objects.filter(item_id=OuterRef("pk")).order_by().values("item_id")
+    counts = likes.annotate(count=Count("pk"))
+    Item.objects.update(likes_count=Coalesce(Subquery(counts.values("count")), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0056_edition_lots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_likes_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.4 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0058_like_flushes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['item_id'], name='item_item_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0059_item_item_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,232 @@
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .listings import rebuild_listings
+from .models import Auction, EditionLot, Item, ItemSellType, MintJob, MintStatus, Token
+
+# Columns the COPY fills, in the order `token_rows` yields them
+TOKEN_COLUMNS = (
+    "token_number",
+    "mint_id",
+    "collectible_id",
+    "owner_id",
+    "sell_type",
+    "auction_id",
+    "price",
+    "on_sale",
+    "is_sold",
+    "updated_at",
+)
+
+
+def edition_count(ids):
+    return sum(id_range["to_id"] - id_range["from_id"] + 1 for id_range in ids)
+
+
+def reserve_token_numbers(item_id, count):
+    """
+    Advances the item's token number sequence by `count`. Must be called inside a transaction,
+    which holds the item row's lock so concurrent mints reserve consecutive, disjoint numbers.
+
+    returns: The first reserved token number.
+    rtype: int
+    """
+    Item.objects.filter(pk=item_id).update(last_token_number=F("last_token_number") + count)
+    return Item.objects.filter(pk=item_id).values_list("last_token_number", flat=True).get() - count + 1
+
+
+def create_mint_job(item, user, ids, sell_type, price, auction_data=None):
+    """
+    Reserves the token numbers of a mint and records it. Must be called inside a transaction.
+
+    rtype: MintJob
+    """
+    total = edition_count(ids)
+    # Only 1 auction can be active for a collectible's newly minted editions.
+    auction = Auction.objects.create(**auction_data) if sell_type == ItemSellType.AUCTION.value else None
+    return MintJob.objects.create(
+        user=user,
+        item=item,
+        ids=[{"from_id": id_range["from_id"], "to_id": id_range["to_id"]} for id_range in ids],
+        sell_type=sell_type,
+        price=price,
+        auction=auction,
+        first_token_number=reserve_token_numbers(item.pk, total),
+        total=total,
+        in_lots=0 < settings.EDITION_LOT_MIN_EDITIONS <= total,
+    )
+
+
+def _edition_fields(job, offset):
+    """
+    returns: The sell_type, auction_id, price and on_sale of a job's edition.
+    rtype: tuple
+    """
+    if job.sell_type == ItemSellType.AUCTION.value and offset > 0:
+        # Only the first edition is auctioned; the others are minted off sale.
+        return ItemSellType.NONE.value, None, 0, False
+    return job.sell_type, job.auction_id, job.price, job.sell_type != ItemSellType.NONE.value
+
+
+def _group_offsets(job):
+    """
+    returns: The (start, end) edition offsets of each listing group a job mints into.
+    rtype: list[tuple[int, int]]
+    """
+    if job.sell_type == ItemSellType.AUCTION.value and job.total > 1:
+        return [(0, 1), (1, job.total)]
+    return [(0, job.total)]
+
+
+def _mint_id_runs(ids):
+    """
+    Yields the (edition offset, first mint id, count) of each range of mint ids.
+    """
+    offset = 0
+    for id_range in ids:
+        count = id_range["to_id"] - id_range["from_id"] + 1
+        yield offset, id_range["from_id"], count
+        offset += count
+
+
+def token_rows(job, owner_id, start=0):
+    """
+    Lazily yields the COPY rows of a job's tokens, from its `start`th edition on.
+    """
+    mint_ids = chain.from_iterable(range(id_range["from_id"], id_range["to_id"] + 1) for id_range in job.ids)
+    now = timezone.now().isoformat()
+    for offset, mint_id in enumerate(islice(mint_ids, start, None), start):
+        fields = _edition_fields(job, offset)
+        yield (job.first_token_number + offset, mint_id, job.item_id, owner_id, *fields, False, now)
+
+
+def _copy_value(value):
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value)
+
+
+class RowReader:
+    """
+    File-like view of an iterable of rows in COPY's text format, read by psycopg2 as it
+    sends them so the rows are never all in memory. The values are numbers, booleans and
+    timestamps, which need no escaping.
+    """
+
+    def __init__(self, rows):
+        self.lines = ("\t".join(map(_copy_value, row)) + "\n" for row in rows)
+        self.buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def copy_tokens(rows):
+    """
+    Loads token rows into the token table with COPY.
+    """
+    columns = ", ".join(TOKEN_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {Token._meta.db_table} ({columns}) FROM STDIN", RowReader(rows))
+
+
+def mint_lots(job, owner_id):
+    """
+    Mints the first EDITION_LOT_WINDOW editions of each of the job's listing groups as
+    tokens, so buyers can lock them concurrently, and the rest as lots.
+    """
+    window = max(settings.EDITION_LOT_WINDOW, 1)
+    rows, lots = [], []
+    for start, end in _group_offsets(job):
+        tokens_end = min(start + window, end)
+        rows.append(islice(token_rows(job, owner_id, start=start), tokens_end - start))
+        for offset, first_mint_id, count in _mint_id_runs(job.ids):
+            lot_start, lot_end = max(offset, tokens_end), min(offset + count, end)
+            if lot_start >= lot_end:
+                continue
+            sell_type, _, price, on_sale = _edition_fields(job, lot_start)
+            lots.append(
+                EditionLot(
+                    collectible_id=job.item_id,
+                    owner_id=owner_id,
+                    sell_type=sell_type,
+                    price=price,
+                    on_sale=on_sale,
+                    first_token_number=job.first_token_number + lot_start,
+                    first_mint_id=first_mint_id + lot_start - offset,
+                    count=lot_end - lot_start,
+                )
+            )
+    copy_tokens(chain.from_iterable(rows))
+    EditionLot.objects.bulk_create(lots)
+
+
+def claim_mint_job(job_id, statuses=(MintStatus.PENDING.value, MintStatus.FAILED.value)):
+    """
+    Marks the job running if its status is one of `statuses`, in one conditional UPDATE, so
+    of the workers handed the same job only one runs it.
+
+    returns: Whether the job was claimed.
+    rtype: bool
+    """
+    claimed = MintJob.objects.filter(pk=job_id, status__in=statuses).update(
+        status=MintStatus.RUNNING.value, error="", updated_at=timezone.now()
+    )
+    return bool(claimed)
+
+
+def run_mint_job(job_id, statuses=(MintStatus.PENDING.value, MintStatus.FAILED.value)):
+    """
+    Claims the job with `claim_mint_job` and mints its editions as lots when it's `in_lots`,
+    or else copies its remaining tokens in chunks of MINT_CHUNK_SIZE, committing its progress
+    with each chunk so an interrupted job resumes where it stopped. Then rebuilds the item's listings.
+
+    returns: Whether the job was claimed and run.
+    rtype: bool
+    """
+    if not claim_mint_job(job_id, statuses):
+        return False
+    job = MintJob.objects.select_related("item").get(pk=job_id)
+
+    try:
+        if job.in_lots:
+            with transaction.atomic():
+                mint_lots(job, job.item.creator_id)
+                Item.objects.filter(pk=job.item_id).mark_modified()
+                job.minted = job.total
+                job.save(update_fields=["minted", "updated_at"])
+
+        rows = token_rows(job, job.item.creator_id, start=job.minted)
+        while job.minted < job.total:
+            count = min(settings.MINT_CHUNK_SIZE, job.total - job.minted)
+            with transaction.atomic():
+                copy_tokens(islice(rows, count))
+                Item.objects.filter(pk=job.item_id).mark_modified()
+                job.minted += count
+                job.save(update_fields=["minted", "updated_at"])
+
+        with transaction.atomic():
+            rebuild_listings([job.item_id])
+            job.status = MintStatus.COMPLETED.value
+            job.finished_at = timezone.now()
+            job.save(update_fields=["status", "finished_at", "updated_at"])
+    except Exception as error:
+        job.status = MintStatus.FAILED.value
+        job.error = str(error)
+        job.save(update_fields=["status", "error", "updated_at"])
+        raise
+    return True
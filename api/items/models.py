@@ -2,14 +2,18 @@ from enum import Enum
 
 import nanoid
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import Max
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.db.models.deletion import CASCADE, SET_NULL
+from django.utils import timezone
 
 from .fields import NullableCharField
-from .managers import TokenManager
+from .managers import AuctionManager, BidManager, ItemManager, TokenManager
 from .validators import validate_auction_start_date
 
 
@@ -31,10 +35,72 @@ class ItemSellType(Enum):
         return [i.value for i in cls]
 
 
+class AuctionStatus(Enum):
+    SCHEDULED = 0
+    LIVE = 1
+    SETTLED = 2
+
+    @classmethod
+    def choices(cls):
+        return tuple((i.value, i.name) for i in cls)
+
+
+class UploadTarget(Enum):
+    FILE1 = 0
+    ITEM_FILE = 1
+
+    @classmethod
+    def choices(cls):
+        return tuple((i.value, i.name) for i in cls)
+
+
+class UploadStatus(Enum):
+    OPEN = 0
+    COMPLETED = 1
+    ABORTED = 2
+
+    @classmethod
+    def choices(cls):
+        return tuple((i.value, i.name) for i in cls)
+
+
+class MintStatus(Enum):
+    PENDING = 0
+    RUNNING = 1
+    COMPLETED = 2
+    FAILED = 3
+
+    @classmethod
+    def choices(cls):
+        return tuple((i.value, i.name) for i in cls)
+
+
 class Auction(models.Model):
     start_date = models.DateTimeField(null=False, blank=False, validators=[validate_auction_start_date])
     end_date = models.DateTimeField(null=False, blank=False)
     starting_bidding_price = models.DecimalField(decimal_places=2, max_digits=12, validators=[MinValueValidator(0)])
+    # Live from creation if it has started by then, else advanced by the finalize_auctions worker
+    status = models.IntegerField(choices=AuctionStatus.choices(), default=AuctionStatus.SCHEDULED.value)
+
+    # Denormalized from bid_set by Bid.save() on insert, else by AuctionQuerySet.refresh_bids()
+    current_bid = models.DecimalField(decimal_places=2, max_digits=12, null=True, blank=True, editable=False)
+    highest_bid = models.ForeignKey("Bid", on_delete=SET_NULL, null=True, blank=True, editable=False, related_name="+")
+    bid_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AuctionManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "start_date"], name="auction_status_start_idx"),
+            models.Index(fields=["status", "end_date"], name="auction_status_end_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Auctions starting right away are live before the worker's next pass.
+        if self._state.adding and self.status == AuctionStatus.SCHEDULED.value and self.start_date <= timezone.now():
+            self.status = AuctionStatus.LIVE.value
+        super().save(*args, **kwargs)
 
     def __str__(self):
         if hasattr(self, "token"):
@@ -43,14 +109,15 @@ class Auction(models.Model):
 
     @property
     def current_bidding_price(self):
-        return self.bid_set.aggregate(Max("bid_value"))["bid_value__max"] or self.starting_bidding_price
+        if self.current_bid is None:
+            return self.starting_bidding_price
+        return self.current_bid
 
     @property
     def highest_bidder_id(self):
-        highest_bid = self.bid_set.order_by("-bid_value").first()
-        if highest_bid is None:
+        if self.highest_bid_id is None:
             return None
-        return highest_bid.bidder.id
+        return self.highest_bid.bidder_id
 
 
 class Bid(models.Model):
@@ -60,9 +127,29 @@ class Bid(models.Model):
 
     auction = models.ForeignKey(Auction, on_delete=CASCADE, related_name="bid_set")
 
+    objects = BidManager()
+
     def __str__(self):
         return f"{self.bid_value} bid from {self.bidder}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            is_highest = Q(current_bid__isnull=True) | Q(current_bid__lt=self.bid_value)
+            Auction.objects.filter(pk=self.auction_id).update(
+                current_bid=Case(When(is_highest, then=Value(self.bid_value)), default=F("current_bid")),
+                highest_bid=Case(
+                    When(is_highest, then=Value(self.pk)),
+                    default=F("highest_bid"),
+                    output_field=models.BigIntegerField(),
+                ),
+                bid_count=F("bid_count") + 1,
+                updated_at=timezone.now(),
+            )
+
     def clean(self):
         current_bidding_price = self.auction.current_bidding_price
         if current_bidding_price is None:
@@ -84,23 +171,53 @@ class Item(models.Model):
     item_id = models.CharField(max_length=9, default=generate_token_id)
 
     file1 = models.FileField(upload_to="items/file1/", blank=True, default="")
+    # Maintained by items.media after file1 changes
+    file1_info = models.JSONField(default=dict, blank=True, editable=False)
     is_360_video = models.BooleanField(default=False)
     cover_img = models.ImageField(upload_to="items/cover_images/", blank=True, default="")
+    # Maintained by items.renditions after cover_img changes
+    cover_img_renditions = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=64, blank=True, default="")
     description = models.TextField(blank=True, default="")
     royalties = models.DecimalField(decimal_places=2, max_digits=5)
     creator = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE, related_name="create_set")
 
     token_amt = models.IntegerField(default=1)
+    # Token number sequence: the last number handed out by items.minting
+    last_token_number = models.PositiveIntegerField(default=0, editable=False)
     category = models.ForeignKey(Category, blank=True, null=True, on_delete=SET_NULL)
     likes = models.ManyToManyField(settings.AUTH_USER_MODEL, blank=True, related_name="like_set")
+    # Like count as of the last items.likes flush; the changes since are buffered
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
 
     is_super_featured = models.BooleanField(default=False)
     is_featured = models.BooleanField(default=False)
     is_topseller = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Version of everything the item's responses show: advanced by the writes to the item and to
+    # its tokens, their auctions and bids, and its lots (see ItemQuerySet.mark_modified)
+    modified_at = models.DateTimeField(auto_now=True)
+    # Maintained by items.search from the item, category and creator write paths
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ItemManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="item_search_vector_idx"),
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="item_title_trgm_idx"),
+            # Home page flags; each matches a small fraction of items
+            models.Index(fields=["id"], condition=Q(is_featured=True), name="item_featured_idx"),
+            models.Index(fields=["id"], condition=Q(is_topseller=True), name="item_topseller_idx"),
+            models.Index(fields=["id"], condition=Q(is_super_featured=True), name="item_super_featured_idx"),
+            # Metadata URLs address items by their public item_id
+            models.Index(fields=["item_id"], name="item_item_id_idx"),
+        ]
 
     @property
     def token_sold(self):  # TODO: check the usage of this property
+        if hasattr(self, "sold_count"):
+            return self.sold_count
         return self.sold_set.filter(is_sold=True).count()
 
     @property
@@ -114,6 +231,8 @@ class Item(models.Model):
 
 class ItemFile(models.Model):
     file = models.FileField(upload_to="items/file2/", blank=True, default="")
+    # Maintained by items.media after file changes
+    file_info = models.JSONField(default=dict, blank=True, editable=False)
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="files")
 
     def __str__(self):
@@ -150,15 +269,15 @@ class Token(models.Model):
     price = models.DecimalField(decimal_places=2, max_digits=12)
     on_sale = models.BooleanField(default=False)
     is_sold = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = TokenManager()
 
     class Meta:
-        ordering = [
-            "collectible",
-            "owner",
-            "on_sale",
-            "token_number",
+        indexes = [
+            # Listing groups: refresh_listing head lookups and the supply subquery
+            models.Index(fields=["collectible", "owner", "on_sale", "token_number"], name="token_group_idx"),
+            models.Index(fields=["collectible", "is_sold"], name="token_collectible_sold_idx"),
         ]
 
     @property
@@ -174,3 +293,238 @@ class Token(models.Model):
     def clean(self):
         if self.sell_type == ItemSellType.AUCTION.value and self.auction is None:
             raise ValidationError("Auction can't be undefined")
+
+
+class EditionLot(models.Model):
+    """
+    A run of interchangeable editions of a collectible (same owner, sale state and price,
+    consecutive token numbers and mint ids) stored as one row instead of one token each.
+
+    Large mints keep all but the first EDITION_LOT_WINDOW editions of each listing group in
+    lots. ``items.lots`` turns editions into tokens when they are bought or read one at a
+    time, so every listing keeps at least one token to represent it.
+    """
+
+    collectible = models.ForeignKey(Item, on_delete=CASCADE, related_name="lots")
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE, related_name="lots")
+    sell_type = models.IntegerField(choices=ItemSellType.choices())
+    price = models.DecimalField(decimal_places=2, max_digits=12)
+    on_sale = models.BooleanField(default=False)
+    first_token_number = models.PositiveIntegerField()
+    first_mint_id = models.PositiveIntegerField()
+    count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["collectible", "owner", "on_sale", "first_token_number"], name="lot_group_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.collectible} editions {self.first_token_number}-{self.end_token_number - 1}"
+
+    @property
+    def end_token_number(self):
+        return self.first_token_number + self.count
+
+    def token(self, token_number):
+        """
+        returns: The unsaved token of one of the lot's editions.
+        rtype: Token
+        """
+        offset = token_number - self.first_token_number
+        return Token(
+            collectible_id=self.collectible_id,
+            owner_id=self.owner_id,
+            token_number=token_number,
+            mint_id=self.first_mint_id + offset,
+            sell_type=self.sell_type,
+            price=self.price,
+            on_sale=self.on_sale,
+        )
+
+    def run(self, first_token_number, end_token_number):
+        """
+        returns: An unsaved lot of the editions from `first_token_number` up to `end_token_number`.
+        rtype: EditionLot
+        """
+        return EditionLot(
+            collectible_id=self.collectible_id,
+            owner_id=self.owner_id,
+            sell_type=self.sell_type,
+            price=self.price,
+            on_sale=self.on_sale,
+            first_token_number=first_token_number,
+            first_mint_id=self.first_mint_id + first_token_number - self.first_token_number,
+            count=end_token_number - first_token_number,
+        )
+
+
+class Listing(models.Model):
+    """
+    Denormalized read model holding one row per (collectible, owner, on_sale) group of tokens.
+
+    Rows are maintained by ``items.listings`` from every write path that moves a token
+    between groups or changes the price of a group, so the marketplace feeds can page
+    over plain indexed columns instead of aggregating over tokens, bids and likes.
+    """
+
+    collectible = models.ForeignKey(Item, on_delete=CASCADE, related_name="listings")
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE, related_name="listings")
+    on_sale = models.BooleanField(default=False)
+    token = models.OneToOneField(Token, on_delete=CASCADE, related_name="listing")
+
+    sell_type = models.IntegerField(choices=ItemSellType.choices())
+    price = models.DecimalField(decimal_places=2, max_digits=12)
+    current_price = models.DecimalField(decimal_places=2, max_digits=12)
+    supply = models.PositiveIntegerField(default=0)
+    likes = models.PositiveIntegerField(default=0)
+    # On sale and, for auctions, live: the marketplace feed predicate
+    is_live = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["collectible", "owner", "on_sale"], name="unique_listing_group"),
+        ]
+        indexes = [
+            models.Index(fields=["is_live", "current_price"], name="listing_live_price_idx"),
+            models.Index(fields=["is_live", "likes"], name="listing_live_likes_idx"),
+            models.Index(fields=["owner", "on_sale"], name="listing_owner_on_sale_idx"),
+            models.Index(fields=["collectible", "owner"], condition=Q(is_live=True), name="listing_live_feed_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.collectible} listing by {self.owner}"
+
+
+class TokenMetadata(models.Model):
+    """
+    ERC721 metadata document of a token, as served by the tokenURI endpoint.
+
+    Rows are built by ``items.metadata`` on first read and deleted whenever the
+    token's owner or its item's fields change, so a fetch is one indexed lookup.
+    """
+
+    token = models.OneToOneField(Token, on_delete=CASCADE, primary_key=True, related_name="metadata")
+    item_id = models.CharField(max_length=9)
+    token_number = models.PositiveIntegerField()
+    document = models.JSONField(encoder=DjangoJSONEncoder)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["item_id", "token_number"], name="token_metadata_lookup_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id} #{self.token_number}"
+
+
+class Waveform(models.Model):
+    """
+    Downsampled peaks of an audio item's file1, computed by ``items.media`` so players can
+    draw the waveform without downloading and decoding the track.
+    """
+
+    item = models.OneToOneField(Item, on_delete=CASCADE, primary_key=True, related_name="waveform")
+    # file1 name the peaks were computed from; they're stale once it changes
+    source = models.CharField(max_length=255)
+    # Interleaved (min, max) int8 pairs, normalized to the loudest sample
+    peaks = models.BinaryField()
+    duration = models.FloatField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} ({len(self.peaks) // 2} peaks)"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response stored for a client-supplied `Idempotency-Key` so a retried request replays it.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    request_path = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_user_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.request_path})"
+
+
+class LikeFlush(models.Model):
+    """
+    Buffered like count changes applied by ``items.likes.flush_likes``, recorded in the same
+    transaction so a batch claimed twice, or retried after a crash, isn't added again.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload of an item's media, sent in parts straight to the file storage
+    by ``items.uploads`` and attached to the item once every part is verified.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE, related_name="upload_sessions")
+    item = models.ForeignKey(Item, on_delete=CASCADE, related_name="upload_sessions")
+    target = models.IntegerField(choices=UploadTarget.choices())
+    # Storage name the parts are assembled into
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    part_size = models.PositiveIntegerField()
+    content_type = models.CharField(max_length=255, blank=True, default="")
+    # S3 multipart upload id; empty for storages that take the parts through the API
+    upload_id = models.CharField(max_length=1024, blank=True, default="")
+    status = models.IntegerField(choices=UploadStatus.choices(), default=UploadStatus.OPEN.value)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.size} bytes)"
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.size // self.part_size))
+
+
+class MintJob(models.Model):
+    """
+    A mint of an item's editions, streamed into the token table by ``items.minting`` in
+    chunks of MINT_CHUNK_SIZE tokens; `minted` counts the tokens committed so far.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE, related_name="mint_jobs")
+    item = models.ForeignKey(Item, on_delete=CASCADE, related_name="mint_jobs")
+    # The validated [{"from_id", "to_id"}] ranges of mint ids
+    ids = models.JSONField()
+    sell_type = models.IntegerField(choices=ItemSellType.choices())
+    price = models.DecimalField(decimal_places=2, max_digits=12)
+    # Attached to the first edition of the mint
+    auction = models.OneToOneField(Auction, on_delete=SET_NULL, null=True, blank=True, related_name="+")
+    # Reserved from the item's token number sequence when the job is created
+    first_token_number = models.PositiveIntegerField()
+    total = models.PositiveIntegerField()
+    minted = models.PositiveIntegerField(default=0)
+    # Whether editions beyond each listing group's first EDITION_LOT_WINDOW are minted as lots
+    in_lots = models.BooleanField(default=False)
+    status = models.IntegerField(choices=MintStatus.choices(), default=MintStatus.PENDING.value)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.item} editions {self.first_token_number}-{self.first_token_number + self.total - 1}"
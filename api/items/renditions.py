@@ -0,0 +1,127 @@
+import posixpath
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from imagekit import ImageSpec
+from imagekit.processors import ResizeToFit, Thumbnail, Transpose
+from rest_framework import serializers
+from utils.tasks import defer
+
+from . import cache
+
+
+class Card(ImageSpec):
+    processors = [Transpose(), Thumbnail(480, 480)]
+
+
+class Detail(ImageSpec):
+    processors = [Transpose(), ResizeToFit(1200, 1200, upscale=False)]
+
+
+class Avatar(ImageSpec):
+    processors = [Transpose(), Thumbnail(128, 128)]
+
+
+SPECS = {"card": Card, "detail": Detail, "avatar": Avatar}
+
+# Each rendition is stored as WebP, with a JPEG fallback for clients without WebP support.
+FORMATS = {"webp": ("WEBP", {"quality": 80}), "jpeg": ("JPEG", {"quality": 85, "progressive": True})}
+
+# Renditions of each image field, by model label. They are stored in `<field>_renditions`.
+IMAGE_FIELDS = {
+    "items.Item": {"cover_img": ("card", "detail")},
+    "users.User": {"profile_image": ("avatar",), "cover_image": ("card", "detail")},
+}
+
+
+def rendition_name(source_name, size, extension):
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, "renditions", f"{stem}-{size}.{extension}")
+
+
+def generate_renditions(model_label, pk, field_name, source_name):
+    """
+    Generates and stores the renditions of an image field, unless the image was
+    replaced after the renditions were scheduled.
+
+    returns: Whether the renditions were stored.
+    rtype: bool
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only(field_name).first()
+    if instance is None or getattr(instance, field_name).name != source_name:
+        return False
+
+    source = getattr(instance, field_name)
+    renditions = {"source": source_name}
+    for size in IMAGE_FIELDS[model_label][field_name]:
+        renditions[size] = {}
+        for extension, (image_format, options) in FORMATS.items():
+            spec = SPECS[size](source=source)
+            spec.format = image_format
+            spec.options = options
+            name = rendition_name(source_name, size, extension)
+            source.storage.delete(name)
+            renditions[size][extension] = source.storage.save(name, ContentFile(spec.generate().read()))
+
+    changes = {f"{field_name}_renditions": renditions}
+    now = timezone.now()
+    for name in ("updated_at", "modified_at"):
+        if any(field.name == name for field in model._meta.concrete_fields):
+            changes[name] = now
+    # Only store them if the image is still the one they were generated from.
+    stored = model.objects.filter(pk=pk, **{field_name: source_name}).update(**changes)
+    if stored:
+        cache.bump(cache.TOKENS, cache.ITEMS)
+    return bool(stored)
+
+
+def pending_renditions(instance):
+    """
+    returns: The image fields of an instance whose renditions are missing or out of date.
+    rtype: list[str]
+    """
+    return [
+        field_name
+        for field_name in IMAGE_FIELDS.get(instance._meta.label, ())
+        if getattr(instance, field_name)
+        and getattr(instance, f"{field_name}_renditions").get("source") != getattr(instance, field_name).name
+    ]
+
+
+def schedule_renditions(instance):
+    """
+    Generates the instance's missing renditions in the background once the current transaction commits.
+    """
+    for field_name in pending_renditions(instance):
+        defer(generate_renditions, instance._meta.label, instance.pk, field_name, getattr(instance, field_name).name)
+
+
+class RenditionsField(serializers.Field):
+    """
+    Serializes the renditions of an image field as {size: {format: url}}, or null
+    while they're being generated and clients should fall back to the original.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        super().__init__(source="*", read_only=True, **kwargs)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        renditions = getattr(instance, f"{self.image_field}_renditions")
+        if not image or renditions.get("source") != image.name:
+            return None
+
+        request = self.context.get("request")
+        urls = {}
+        for size, names in renditions.items():
+            if size == "source":
+                continue
+            urls[size] = {}
+            for extension, name in names.items():
+                url = image.storage.url(name)
+                urls[size][extension] = request.build_absolute_uri(url) if request else url
+        return urls
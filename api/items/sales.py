@@ -0,0 +1,44 @@
+from django.utils import timezone
+from utils.queries import update_returning
+
+from . import cache, metadata
+from .listings import refresh_listings
+from .lots import move_editions
+from .models import Item
+
+
+def change_sale(tokens, lots=None, count=None, **fields):
+    """
+    Applies the sale `fields` to the first `count` editions of `tokens`, or all of them, in
+    token number order, then to the editions of `lots` if the tokens run short. Tokens on
+    auction are skipped: their auction has to be settled or cancelled one at a time.
+    Must be called inside a transaction.
+
+    returns: The ids of the changed tokens and the number of changed lot editions.
+    rtype: tuple[list[int], int]
+    """
+    tokens = tokens.filter(auction__isnull=True).order_by("token_number")
+    ids = update_returning(tokens if count is None else tokens[:count], **fields, updated_at=timezone.now())
+    Item.objects.filter(sold_set__pk__in=ids).mark_modified()
+    moved = 0
+    if lots is not None and (count is None or len(ids) < count):
+        moved = move_editions(lots, None if count is None else count - len(ids), **fields)
+    return ids, moved
+
+
+def bulk_change_sale(keys, tokens, lots=None, count=None, **fields):
+    """
+    Changes the sale of a set of tokens with `change_sale` and refreshes the listings they
+    leave, the (collectible, owner, on_sale) `keys`, and the ones they join.
+    Must be called inside a transaction.
+
+    returns: The ids of the changed tokens and the number of changed editions, lots included.
+    rtype: tuple[list[int], int]
+    """
+    ids, moved = change_sale(tokens, lots, count, **fields)
+    if "on_sale" in fields:
+        keys = [*keys, *((collectible_id, owner_id, fields["on_sale"]) for collectible_id, owner_id, _ in keys)]
+    refresh_listings(keys)
+    metadata.invalidate_documents(token_id__in=ids)
+    cache.bump(cache.TOKENS, cache.ITEMS)
+    return ids, len(ids) + moved
@@ -0,0 +1,100 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db.models import Case, F, FloatField, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Concat, Greatest
+
+from .models import Category, Item
+
+SEARCH_CONFIG = "english"
+
+
+def item_search_vector():
+    """
+    Returns the weighted search document of an Item row: title (A), creator
+    display name and category name (B) and description (C).
+
+    Related names are read through subqueries so the expression can be used
+    in a set-based UPDATE.
+    """
+    creator_name = Subquery(
+        get_user_model()
+        .objects.filter(pk=OuterRef("creator_id"))
+        .annotate(name=Concat("first_name", Value(" "), "last_name"))
+        .values("name")[:1]
+    )
+    category_name = Subquery(Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1])
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(creator_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(items):
+    """
+    Recomputes the search document of the given items in one UPDATE.
+
+    returns: Number of items updated.
+    rtype: int
+    """
+    return items.update(search_vector=item_search_vector())
+
+
+def search_tokens(tokens, text):
+    """
+    Returns the tokens whose listing's item matches a web-search style query, with a rank field.
+
+    rtype: Token QuerySet
+    """
+    query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+    # ts_rank returns a real; as double precision it survives the round trip through a keyset cursor.
+    rank = Cast(SearchRank(F("listing__collectible__search_vector"), query), FloatField())
+    return tokens.filter(listing__collectible__search_vector=query).annotate(rank=rank)
+
+
+def _typeahead(queryset, fields, text, limit):
+    # Substring and fuzzy matches are both served by the gin_trgm_ops indexes on `fields`.
+    pattern = re.escape(text)
+    matches = Q()
+    for field in fields:
+        matches |= Q(**{f"{field}__trigram_similar": text}) | Q(**{f"{field}__iregex": pattern})
+    prefix = Q()
+    for field in fields:
+        prefix |= Q(**{f"{field}__istartswith": text})
+    similarities = [TrigramSimilarity(field, text) for field in fields]
+    return (
+        queryset.filter(matches)
+        .annotate(
+            is_prefix=Case(When(prefix, then=Value(1)), default=Value(0), output_field=IntegerField()),
+            similarity=Greatest(*similarities) if len(similarities) > 1 else similarities[0],
+        )
+        .order_by("-is_prefix", "-similarity", "id")[:limit]
+    )
+
+
+def autocomplete_users(text, limit):
+    """
+    Returns the users whose wallet address starts with `text`, or whose first or
+    last name is like `text`, best matches first.
+
+    rtype: User QuerySet
+    """
+    users = get_user_model().objects.only(
+        "id", "first_name", "last_name", "wallet_token", "profile_image", "profile_image_renditions"
+    )
+    if text[:2].lower() == "0x":
+        return users.filter(wallet_token__istartswith=text).order_by("wallet_token", "id")[:limit]
+    return _typeahead(users, ["first_name", "last_name"], text, limit)
+
+
+def autocomplete_items(text, limit):
+    """
+    Returns the items whose title is like `text`, best matches first.
+
+    rtype: Item QuerySet
+    """
+    items = Item.objects.only("id", "item_id", "title", "cover_img", "cover_img_renditions")
+    return _typeahead(items, ["title"], text, limit)
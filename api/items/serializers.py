@@ -1,12 +1,20 @@
 from collections import OrderedDict
 from decimal import Decimal
 
+from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.fields import ReadOnlyField
 
 from . import models
+from .likes import LikesCountField
+from .lots import group_lots
+from .media import MediaInfoField, schedule_media_info
+from .minting import create_mint_job
+from .renditions import RenditionsField
+from .sales import bulk_change_sale
+from .uploads import start_upload
 
 
 def is_auction_required(serializer):
@@ -86,7 +94,11 @@ class ItemCollaborators(serializers.ModelSerializer):
 
 class TokenCollectibleSerializer(serializers.ModelSerializer):
     files = ItemFileSerializer(many=True)
+    file1_info = MediaInfoField("file1")
+    files_info = MediaInfoField("file", related="files")
     collaborators = ItemCollaborators(many=True)
+    cover_img_renditions = RenditionsField("cover_img")
+    likes_count = LikesCountField()
 
     class Meta:
         model = models.Item
@@ -94,8 +106,11 @@ class TokenCollectibleSerializer(serializers.ModelSerializer):
             "id",
             "contract_address",
             "file1",
+            "file1_info",
             "files",
+            "files_info",
             "cover_img",
+            "cover_img_renditions",
             "token_amt",
             "token_sold",
             "title",
@@ -107,10 +122,13 @@ class TokenCollectibleSerializer(serializers.ModelSerializer):
             "category",
             "is_360_video",
             "collaborators",
+            "likes_count",
         )
 
 
 class BidSerializer(serializers.ModelSerializer):
+    auction = serializers.PrimaryKeyRelatedField(queryset=models.Auction.objects.all())
+
     class Meta:
         model = models.Bid
         fields = (
@@ -129,13 +147,15 @@ class BidSerializer(serializers.ModelSerializer):
         auction = attrs.get("auction")
         bid_value = attrs.get("bid_value")
         highest_bid = auction.current_bidding_price
-        highest_bidder_id = auction.highest_bidder_id
         starting_bidding_price = auction.starting_bidding_price
 
         if not hasattr(auction, "token"):
             raise serializers.ValidationError({"auction": ["auction does not have a token"]})
 
         token_owner_id = auction.token.owner_id
+        token = self.context.get("token")
+        if token is not None and token.auction_id != auction.pk:
+            raise serializers.ValidationError({"auction": ["auction is not the auction of this token"]})
 
         if auction.start_date > now:
             raise serializers.ValidationError({"auction": [f"bid must be created after {auction.start_date}"]})
@@ -143,7 +163,7 @@ class BidSerializer(serializers.ModelSerializer):
         if auction.end_date < now:
             raise serializers.ValidationError({"auction": [f"auction has ended at {auction.end_date}"]})
 
-        if highest_bidder_id:
+        if auction.highest_bid_id:
             if highest_bid >= bid_value:
                 raise serializers.ValidationError(
                     {"bid_value": ["Your bid is lower than the highest bid." + " Please enter a higher amount"]}
@@ -260,7 +280,11 @@ class ItemCollaboratorSerializer(serializers.ModelSerializer):
 class ItemSerializer(serializers.ModelSerializer):
     tokens = serializers.SerializerMethodField()
     liked = serializers.SerializerMethodField()
+    likes_count = LikesCountField()
     files = ItemFileSerializer(many=True, required=False)
+    file1_info = MediaInfoField("file1")
+    files_info = MediaInfoField("file", related="files")
+    cover_img_renditions = RenditionsField("cover_img")
     collaborators = ItemCollaboratorSerializer(many=True, required=False)
 
     # Token
@@ -279,6 +303,7 @@ class ItemSerializer(serializers.ModelSerializer):
             "is_super_featured",
             "item_id",
             "liked",
+            "likes_count",
             "tokens",
             "token_sold",
         ]
@@ -288,9 +313,12 @@ class ItemSerializer(serializers.ModelSerializer):
             "contract_address",
             "collaborators",
             "cover_img",
+            "cover_img_renditions",
             "description",
             "file1",
+            "file1_info",
             "files",
+            "files_info",
             "is_360_video",
             "token_amt",
             "title",
@@ -307,11 +335,20 @@ class ItemSerializer(serializers.ModelSerializer):
         self.fields["auction"].required = is_auction_required(self)
 
     def get_tokens(self, obj):
-        instances = models.Token.objects.filter(collectible=obj, is_sold=False)
+        if hasattr(obj, "unsold_tokens"):
+            instances = obj.unsold_tokens
+        else:
+            instances = (
+                models.Token.objects.filter(collectible=obj, is_sold=False)
+                .select_related("auction")
+                .order_by("token_number")
+            )
         serializer = ItemTokenSerializer(instances, many=True)
         return serializer.data
 
     def get_liked(self, obj):
+        if hasattr(obj, "is_liked"):
+            return obj.is_liked
         request = self.context.get("request", None)
         if request and request.user.is_authenticated:
             return obj.likes.filter(id=request.user.id).exists()
@@ -390,6 +427,17 @@ class ItemSerializer(serializers.ModelSerializer):
                 item_file_lists,
                 batch_size=1000,
             )
+            # bulk_create skips post_save, which probes the files saved one at a time.
+            for item_file in item_file_lists:
+                schedule_media_info(item_file)
+
+
+class ItemAutocompleteSerializer(serializers.ModelSerializer):
+    cover_img_renditions = RenditionsField("cover_img")
+
+    class Meta:
+        model = models.Item
+        fields = ("id", "item_id", "title", "cover_img", "cover_img_renditions")
 
 
 class TokenIDsSerializer(serializers.Serializer):
@@ -427,62 +475,143 @@ class ItemMintSerializer(serializers.Serializer):
         validate_sell_type_with_auction(attrs)
         return attrs
 
-    def mint_tokens(self, item, validated_data):
-        ids = validated_data.get("ids")
-        sell_type = int(validated_data.get("sell_type", models.ItemSellType.NONE.value))
-        auction_data = validated_data.get("auction") if sell_type == models.ItemSellType.AUCTION.value else None
-        price = validated_data.get("price")
-        on_sale = sell_type != models.ItemSellType.NONE.value
+    def create_mint_job(self, item, user):
+        """
+        Reserves the token numbers of the mint and records it. Must be called inside a transaction.
+
+        rtype: MintJob
+        """
+        sell_type = int(self.validated_data.get("sell_type", models.ItemSellType.NONE.value))
+        return create_mint_job(
+            item,
+            user,
+            self.validated_data["ids"],
+            sell_type,
+            self.validated_data.get("price"),
+            auction_data=self.validated_data.get("auction"),
+        )
 
-        auction = self.__create_auctions(sell_type, auction_data)
-        self.__create_tokens(item, ids, sell_type, price, on_sale, auction)
-        return item
 
-    def __create_auctions(self, sell_type, auction_data):
-        # Only 1 auction can be active for a newly created collectible.
-        if sell_type != models.ItemSellType.AUCTION.value:
-            return None
-        return models.Auction.objects.create(**auction_data)
-
-    def __create_tokens(self, item, ids, sell_type, price, on_sale, auction):
-        tokens = []
-        default_token_data = {
-            "collectible": item,
-            "owner": item.creator,
-            "sell_type": sell_type,
+class MintJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.MintJob
+        read_only_fields = [
+            "id",
+            "item",
+            "first_token_number",
+            "total",
+            "minted",
+            "status",
+            "error",
+            "created_at",
+            "finished_at",
+        ]
+        fields = read_only_fields
+
+
+class TokenListingSelectorSerializer(serializers.Serializer):
+    collectible = serializers.IntegerField()
+    on_sale = serializers.BooleanField()
+
+
+class TokenBulkUpdateSerializer(serializers.Serializer):
+    """
+    Changes the sale of many of the user's tokens at once, selected by the `listing` they're
+    in or by `ids`. Auctions are started and cancelled one token at a time, so editions can
+    only be put on instant sale, repriced or taken off sale.
+    """
+
+    listing = TokenListingSelectorSerializer(required=False, write_only=True)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.BULK_UPDATE_MAX_IDS,
+        required=False,
+        write_only=True,
+    )
+    count = serializers.IntegerField(min_value=1, required=False, write_only=True)
+    on_sale = serializers.BooleanField(write_only=True)
+    price = serializers.DecimalField(
+        decimal_places=2, max_digits=12, min_value=Decimal("0.01"), required=False, write_only=True
+    )
+
+    def validate(self, attrs: OrderedDict):
+        if ("listing" in attrs) == ("ids" in attrs):
+            raise serializers.ValidationError("Select the tokens by either listing or ids")
+        if attrs["on_sale"] and "price" not in attrs:
+            raise serializers.ValidationError({"price": ["price is required to put tokens on sale"]})
+        if "ids" in attrs:
+            user = self.context["request"].user
+            owned = models.Token.objects.filter(pk__in=attrs["ids"], owner=user).count()
+            if owned != len(set(attrs["ids"])):
+                raise serializers.ValidationError({"ids": ["user is not the owner of every token"]})
+        return attrs
+
+    def change_sale(self, user):
+        """
+        Applies the change in set-based updates. Must be called inside a transaction.
+
+        returns: The ids of the changed tokens and the number of changed editions, lots included.
+        rtype: dict
+        """
+        on_sale = self.validated_data["on_sale"]
+        fields = {
             "on_sale": on_sale,
-            "price": price,
+            "sell_type": models.ItemSellType.INSTANT_BUY.value if on_sale else models.ItemSellType.NONE.value,
+            "price": self.validated_data["price"] if on_sale else Decimal("0.00"),
         }
-        token_number = 1
-        for id_range in ids:
-            for i in range(id_range["from_id"], id_range["to_id"] + 1):
-                token_data = default_token_data.copy()
-                token_data.update({"token_number": token_number, "mint_id": i})
-
-                if sell_type == models.ItemSellType.AUCTION.value:
-                    # Only 1 auction can be active for a newly created collectible.
-                    if token_number == 1:
-                        token_data.update({"auction": auction})
-                    else:
-                        token_data.update(
-                            {
-                                "sell_type": models.ItemSellType.NONE.value,
-                                "on_sale": False,
-                                "price": 0,
-                            }
-                        )
-                token_number += 1
-                tokens.append(models.Token(**token_data))
-        models.Token.objects.bulk_create(tokens, batch_size=1000)
-
-
-class TokenDetailsSerializer(serializers.Serializer):
-    token_number = serializers.IntegerField()
-    name = serializers.CharField(max_length=64)
-    description = serializers.CharField(max_length=10000, allow_blank=True)
-    category = serializers.CharField(max_length=64, allow_null=True)
-    file1 = serializers.FileField(allow_null=True)
-    files = serializers.ListField(child=serializers.FileField(), allow_empty=True)
-    creator = serializers.CharField(max_length=64)
-    owner = serializers.CharField(max_length=64)
-    is_360_video = serializers.BooleanField()
+        tokens = models.Token.objects.filter(owner=user)
+        if "listing" in self.validated_data:
+            listing = self.validated_data["listing"]
+            collectible_id, listed = listing["collectible"], listing["on_sale"]
+            tokens = tokens.filter(collectible_id=collectible_id, on_sale=listed)
+            keys = [(collectible_id, user.id, listed)]
+            lots = group_lots(collectible_id, user.id, listed)
+        else:
+            tokens = tokens.filter(pk__in=self.validated_data["ids"])
+            groups = tokens.order_by().values_list("collectible_id", "on_sale").distinct()
+            keys = [(collectible_id, user.id, listed) for collectible_id, listed in groups]
+            lots = None
+        ids, count = bulk_change_sale(keys, tokens, lots, self.validated_data.get("count"), **fields)
+        return {"ids": ids, "count": count}
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    filename = serializers.CharField(write_only=True, max_length=100)
+
+    class Meta:
+        model = models.UploadSession
+        read_only_fields = ["id", "name", "part_size", "part_count", "status", "created_at", "completed_at"]
+        fields = read_only_fields + ["item", "target", "filename", "size", "content_type"]
+
+    def validate_item(self, value):
+        if value.creator_id != self.context["request"].user.id:
+            raise serializers.ValidationError("You can only upload files to your own items")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Files must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes")
+        return value
+
+    def create(self, validated_data):
+        return start_upload(self.context["request"].user, **validated_data)
+
+
+class UploadPartsSerializer(serializers.Serializer):
+    part_numbers = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_part_numbers(self, value):
+        part_count = self.context["session"].part_count
+        if max(value) > part_count:
+            raise serializers.ValidationError(f"This upload has {part_count} parts")
+        return sorted(set(value))
+
+
+class UploadedPartSerializer(serializers.Serializer):
+    part_number = serializers.IntegerField(min_value=1)
+    etag = serializers.CharField(max_length=64)
+
+
+class UploadCompleteSerializer(serializers.Serializer):
+    parts = UploadedPartSerializer(many=True)
@@ -0,0 +1,187 @@
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache, metadata
+from .likes import record_likes
+from .listings import listing_key, refresh_listings
+from .media import schedule_media_info, schedule_waveform
+from .models import Auction, Bid, Category, EditionLot, Item, ItemCollaborator, ItemFile, Token
+from .renditions import schedule_renditions
+from .search import update_search_vectors
+
+# Models whose rows are rendered in the cached token and item feeds. Listings are
+# derived from tokens; the bulk paths that rebuild them bump the namespaces themselves.
+FEED_MODELS = (Item, ItemFile, ItemCollaborator, Token, Auction, Bid, settings.AUTH_USER_MODEL)
+
+
+def invalidate_feeds(sender, update_fields=None, **kwargs):
+    # Logins only save last_login, which no feed shows.
+    if update_fields != frozenset(["last_login"]):
+        cache.bump(cache.TOKENS, cache.ITEMS)
+
+
+for model in FEED_MODELS:
+    post_save.connect(invalidate_feeds, sender=model, dispatch_uid=f"invalidate_feeds_save_{model}")
+    post_delete.connect(invalidate_feeds, sender=model, dispatch_uid=f"invalidate_feeds_delete_{model}")
+
+
+@receiver(post_save, sender=Bid)
+@receiver(post_delete, sender=Bid)
+def refresh_auction_bids(sender, instance, created=False, **kwargs):
+    # Bid.save() only folds new bids into their auction; edits and deletes recompute it from the bids.
+    if created:
+        return
+    Auction.objects.filter(pk=instance.auction_id).refresh_bids()
+    refresh_listings([listing_key(token) for token in Token.objects.filter(auction_id=instance.auction_id)])
+
+
+@receiver(m2m_changed, sender=Item.likes.through)
+def buffer_like_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    # Clears don't say what they remove, so it's counted before.
+    if action == "pre_clear":
+        if reverse:
+            item_ids = sender.objects.filter(user_id=instance.pk).values_list("item_id", flat=True)
+            record_likes({item_id: -1 for item_id in item_ids})
+        else:
+            record_likes({instance.pk: -sender.objects.filter(item_id=instance.pk).count()})
+    elif action in ("post_add", "post_remove"):
+        sign = 1 if action == "post_add" else -1
+        record_likes({item_id: sign for item_id in pk_set} if reverse else {instance.pk: sign * len(pk_set)})
+
+
+@receiver(post_save, sender=ItemFile)
+@receiver(post_delete, sender=ItemFile)
+@receiver(post_save, sender=ItemCollaborator)
+@receiver(post_delete, sender=ItemCollaborator)
+def touch_item(sender, instance, **kwargs):
+    """
+    Files and collaborators are rendered with their item, so they advance its updated_at.
+    """
+    now = timezone.now()
+    Item.objects.filter(pk=instance.item_id).update(updated_at=now, modified_at=now)
+    if sender is ItemFile:
+        metadata.invalidate_documents(token__collectible_id=instance.item_id)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+@receiver(post_save, sender=EditionLot)
+@receiver(post_delete, sender=EditionLot)
+def mark_collectible_modified(sender, instance, **kwargs):
+    Item.objects.filter(pk=instance.collectible_id).mark_modified()
+
+
+@receiver(post_save, sender=Auction)
+@receiver(pre_delete, sender=Auction)
+@receiver(post_save, sender=Bid)
+@receiver(post_delete, sender=Bid)
+def mark_auctioned_items_modified(sender, instance, **kwargs):
+    auction_id = instance.auction_id if sender is Bid else instance.pk
+    Item.objects.filter(pk__in=Token.objects.filter(auction_id=auction_id).values("collectible_id")).mark_modified()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    cache.bump(cache.CATEGORIES)
+
+
+@receiver(post_save, sender=Token)
+def invalidate_token_metadata(sender, instance, created, **kwargs):
+    if not created:
+        metadata.invalidate_documents(token_id=instance.pk)
+
+
+@receiver(post_save, sender=Item)
+def invalidate_item_metadata(sender, instance, created, **kwargs):
+    if not created:
+        metadata.invalidate_documents(token__collectible_id=instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_category_metadata(sender, instance, created=False, **kwargs):
+    if not created:
+        metadata.invalidate_documents(token__collectible__category_id=instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_metadata(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only save last_login, which no document shows.
+    if not created and update_fields != frozenset(["last_login"]):
+        metadata.invalidate_user_documents(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def touch_category_items(sender, instance, created=False, **kwargs):
+    """
+    Category names are rendered in token documents, so category changes advance their items'
+    updated_at, which incremental metadata exports select tokens and lots by.
+    """
+    if not created:
+        now = timezone.now()
+        Item.objects.filter(category=instance).update(updated_at=now, modified_at=now)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_display_name(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is not None and (update_fields is None or {"first_name", "last_name"} & set(update_fields)):
+        saved = sender.objects.filter(pk=instance.pk).only("first_name", "last_name").first()
+        instance._saved_display_name = saved.display_name if saved else instance.display_name
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def touch_renamed_user_tokens(sender, instance, created, **kwargs):
+    """
+    Owner and creator names are rendered in token documents, so renames advance the updated_at
+    of the user's tokens, lots and created items, which incremental metadata exports select by.
+    """
+    saved_display_name = instance.__dict__.pop("_saved_display_name", instance.display_name)
+    if created or saved_display_name == instance.display_name:
+        return
+    now = timezone.now()
+    Item.objects.filter(creator=instance).update(updated_at=now, modified_at=now)
+    Token.objects.filter(owner=instance).update(updated_at=now)
+    EditionLot.objects.filter(owner=instance).update(updated_at=now)
+    owned = Q(pk__in=Token.objects.filter(owner=instance).values("collectible_id")) | Q(
+        pk__in=EditionLot.objects.filter(owner=instance).values("collectible_id")
+    )
+    Item.objects.filter(owned).mark_modified()
+
+
+@receiver(post_save, sender=Item)
+def update_item_search_vector(sender, instance, **kwargs):
+    update_search_vectors(Item.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(Item.objects.filter(category=instance))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_creator_search_vectors(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields != frozenset(["last_login"]):
+        update_search_vectors(Item.objects.filter(creator=instance))
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def generate_image_renditions(sender, instance, **kwargs):
+    schedule_renditions(instance)
+
+
+@receiver(post_save, sender=Item)
+def build_item_waveform(sender, instance, **kwargs):
+    schedule_waveform(instance)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=ItemFile)
+def probe_media(sender, instance, **kwargs):
+    schedule_media_info(instance)
@@ -1,3 +1,1872 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import wave
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from itertools import islice
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from users.models import User
+
+from .admin import TokenAdmin
+from .auctions import finalize_ended_auctions, settle_auction, start_due_auctions
+from .likes import LocalLikeBuffer, apply_likes, flush_likes, get_like_buffer, likes_counts
+from .listings import rebuild_listings, refresh_listings
+from .lots import lot_supply, move_editions
+from .media import build_media_info, build_waveform, compute_peaks
+from .metadata import build_documents
+from .minting import copy_tokens, run_mint_job, token_rows
+from .models import (
+    Auction,
+    AuctionStatus,
+    Bid,
+    Category,
+    EditionLot,
+    Item,
+    ItemCollaborator,
+    ItemFile,
+    ItemSellType,
+    LikeFlush,
+    Listing,
+    MintJob,
+    MintStatus,
+    Token,
+    TokenMetadata,
+    UploadStatus,
+    UploadTarget,
+)
+from .renditions import generate_renditions, pending_renditions
+from .sales import change_sale
+from .search import update_search_vectors
+from .serializers import BidSerializer
+
+
+def create_listed_items(creator, count, editions=2):
+    items = []
+    for index in range(count):
+        item = Item.objects.create(title=f"Item {index}", royalties=Decimal("5"), creator=creator)
+        ItemFile.objects.create(item=item, file=f"items/file2/{index}.png")
+        ItemCollaborator.objects.create(item=item, share_percentage=Decimal("100"), user=creator)
+        Token.objects.bulk_create(
+            [
+                Token(
+                    collectible=item,
+                    owner=creator,
+                    token_number=number,
+                    sell_type=ItemSellType.INSTANT_BUY.value,
+                    price=Decimal("1.00"),
+                    on_sale=True,
+                    is_sold=number == 1,
+                )
+                for number in range(1, editions + 1)
+            ]
+        )
+        items.append(item)
+    rebuild_listings([item.id for item in items])
+    return items
+
+
+@contextmanager
+def locked_by_another_request(queryset):
+    """
+    Holds row locks on `queryset` from a second connection, as a concurrent request would.
+    """
+    locked, release = threading.Event(), threading.Event()
+
+    def hold():
+        try:
+            with transaction.atomic():
+                list(queryset.select_for_update())
+                locked.set()
+                release.wait(10)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    locked.wait(10)
+    try:
+        yield
+    finally:
+        release.set()
+        thread.join()
+
+
+class TokenListQueryCountTest(TestCase):
+    # count, tokens page, collectibles, files, collaborators
+    LIST_QUERIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        create_listed_items(cls.creator, 20)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_token_list_query_count_does_not_grow_with_page_size(self):
+        for limit in (1, 10, 20):
+            with self.assertNumQueries(self.LIST_QUERIES):
+                response = self.client.get("/api/tokens/", {"limit": limit})
+            self.assertEqual(len(response.data["results"]), limit)
+
+    def test_token_list_serializes_batched_collectible_fields(self):
+        response = self.client.get("/api/tokens/", {"limit": 1})
+        collectible = response.data["results"][0]["collectible"]
+        self.assertEqual(collectible["token_sold"], 1)
+        self.assertEqual(len(collectible["files"]), 1)
+        self.assertEqual(len(collectible["collaborators"]), 1)
+
+    def test_user_token_tab_query_count_does_not_grow_with_page_size(self):
+        for limit in (1, 20):
+            with self.assertNumQueries(self.LIST_QUERIES + 1):  # + the user lookup
+                self.client.get(f"/api/users/{self.creator.id}/tokens/owned/", {"limit": limit})
+
+
+class ItemListQueryCountTest(TestCase):
+    # count, items page, files, collaborators, unsold tokens
+    LIST_QUERIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.items = create_listed_items(cls.creator, 20)
+        cls.items[0].likes.add(cls.creator)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_item_list_query_count_does_not_grow_with_page_size(self):
+        for limit in (1, 10, 20):
+            with self.assertNumQueries(self.LIST_QUERIES):
+                response = self.client.get("/api/items/", {"limit": limit})
+            self.assertEqual(len(response.data["results"]), limit)
+
+    def test_item_list_serializes_liked_flag_and_unsold_tokens(self):
+        self.client.force_authenticate(self.creator)
+        response = self.client.get("/api/items/", {"limit": 20})
+        liked = {item["id"]: item["liked"] for item in response.data["results"]}
+        self.assertTrue(liked.pop(self.items[0].id))
+        self.assertFalse(any(liked.values()))
+        self.assertEqual(len(response.data["results"][0]["tokens"]), 1)
+
+
+class AnonymousResponseCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.items = create_listed_items(cls.creator, 3)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_anonymous_list_is_served_from_cache(self):
+        first = self.client.get("/api/tokens/", {"limit": 2, "offset": 0})
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/tokens/", {"offset": 0, "limit": 2})
+        self.assertEqual(first.data, second.data)
+
+    def test_authenticated_list_is_not_cached(self):
+        self.client.get("/api/items/")
+        self.client.force_authenticate(self.creator)
+        with self.assertNumQueries(ItemListQueryCountTest.LIST_QUERIES):
+            self.client.get("/api/items/")
+
+    def test_writes_invalidate_cached_lists(self):
+        self.assertEqual(self.client.get("/api/items/").data["count"], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[0].delete()
+        self.assertEqual(self.client.get("/api/items/").data["count"], 2)
+
+    def test_logins_keep_cached_lists(self):
+        self.client.get("/api/tokens/")
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.creator)
+        with self.assertNumQueries(0):
+            self.client.get("/api/tokens/")
+
+    @override_settings(LIKE_FLUSH_SECONDS=3600)
+    def test_like_flushes_invalidate_cached_token_list(self):
+        get_like_buffer().clear()
+        self.client.get("/api/tokens/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[0].likes.add(self.creator)
+        with self.assertNumQueries(0):
+            self.client.get("/api/tokens/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flush_likes(), 1)
+        with self.assertNumQueries(TokenListQueryCountTest.LIST_QUERIES):
+            self.client.get("/api/tokens/")
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.bidder = User.objects.create(username="bidder", first_name="Bidder")
+        cls.item = create_listed_items(cls.creator, 1)[0]
+        cls.item.files.all().delete()
+        cls.token = cls.item.sold_set.get(is_sold=False)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    # One query reads the items' version
+    def assertNotModified(self, url, etag):
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_token_item_and_metadata_answer_not_modified(self):
+        for url in (
+            f"/api/tokens/{self.token.id}/",
+            f"/api/items/{self.item.id}/",
+            f"/api/metadata/{self.item.item_id}/{self.token.token_number}/",
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.has_header("Last-Modified"))
+            self.assertNotModified(url, response["ETag"])
+
+    def test_bids_change_the_token_etag(self):
+        auction = Auction.objects.create(
+            start_date=timezone.now(), end_date=timezone.now() + timedelta(days=1), starting_bidding_price=1
+        )
+        Token.objects.filter(pk=self.token.pk).update(auction=auction)
+        url = f"/api/tokens/{self.token.id}/"
+        etag = self.client.get(url)["ETag"]
+        Bid.objects.create(auction=auction, bidder=self.bidder, bid_value=Decimal("2"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["auction"]["current_bidding_price"], Decimal("2"))
+
+    def test_token_auction_and_lot_writes_change_the_item_etag(self):
+        lot = EditionLot.objects.create(
+            collectible=self.item,
+            owner=self.creator,
+            sell_type=ItemSellType.INSTANT_BUY.value,
+            price=Decimal("1.00"),
+            on_sale=True,
+            first_token_number=3,
+            first_mint_id=3,
+            count=2,
+        )
+        auction = Auction.objects.create(
+            start_date=timezone.now() - timedelta(minutes=1),
+            end_date=timezone.now() + timedelta(days=1),
+            starting_bidding_price=1,
+        )
+        other_token = self.item.sold_set.exclude(pk=self.token.pk).get()
+        Token.objects.filter(pk=other_token.pk).update(auction=auction)
+
+        def start_auction():
+            Auction.objects.filter(pk=auction.pk).update(status=AuctionStatus.SCHEDULED.value)
+            self.assertEqual(start_due_auctions(10), 1)
+
+        # Writes that bypass the models' save()
+        writes = {
+            "tokens": lambda: change_sale(Token.objects.filter(pk=self.token.pk), price=Decimal("3.00")),
+            "lots": lambda: move_editions(EditionLot.objects.filter(pk=lot.pk), on_sale=False),
+            "auctions": start_auction,
+            "bids": lambda: Bid.objects.bulk_create([Bid(auction=auction, bidder=self.bidder, bid_value=2)]),
+        }
+        for url in (f"/api/items/{self.item.id}/", f"/api/tokens/{self.token.id}/"):
+            for name, write in writes.items():
+                etag = self.client.get(url)["ETag"]
+                write()
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, (url, name))
+
+    def test_item_etag_differs_per_user(self):
+        url = f"/api/items/{self.item.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.client.force_authenticate(self.creator)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(LIKE_FLUSH_SECONDS=3600)
+    def test_likes_change_the_item_etag_without_writing_the_item(self):
+        get_like_buffer().clear()
+        url = f"/api/items/{self.item.id}/"
+        anonymous_etag = self.client.get(url)["ETag"]
+        self.client.force_authenticate(self.bidder)
+        etag = self.client.get(url)["ETag"]
+        versions = Item.objects.filter(pk=self.item.pk).values("updated_at", "modified_at").get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"{url}like-toggle/")
+        self.assertEqual(Item.objects.filter(pk=self.item.pk).values("updated_at", "modified_at").get(), versions)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data["liked"], response.data["likes_count"]), (200, True, 1))
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anonymous_etag).status_code, 200)
+        # Flushes write the count, and with it the item's version
+        etag = self.client.get(url)["ETag"]
+        flush_likes()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotModified(url, self.client.get(url)["ETag"])
+
+
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        items = create_listed_items(cls.creator, 6)
+        # Pairs of listings tie on each sort key, so only the id tiebreaker orders them.
+        for index, item in enumerate(items):
+            Listing.objects.filter(collectible=item).update(current_price=Decimal(index // 2 + 1), likes=index % 3)
+        cls.listings = list(Listing.objects.values("token", "current_price", "likes"))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def page_through(self, sort_by):
+        ids = []
+        response = self.client.get("/api/tokens/", {"sort_by": sort_by, "limit": 1, "cursor": ""})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [token["id"] for token in response.data["results"]]
+            if response.data["next"] is None:
+                return ids
+            response = self.client.get(response.data["next"])
+
+    def test_cursors_round_trip_every_sort_order_through_ties(self):
+        for sort_by, key in (("id", None), ("currentPrice", "current_price"), ("likes", "likes")):
+            for descending in (False, True):
+                expected = sorted(self.listings, key=lambda row: (row[key], row["token"]) if key else row["token"])
+                if descending:
+                    expected.reverse()
+                ordering = f"-{sort_by}" if descending else sort_by
+                self.assertEqual(self.page_through(ordering), [row["token"] for row in expected], ordering)
+
+    def test_malformed_cursors_are_not_found(self):
+        def cursor(position):
+            return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+        for value in (
+            "not a cursor",
+            cursor({"id": 1}),
+            cursor([1, 2, 3]),
+            cursor(["cheap", 1]),
+            cursor([None, 1]),
+            cursor([[1], {"id": 1}]),
+        ):
+            response = self.client.get("/api/tokens/", {"sort_by": "currentPrice", "cursor": value})
+            self.assertEqual(response.status_code, 404, value)
+        self.assertEqual(self.client.get("/api/items/", {"cursor": cursor(["first"])}).status_code, 404)
+
+
+class TokenMetadataTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.buyer = User.objects.create(username="buyer", first_name="Buyer")
+        cls.item = create_listed_items(cls.creator, 1, editions=3)[0]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get_metadata(self, token_number):
+        return self.client.get(f"/api/metadata/{self.item.item_id}/{token_number}/")
+
+    def test_metadata_is_built_once_and_served_in_one_query(self):
+        first = self.get_metadata(2)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data["owner"], "Creator")
+        self.assertEqual(first.data["files"], ["http://testserver/media/items/file2/0.png"])
+        with self.assertNumQueries(1):
+            second = self.get_metadata(2)
+        self.assertEqual(first.data, second.data)
+
+    def test_metadata_is_rebuilt_when_the_owner_changes(self):
+        self.get_metadata(2)
+        token = self.item.sold_set.get(token_number=2)
+        token.owner = self.buyer
+        token.save()
+        self.assertEqual(self.get_metadata(2).data["owner"], "Buyer")
+
+    def test_metadata_is_rebuilt_when_the_item_changes(self):
+        self.get_metadata(2)
+        self.item.title = "Renamed"
+        self.item.save()
+        self.assertEqual(self.get_metadata(2).data["name"], "Renamed")
+
+    def test_unknown_token_is_not_found(self):
+        self.assertEqual(self.get_metadata(9).status_code, 404)
+        self.assertEqual(self.get_metadata("x").status_code, 404)
+
+    def test_batch_returns_documents_in_requested_order(self):
+        response = self.client.get(f"/api/metadata/{self.item.item_id}/", {"token_numbers": "3,1,9"})
+        self.assertEqual([document["token_number"] for document in response.data["results"]], [3, 1])
+        with self.assertNumQueries(1):
+            self.client.get(f"/api/metadata/{self.item.item_id}/", {"token_numbers": "1,3"})
+
+    def test_batch_rejects_invalid_token_numbers(self):
+        response = self.client.get(f"/api/metadata/{self.item.item_id}/", {"token_numbers": "1,a"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTokenMetadataTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.collector = User.objects.create(username="collector", first_name="Collector")
+        cls.category = Category.objects.create(name="Art")
+        cls.items = create_listed_items(cls.creator, 2)
+        Item.objects.filter(pk=cls.items[0].pk).update(category=cls.category)
+        Token.objects.filter(collectible=cls.items[1], token_number=2).update(owner=cls.collector)
+        EditionLot.objects.create(
+            collectible=cls.items[1],
+            owner=cls.creator,
+            sell_type=ItemSellType.INSTANT_BUY.value,
+            price=Decimal("1.00"),
+            on_sale=True,
+            first_token_number=3,
+            first_mint_id=3,
+            count=2,
+        )
+        cls.all_documents = {(item.item_id, number) for item in cls.items for number in (1, 2)} | {
+            (cls.items[1].item_id, 3),
+            (cls.items[1].item_id, 4),
+        }
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def export(self, *args):
+        """
+        Runs the export and removes the documents it wrote, keeping the checkpoint. Its output is kept in `self.output`.
+
+        returns: The written documents by (item_id, token_number).
+        rtype: dict
+        """
+        self.output = StringIO()
+        call_command("export_token_metadata", "--workers=1", *args, stdout=self.output)
+        documents = {}
+        for item_id in default_storage.listdir("metadata")[0]:
+            for number in default_storage.listdir(f"metadata/{item_id}")[1]:
+                with default_storage.open(f"metadata/{item_id}/{number}") as document:
+                    documents[(item_id, int(number))] = json.load(document)
+                default_storage.delete(f"metadata/{item_id}/{number}")
+        return documents
+
+    def test_full_export_writes_every_token_and_lot_edition(self):
+        documents = self.export()
+        self.assertEqual(set(documents), self.all_documents)
+        self.assertEqual(documents[(self.items[0].item_id, 1)]["category"], "Art")
+        self.assertEqual(documents[(self.items[1].item_id, 2)]["owner"], "Collector")
+        self.assertEqual(documents[(self.items[1].item_id, 4)]["owner"], "Creator")
+        self.assertEqual(set(self.export()), self.all_documents)
+
+    def test_interrupted_export_resumes_after_the_checkpoint(self):
+        write_document = "items.management.commands.export_token_metadata.Command.write_document"
+        with mock.patch(write_document, side_effect=[None, None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                self.export("--batch-size=1")
+
+        # The first item's tokens were checkpointed; the next run picks up after them.
+        remaining = self.all_documents - {(self.items[0].item_id, 1), (self.items[0].item_id, 2)}
+        self.assertEqual(set(self.export()), remaining)
+        self.assertIn("Resuming the run", self.output.getvalue())
+        self.assertEqual(self.export("--incremental"), {})
+
+    def test_incremental_export_writes_changed_tokens_lots_and_renames(self):
+        self.export()
+        self.assertEqual(self.export("--incremental"), {})
+
+        token = self.items[0].sold_set.get(token_number=2)
+        token.price = Decimal("2.00")
+        token.save()
+        self.assertEqual(set(self.export("--incremental")), {(self.items[0].item_id, 2)})
+
+        self.category.name = "Photography"
+        self.category.save()
+        documents = self.export("--incremental")
+        self.assertEqual(set(documents), {(self.items[0].item_id, 1), (self.items[0].item_id, 2)})
+        self.assertEqual(documents[(self.items[0].item_id, 1)]["category"], "Photography")
+
+        self.collector.first_name = "Renamed"
+        self.collector.save()
+        documents = self.export("--incremental")
+        self.assertEqual(set(documents), {(self.items[1].item_id, 2)})
+        self.assertEqual(documents[(self.items[1].item_id, 2)]["owner"], "Renamed")
+
+        # Saves that keep the display name don't re-export anything
+        self.collector.twitter = "collector"
+        self.collector.save()
+        self.assertEqual(self.export("--incremental"), {})
+
+        self.creator.last_name = "Smith"
+        self.creator.save()
+        documents = self.export("--incremental")
+        self.assertEqual(set(documents), self.all_documents)
+        self.assertEqual(documents[(self.items[1].item_id, 3)]["creator"], "Creator Smith")
+
+
+class TokenSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Ada", last_name="Lovelace")
+        cls.items = create_listed_items(cls.creator, 3)
+        cls.items[0].title = "Harbor at dusk"
+        cls.items[0].save()
+        cls.items[1].description = "A quiet harbor"
+        cls.items[1].is_featured = True
+        cls.items[1].save()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get("/api/tokens/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return [token["collectible"]["id"] for token in response.data["results"]]
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search(q="harbors"), [self.items[0].id, self.items[1].id])
+
+    def test_search_covers_creator_name_and_combines_with_filters(self):
+        self.assertEqual(len(self.search(q="lovelace")), 3)
+        self.assertEqual(self.search(q="harbor", is_featured=True), [self.items[1].id])
+
+    def test_search_pages_by_rank_with_a_cursor(self):
+        response = self.client.get("/api/tokens/search/", {"q": "harbor", "limit": 1, "cursor": ""})
+        second = self.client.get(response.data["next"])
+        ids = [page.data["results"][0]["collectible"]["id"] for page in (response, second)]
+        self.assertEqual(ids, [self.items[0].id, self.items[1].id])
+        self.assertIsNone(second.data["next"])
+
+    def test_search_requires_a_query(self):
+        self.assertEqual(self.client.get("/api/tokens/search/").status_code, 400)
+
+
+class AutocompleteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ada = User.objects.create(username="ada", first_name="Ada", last_name="Lovelace", wallet_token="0xAbC123")
+        cls.grace = User.objects.create(username="grace", first_name="Grace", last_name="Hopper", wallet_token="0xdef")
+        cls.items = create_listed_items(cls.ada, 2)
+        cls.items[0].title = "Lovely harbor"
+        cls.items[0].save()
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def autocomplete(self, query, **params):
+        response = self.client.get("/api/autocomplete/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_names_and_titles_match_by_prefix_and_typo(self):
+        self.assertEqual([user["id"] for user in self.autocomplete("lovel")["users"]], [self.ada.id])
+        self.assertEqual([user["id"] for user in self.autocomplete("Hoper")["users"]], [self.grace.id])
+        self.assertEqual(self.autocomplete("lovel")["items"][0]["id"], self.items[0].id)
+
+    def test_wallet_addresses_match_by_case_insensitive_prefix(self):
+        self.assertEqual([user["id"] for user in self.autocomplete("0xabc")["users"]], [self.ada.id])
+
+    def test_short_queries_return_nothing(self):
+        self.assertEqual(self.autocomplete("ad"), {"users": [], "items": []})
+
+
+# Tables large enough in production that a sequential scan on them is a regression
+PLAN_GUARDED_TABLES = {
+    "items_item",
+    "items_itemfile",
+    "items_itemcollaborator",
+    "items_item_likes",
+    "items_token",
+    "items_listing",
+    "items_auction",
+    "items_bid",
+}
+
+
+# Titles are pairs of these, so a search matches a handful of items as it would in production
+SEED_WORDS = """
+    amber harbor neon velvet granite willow cobalt ember lagoon meadow
+    orchid quartz saffron tundra umber violet zephyr canyon drift fjord
+    glacier hollow indigo juniper kestrel lantern mirage nebula obsidian prairie
+""".split()
+
+
+def seed_marketplace(users=200, items=10000, editions=4):
+    """
+    Seeds a marketplace large enough for the planner to prefer indexes where production would.
+    """
+    User.objects.bulk_create(
+        [
+            User(username=f"seed-{index}", first_name=f"Seed {index}", wallet_token=f"0x{index:040x}")
+            for index in range(users)
+        ]
+    )
+    user_ids = list(User.objects.filter(username__startswith="seed-").values_list("id", flat=True))
+    categories = Category.objects.bulk_create([Category(name=f"Category {index}") for index in range(10)])
+    words = len(SEED_WORDS)
+    created = Item.objects.bulk_create(
+        [
+            Item(
+                title=f"{SEED_WORDS[index % words]} {SEED_WORDS[index // words % words]}",
+                description="seeded",
+                royalties=Decimal("5"),
+                creator_id=user_ids[index % users],
+                category=categories[index % len(categories)],
+                is_featured=index % 50 == 0,
+                is_topseller=index % 70 == 0,
+                token_amt=editions,
+                likes_count=index * 7 % 40,
+            )
+            for index in range(items)
+        ],
+        batch_size=1000,
+    )
+    ItemFile.objects.bulk_create([ItemFile(item=item, file=f"items/file2/{item.id}.png") for item in created])
+    ItemCollaborator.objects.bulk_create(
+        [ItemCollaborator(item=item, share_percentage=Decimal("100"), user_id=item.creator_id) for item in created]
+    )
+    Item.likes.through.objects.bulk_create(
+        [
+            Item.likes.through(item=item, user_id=user_ids[(item.id + offset) % users])
+            for item in created
+            for offset in range(item.likes_count)
+        ],
+        batch_size=5000,
+    )
+    now = timezone.now()
+    # Every sold edition went through an auction that has since been settled.
+    settled = Auction.objects.bulk_create(
+        [
+            Auction(
+                start_date=now - timedelta(days=index % 300 + 2),
+                end_date=now - timedelta(days=index % 300 + 1),
+                starting_bidding_price=1,
+                status=AuctionStatus.SETTLED.value,
+            )
+            for index in range(items * (editions // 2))
+        ],
+        batch_size=5000,
+    )
+    auctions = Auction.objects.bulk_create(
+        [
+            Auction(
+                start_date=now - timedelta(days=1),
+                end_date=now + timedelta(days=index % 5 + 1),
+                starting_bidding_price=1,
+                status=AuctionStatus.LIVE.value,
+            )
+            for index in range(0, items, 10)
+        ]
+    )
+    tokens = []
+    for index, item in enumerate(created):
+        auction = auctions[index // 10] if index % 10 == 0 else None
+        for number in range(1, editions + 1):
+            sold = number <= editions // 2
+            on_auction = auction is not None and number == editions
+            tokens.append(
+                Token(
+                    collectible=item,
+                    owner_id=user_ids[(index + number) % users] if sold else item.creator_id,
+                    token_number=number,
+                    mint_id=number,
+                    sell_type=ItemSellType.AUCTION.value if on_auction else ItemSellType.INSTANT_BUY.value,
+                    auction=auction if on_auction else None,
+                    price=Decimal(index % 97 + 1),
+                    on_sale=not sold,
+                    is_sold=sold,
+                )
+            )
+    Token.objects.bulk_create(tokens, batch_size=5000)
+    Bid.objects.bulk_create(
+        [
+            Bid(auction=auction, bidder_id=user_ids[(auction.id + number) % users], bid_value=Decimal(number + 1))
+            for auction, bids in [*((auction, 3) for auction in settled), *((auction, 20) for auction in auctions)]
+            for number in range(1, bids + 1)
+        ],
+        batch_size=5000,
+    )
+    rebuild_listings([item.id for item in created])
+    update_search_vectors(Item.objects.all())
+    with connection.cursor() as cursor:
+        # Merge the search index's pending entries as autovacuum would have by the time anyone searches.
+        cursor.execute("SELECT gin_clean_pending_list('item_search_vector_idx'::regclass)")
+        cursor.execute("ANALYZE")
+    return created
+
+
+def plan_problems(plan):
+    """
+    Returns the sequential scans of guarded tables and the on-disk sorts of an EXPLAIN (ANALYZE, FORMAT JSON) plan.
+    """
+    problems = []
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] in PLAN_GUARDED_TABLES:
+            problems.append(f"Seq Scan on {node['Relation Name']}")
+        if node.get("Sort Space Type") == "Disk":
+            problems.append(f"on-disk Sort by {node.get('Sort Key')}")
+        nodes.extend(node.get("Plans", []))
+    return problems
+
+
+class QueryPlanTest(TestCase):
+    """
+    Runs every list endpoint against a seeded marketplace and fails when the plan of
+    any of its queries scans a large table sequentially or sorts on disk.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.items = seed_marketplace()
+        cls.user = cls.items[0].creator
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assertPlansUseIndexes(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, url)
+
+        for query in context.captured_queries:
+            if not query["sql"].startswith("SELECT"):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query['sql']}")
+                plan = cursor.fetchone()[0][0]["Plan"]
+            self.assertEqual(plan_problems(plan), [], f"{url} {params}: {query['sql']}")
+
+    def test_token_list_plans(self):
+        for params in (
+            {},
+            {"sort_by": "-currentPrice"},
+            {"sort_by": "likes"},
+            {"is_featured": True},
+            {"is_topseller": True},
+            {"filter": self.items[0].category_id},
+        ):
+            self.assertPlansUseIndexes("/api/tokens/", {"cursor": "", **params})
+
+    def test_token_search_plan(self):
+        self.assertPlansUseIndexes("/api/tokens/search/", {"q": self.items[1999].title, "cursor": ""})
+
+    def test_token_detail_plans(self):
+        token = self.items[5].sold_set.get(token_number=4)
+        self.assertPlansUseIndexes(f"/api/tokens/{token.id}/")
+        self.assertPlansUseIndexes(f"/api/metadata/{self.items[5].item_id}/4/")
+
+    def test_item_list_plans(self):
+        for params in ({}, {"is_featured": True}, {"filter": self.items[0].category_id}):
+            self.assertPlansUseIndexes("/api/items/", {"cursor": "", **params})
+        self.assertPlansUseIndexes(f"/api/items/{self.items[5].id}/")
+
+    def test_user_token_tab_plans(self):
+        for tab in ("owned", "on-sale", "created", "likes"):
+            self.assertPlansUseIndexes(f"/api/users/{self.user.id}/tokens/{tab}/", {"cursor": ""})
+
+
+def png(width, height):
+    buffer = BytesIO()
+    Image.new("RGBA", (width, height), (200, 30, 30, 255)).save(buffer, "PNG")
+    return ContentFile(buffer.getvalue())
+
+
+class ImageRenditionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.item = create_listed_items(cls.creator, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client = APIClient()
+
+    def open_rendition(self, url):
+        return Image.open(default_storage.open(url.replace("http://testserver/media/", "")))
+
+    def test_renditions_are_generated_after_commit_and_served_once_ready(self):
+        self.item.cover_img.save("cover.png", png(2000, 1500))
+        self.assertEqual(pending_renditions(self.item), ["cover_img"])
+        url = f"/api/items/{self.item.id}/"
+        self.assertIsNone(self.client.get(url).data["cover_img_renditions"])
+
+        self.assertTrue(generate_renditions("items.Item", self.item.id, "cover_img", self.item.cover_img.name))
+        renditions = self.client.get(url).data["cover_img_renditions"]
+        self.assertEqual(set(renditions), {"card", "detail"})
+        card = self.open_rendition(renditions["card"]["webp"])
+        self.assertEqual((card.format, card.size), ("WEBP", (480, 480)))
+        detail = self.open_rendition(renditions["detail"]["jpeg"])
+        self.assertEqual((detail.format, detail.size), ("JPEG", (1200, 900)))
+        token_list = self.client.get("/api/tokens/").data["results"]
+        self.assertEqual(token_list[0]["collectible"]["cover_img_renditions"], renditions)
+
+    def test_renditions_of_a_replaced_image_are_not_stored(self):
+        self.item.cover_img.save("first.png", png(600, 600))
+        first = self.item.cover_img.name
+        self.item.cover_img.save("second.png", png(600, 600))
+        self.assertFalse(generate_renditions("items.Item", self.item.id, "cover_img", first))
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.cover_img_renditions, {})
+
+    def test_profile_images_get_avatar_renditions(self):
+        self.creator.profile_image.save("avatar.png", png(800, 600))
+        generate_renditions("users.User", self.creator.id, "profile_image", self.creator.profile_image.name)
+        renditions = self.client.get(f"/api/users/{self.creator.id}/").data["profile_image_renditions"]
+        self.assertEqual(set(renditions), {"avatar"})
+        self.assertEqual(self.open_rendition(renditions["avatar"]["webp"]).size, (128, 128))
+
+
+@override_settings(UPLOAD_PART_SIZE=4)
+class UploadSessionTest(TestCase):
+    CONTENT = b"0123456789"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.other = User.objects.create(username="other", first_name="Other")
+        cls.item = create_listed_items(cls.creator, 1)[0]
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def start(self, target=UploadTarget.ITEM_FILE.value, item=None):
+        return self.client.post(
+            "/api/users/me/uploads/",
+            {
+                "item": (item or self.item).id,
+                "target": target,
+                "filename": "clip.mp4",
+                "size": len(self.CONTENT),
+                "content_type": "video/mp4",
+            },
+        )
+
+    def upload_parts(self, session, part_numbers, content=CONTENT):
+        urls = self.client.post(f"/api/users/me/uploads/{session['id']}/urls/", {"part_numbers": part_numbers})
+        etags = {}
+        for number in part_numbers:
+            start = (number - 1) * session["part_size"]
+            chunk = content[start : start + session["part_size"]]
+            response = self.client.put(urls.data["urls"][number], chunk, content_type="application/octet-stream")
+            self.assertEqual(response.status_code, 200)
+            etags[number] = response["ETag"]
+        return etags
+
+    def complete(self, session, etags):
+        parts = [{"part_number": number, "etag": etag} for number, etag in etags.items()]
+        return self.client.post(f"/api/users/me/uploads/{session['id']}/complete/", {"parts": parts}, format="json")
+
+    def test_interrupted_upload_resumes_and_attaches_an_item_file(self):
+        session = self.start().data
+        self.assertEqual((session["part_size"], session["part_count"]), (4, 3))
+        etags = self.upload_parts(session, [1, 3])
+
+        resumed = self.client.get(f"/api/users/me/uploads/{session['id']}/").data
+        self.assertEqual([part["part_number"] for part in resumed["parts"]], [1, 3])
+        self.assertEqual(self.complete(session, etags).status_code, 400)
+
+        etags.update(self.upload_parts(session, [2]))
+        response = self.complete(session, etags)
+        self.assertEqual(response.status_code, 200)
+        item_file = ItemFile.objects.get(item=self.item, file__startswith="items/file2/clip")
+        self.assertIn(item_file.file.name, response.data["files"])
+        with item_file.file.open() as uploaded:
+            self.assertEqual(uploaded.read(), self.CONTENT)
+        self.assertEqual(default_storage.listdir(f"uploads/{session['id']}")[1], [])
+        self.assertEqual(self.complete(session, etags).status_code, 404)
+
+    def test_file1_upload_replaces_the_item_file(self):
+        session = self.start(target=UploadTarget.FILE1.value).data
+        self.assertEqual(self.complete(session, self.upload_parts(session, [1, 2, 3])).status_code, 200)
+        self.item.refresh_from_db()
+        self.assertTrue(self.item.file1.name.startswith("items/file1/clip"))
+
+    def test_completion_verifies_part_sizes_and_etags(self):
+        session = self.start().data
+        etags = self.upload_parts(session, [1, 2, 3], content=b"012345678")
+        response = self.complete(session, etags)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("The parts don't add up to 10 bytes", response.data["parts"])
+
+        etags = self.upload_parts(session, [3])
+        etags.update({1: '"0"', 2: etags[3]})
+        response = self.complete(session, etags)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["parts"], ["Part 1 doesn't match its ETag", "Part 2 doesn't match its ETag"])
+
+    def test_parts_are_rejected_past_the_part_size_or_count(self):
+        session = self.start().data
+        url = f"/api/users/me/uploads/{session['id']}/parts/"
+        put = self.client.put(f"{url}1/", b"01234", content_type="application/octet-stream")
+        self.assertEqual(put.status_code, 400)
+        put = self.client.put(f"{url}4/", b"0", content_type="application/octet-stream")
+        self.assertEqual(put.status_code, 404)
+
+    def test_sessions_are_private_to_the_item_creator(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.start().status_code, 400)
+        self.client.force_authenticate(self.creator)
+        session = self.start().data
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(f"/api/users/me/uploads/{session['id']}/").status_code, 404)
+
+    def test_aborted_sessions_delete_their_parts(self):
+        session = self.start().data
+        self.upload_parts(session, [1])
+        self.assertEqual(self.client.delete(f"/api/users/me/uploads/{session['id']}/").status_code, 204)
+        self.assertFalse(default_storage.exists(f"uploads/{session['id']}/00001"))
+        self.assertEqual(self.item.upload_sessions.get().status, UploadStatus.ABORTED.value)
+
+
+def wav(seconds, rate=44100):
+    buffer = BytesIO()
+    time = np.arange(int(seconds * rate)) / rate
+    # A 440Hz tone fading in over the track
+    samples = (np.sin(2 * np.pi * 440 * time) * 20000 * time / seconds).astype("<i2")
+    with wave.open(buffer, "wb") as track:
+        track.setnchannels(1)
+        track.setsampwidth(2)
+        track.setframerate(rate)
+        track.writeframes(samples.tobytes())
+    return ContentFile(buffer.getvalue())
+
+
+class WaveformTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.item = create_listed_items(cls.creator, 1)[0]
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client = APIClient()
+
+    def test_peaks_are_normalized_min_max_pairs_of_equal_slices(self):
+        samples = np.array([0, 100, -200, 50, 400, -400, 0], dtype="<i2")
+        peaks = np.frombuffer(compute_peaks(samples, 4), dtype=np.int8)
+        self.assertEqual(peaks.tolist(), [0, 32, -64, 16, -127, 127, 0, 0])
+        self.assertEqual(compute_peaks(samples[:0], 2), bytes(4))
+
+    @skipUnless(shutil.which(settings.FFMPEG_BINARY), "ffmpeg is not installed")
+    def test_waveform_is_served_until_the_track_changes(self):
+        self.item.file1.save("track.wav", wav(3))
+        self.assertTrue(build_waveform(self.item.id, self.item.file1.name))
+
+        url = f"/api/items/{self.item.id}/waveform/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        peaks = np.frombuffer(response.content, dtype=np.int8).reshape(-1, 2)
+        self.assertEqual(len(peaks), settings.WAVEFORM_PEAKS)
+        # The tone fades in, so the last slices are the loudest
+        self.assertEqual(np.abs(peaks.astype(int)).max(), 127)
+        self.assertLess(peaks[-1, 0], -120)
+        self.assertGreater(peaks[-1, 1], 120)
+        self.assertLess(peaks[10, 1], 10)
+        self.assertAlmostEqual(self.item.waveform.duration, 3, places=2)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        self.item.file1.save("other.wav", wav(1))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class AuctionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username="seller", first_name="Seller")
+        cls.bidder = User.objects.create(username="bidder", first_name="Bidder")
+        cls.item = create_listed_items(cls.seller, 1, editions=1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.bidder)
+
+    def auction_token(self, start, end):
+        auction = Auction.objects.create(start_date=start, end_date=end, starting_bidding_price=Decimal("1.00"))
+        token = Token.objects.get(collectible=self.item)
+        Token.objects.filter(pk=token.pk).update(auction=auction, sell_type=ItemSellType.AUCTION.value, on_sale=True)
+        rebuild_listings([self.item.id])
+        return auction, token
+
+    def listing(self):
+        return Listing.objects.get(collectible=self.item)
+
+    def test_auctions_that_have_started_are_live_from_creation(self):
+        now = timezone.now()
+        auction, _ = self.auction_token(now, now + timedelta(days=1))
+        self.assertEqual(auction.status, AuctionStatus.LIVE.value)
+        self.assertTrue(self.listing().is_live)
+        scheduled = Auction.objects.create(
+            start_date=now + timedelta(hours=1), end_date=now + timedelta(days=1), starting_bidding_price=1
+        )
+        self.assertEqual(scheduled.status, AuctionStatus.SCHEDULED.value)
+
+    def test_due_auctions_are_started(self):
+        start = timezone.now() + timedelta(hours=1)
+        auction, _ = self.auction_token(start, start + timedelta(days=1))
+        self.assertFalse(self.listing().is_live)
+        self.assertEqual(start_due_auctions(10, now=start - timedelta(minutes=1)), 0)
+
+        self.assertEqual(start_due_auctions(10, now=start + timedelta(minutes=1)), 1)
+        auction.refresh_from_db()
+        self.assertEqual(auction.status, AuctionStatus.LIVE.value)
+        self.assertTrue(self.listing().is_live)
+
+    def test_ended_auctions_go_to_the_highest_bidder(self):
+        now = timezone.now()
+        auction, token = self.auction_token(now, now + timedelta(days=1))
+        Bid.objects.create(auction=auction, bidder=self.seller, bid_value=Decimal("2"))
+        Bid.objects.create(auction=auction, bidder=self.bidder, bid_value=Decimal("3"))
+        self.assertEqual(finalize_ended_auctions(10, now=now + timedelta(hours=1)), 0)
+
+        self.assertEqual(finalize_ended_auctions(10, now=now + timedelta(days=2)), 1)
+        token.refresh_from_db()
+        auction.refresh_from_db()
+        self.assertEqual(auction.status, AuctionStatus.SETTLED.value)
+        self.assertEqual((token.owner, token.on_sale, token.is_sold, token.auction), (self.bidder, False, True, None))
+        self.assertEqual(list(Listing.objects.values_list("owner", "on_sale", "supply")), [(self.bidder.id, False, 1)])
+
+    def test_auctions_without_bids_are_settled_with_the_seller(self):
+        now = timezone.now()
+        auction, token = self.auction_token(now - timedelta(days=2), now - timedelta(days=1))
+        with transaction.atomic():
+            settle_auction(auction, Token.objects.select_for_update().get(pk=token.pk))
+        token.refresh_from_db()
+        self.assertEqual((token.owner, token.on_sale, token.sell_type), (self.seller, False, ItemSellType.NONE.value))
+        self.assertEqual(finalize_ended_auctions(10), 0)
+
+    def test_finalize_endpoint(self):
+        now = timezone.now()
+        auction, token = self.auction_token(now, now + timedelta(days=1))
+        Bid.objects.create(auction=auction, bidder=self.bidder, bid_value=Decimal("3"))
+        url = f"/api/tokens/{token.id}/finalize-auction/"
+        self.assertEqual(self.client.post(url).status_code, 400)
+
+        Auction.objects.filter(pk=auction.pk).update(end_date=now - timedelta(minutes=1))
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["owner"], self.bidder.id)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(finalize_ended_auctions(10), 0)
+
+
+class BidColumnsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username="seller", first_name="Seller")
+        cls.bidders = [User.objects.create(username=f"bidder-{index}", first_name="Bidder") for index in range(3)]
+        cls.item = create_listed_items(cls.seller, 1, editions=1)[0]
+        now = timezone.now()
+        cls.auction = Auction.objects.create(start_date=now, end_date=now + timedelta(days=1), starting_bidding_price=1)
+        Token.objects.filter(collectible=cls.item).update(auction=cls.auction, sell_type=ItemSellType.AUCTION.value)
+        rebuild_listings([cls.item.id])
+
+    def bid(self, bidder, value):
+        return Bid.objects.create(auction=self.auction, bidder=bidder, bid_value=Decimal(value))
+
+    def columns(self):
+        auction = Auction.objects.get(pk=self.auction.pk)
+        listing = Listing.objects.get(collectible=self.item)
+        return auction.current_bid, auction.highest_bid_id, auction.bid_count, listing.current_price
+
+    def test_new_bids_are_folded_into_the_auction(self):
+        first = self.bid(self.bidders[0], "2")
+        self.bid(self.bidders[1], "2")
+        self.assertEqual(self.columns()[:3], (Decimal("2"), first.id, 2))
+
+    def test_deleting_the_highest_bid_falls_back_to_the_next(self):
+        low = self.bid(self.bidders[0], "2")
+        high = self.bid(self.bidders[1], "3")
+        refresh_listings([(self.item.id, self.seller.id, True)])
+        high.delete()
+        self.assertEqual(self.columns(), (Decimal("2"), low.id, 1, Decimal("2")))
+
+        low.delete()
+        self.assertEqual(self.columns(), (None, None, 0, Decimal("1")))
+
+    def test_bids_deleted_with_their_bidder_are_taken_out(self):
+        low = self.bid(self.bidders[0], "2")
+        self.bid(self.bidders[1], "3")
+        self.bid(self.bidders[1], "4")
+        self.bidders[1].delete()
+        self.assertEqual(self.columns(), (Decimal("2"), low.id, 1, Decimal("2")))
+
+    def test_edited_and_bulk_created_bids_are_recomputed(self):
+        bid = self.bid(self.bidders[0], "2")
+        bid.bid_value = Decimal("5")
+        bid.save()
+        self.assertEqual(self.columns(), (Decimal("5"), bid.id, 1, Decimal("5")))
+
+        bids = Bid.objects.bulk_create([Bid(auction=self.auction, bidder=self.bidders[2], bid_value=Decimal("7"))])
+        self.assertEqual(self.columns()[:3], (Decimal("7"), bids[0].id, 2))
+
+
+class ListingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username="seller", first_name="Seller")
+        cls.buyer = User.objects.create(username="buyer", first_name="Buyer")
+        cls.staff = User.objects.create(username="listing-staff", is_staff=True, is_superuser=True)
+        cls.item = create_listed_items(cls.seller, 1, editions=3)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.admin = TokenAdmin(Token, admin.site)
+        self.request = RequestFactory().post("/admin/items/token/")
+        self.request.user = self.staff
+
+    def edition(self, number):
+        return Token.objects.get(collectible=self.item, token_number=number)
+
+    def listings(self):
+        """
+        Asserts the listings match a rebuild from the tokens.
+
+        returns: (head token number, supply, price, current price) of each (owner, on_sale) group.
+        rtype: dict
+        """
+        rows = Listing.objects.filter(collectible=self.item).values_list(
+            "owner", "on_sale", "token__token_number", "supply", "price", "current_price"
+        )
+        listings = {(owner, on_sale): tuple(fields) for owner, on_sale, *fields in rows}
+        rebuild_listings([self.item.id])
+        self.assertEqual({(owner, on_sale): tuple(fields) for owner, on_sale, *fields in rows.all()}, listings)
+        return listings
+
+    def test_purchases_move_an_edition_to_the_buyers_listing(self):
+        response = self.client.post(f"/api/tokens/{self.edition(1).id}/purchase/", {"price": "1.00"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.listings(),
+            {
+                (self.seller.id, True): (2, 2, Decimal("1.00"), Decimal("1.00")),
+                (self.buyer.id, False): (1, 1, Decimal("1.00"), Decimal("1.00")),
+            },
+        )
+
+    def test_resold_tokens_are_listed_at_their_new_price(self):
+        response = self.client.post(f"/api/tokens/{self.edition(1).id}/purchase/", {"price": "1.00"})
+        token_id = response.data["old_token"]["id"]
+        response = self.client.patch(
+            f"/api/users/me/tokens/{token_id}/",
+            {"on_sale": True, "price": "4.00", "sell_type": ItemSellType.INSTANT_BUY.value},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listings()[self.buyer.id, True], (1, 1, Decimal("4.00"), Decimal("4.00")))
+        self.assertNotIn((self.buyer.id, False), self.listings())
+
+        start = timezone.now() + timedelta(minutes=1)
+        response = self.client.patch(
+            f"/api/users/me/tokens/{token_id}/",
+            {
+                "on_sale": True,
+                "price": "5.00",
+                "sell_type": ItemSellType.AUCTION.value,
+                "auction": {
+                    "start_date": start.isoformat(),
+                    "end_date": (start + timedelta(days=1)).isoformat(),
+                    "starting_bidding_price": "5.00",
+                },
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.listings()[self.buyer.id, True], (1, 1, Decimal("5.00"), Decimal("5.00")))
+
+        auction = self.edition(1).auction
+        Auction.objects.filter(pk=auction.pk).update(start_date=timezone.now(), status=AuctionStatus.LIVE.value)
+        self.client.force_authenticate(self.seller)
+        response = self.client.post(f"/api/tokens/{token_id}/place-bid/", {"auction": auction.id, "bid_value": "6.00"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listings()[self.buyer.id, True], (1, 1, Decimal("5.00"), Decimal("6.00")))
+
+    def test_admin_saves_and_deletes_refresh_the_listings(self):
+        head = self.edition(1)
+        head.price = Decimal("2.00")
+        self.admin.save_model(self.request, head, None, change=True)
+        self.assertEqual(self.listings()[self.seller.id, True], (1, 3, Decimal("2.00"), Decimal("2.00")))
+
+        head.owner = self.buyer
+        self.admin.save_model(self.request, head, None, change=True)
+        self.assertEqual(self.listings()[self.seller.id, True], (2, 2, Decimal("1.00"), Decimal("1.00")))
+        self.assertEqual(self.listings()[self.buyer.id, True], (1, 1, Decimal("2.00"), Decimal("2.00")))
+
+        self.admin.delete_model(self.request, self.edition(2))
+        self.assertEqual(self.listings()[self.seller.id, True], (3, 1, Decimal("1.00"), Decimal("1.00")))
+        self.admin.delete_model(self.request, self.edition(3))
+        self.assertEqual(list(self.listings()), [(self.buyer.id, True)])
+
+    def test_rebuilds_restore_listings_that_drifted(self):
+        Token.objects.filter(pk=self.edition(2).pk).update(owner=self.buyer, on_sale=False)
+        Listing.objects.filter(collectible=self.item).update(supply=9, current_price=Decimal("9"))
+        rebuild_listings([self.item.id])
+        self.assertEqual(
+            self.listings(),
+            {
+                (self.seller.id, True): (1, 2, Decimal("1.00"), Decimal("1.00")),
+                (self.buyer.id, False): (2, 1, Decimal("1.00"), Decimal("1.00")),
+            },
+        )
+
+
+class MintTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.item = Item.objects.create(title="Item", royalties=Decimal("5"), creator=cls.creator)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def mint(self, ids, sell_type=ItemSellType.INSTANT_BUY.value, **data):
+        return self.client.post(
+            f"/api/users/me/items/{self.item.id}/mint/",
+            {"ids": ids, "sell_type": sell_type, "price": "2.50", **data},
+            format="json",
+        )
+
+    def tokens(self):
+        return list(
+            Token.objects.filter(collectible=self.item)
+            .order_by("token_number")
+            .values_list("token_number", "mint_id", "on_sale", "price")
+        )
+
+    def test_repeated_mints_append_token_numbers(self):
+        response = self.mint([{"from_id": 7, "to_id": 8}, {"from_id": 20, "to_id": 20}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.mint([{"from_id": 30, "to_id": 31}]).status_code, 200)
+
+        self.assertEqual(
+            self.tokens(),
+            [(number, mint_id, True, Decimal("2.50")) for number, mint_id in enumerate([7, 8, 20, 30, 31], 1)],
+        )
+        listing = Listing.objects.get(collectible=self.item)
+        self.assertEqual((listing.supply, listing.token.token_number, listing.is_live), (5, 1, True))
+
+    def test_only_the_first_edition_of_an_auction_mint_is_on_sale(self):
+        auction = {
+            "start_date": (timezone.now() + timedelta(days=1)).isoformat(),
+            "end_date": (timezone.now() + timedelta(days=2)).isoformat(),
+            "starting_bidding_price": "2.50",
+        }
+        response = self.mint([{"from_id": 1, "to_id": 3}], sell_type=ItemSellType.AUCTION.value, auction=auction)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.tokens(),
+            [(1, 1, True, Decimal("2.50")), (2, 2, False, Decimal("0")), (3, 3, False, Decimal("0"))],
+        )
+        self.assertIsNotNone(Token.objects.get(collectible=self.item, token_number=1).auction)
+
+    @override_settings(MINT_SYNC_EDITIONS=3, MINT_CHUNK_SIZE=2)
+    def test_large_mints_run_as_jobs_that_report_progress(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.mint([{"from_id": 1, "to_id": 5}])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data["total"], response.data["minted"]), (5, 0))
+        deferred = [getattr(callback, "args", ()) for callback in callbacks]
+        self.assertIn((run_mint_job, response.data["id"]), [args[1:] for args in deferred])
+        self.assertEqual(self.tokens(), [])
+
+        job = MintJob.objects.get(pk=response.data["id"])
+        # A job interrupted after its first chunk resumes with the editions it hadn't copied.
+        copy_tokens(islice(token_rows(job, self.creator.id), 2))
+        MintJob.objects.filter(pk=job.pk).update(minted=2, status=MintStatus.FAILED.value)
+        run_mint_job(job.pk)
+
+        response = self.client.get(f"/api/users/me/mint-jobs/{job.pk}/")
+        self.assertEqual(response.data["status"], MintStatus.COMPLETED.value)
+        self.assertEqual(response.data["minted"], 5)
+        self.assertEqual([number for number, *_ in self.tokens()], [1, 2, 3, 4, 5])
+        self.assertEqual(Listing.objects.get(collectible=self.item).supply, 5)
+
+    @override_settings(MINT_SYNC_EDITIONS=3)
+    def test_a_job_runs_once_however_many_workers_are_handed_it(self):
+        job_id = self.mint([{"from_id": 1, "to_id": 5}]).data["id"]
+        self.assertTrue(run_mint_job(job_id))
+        self.assertFalse(run_mint_job(job_id))
+        call_command("resume_mint_jobs", "--running", stdout=StringIO())
+        self.assertEqual([number for number, *_ in self.tokens()], [1, 2, 3, 4, 5])
+
+        MintJob.objects.filter(pk=job_id).update(status=MintStatus.RUNNING.value)
+        self.assertFalse(run_mint_job(job_id))
+        self.assertEqual(len(self.tokens()), 5)
+
+
+@override_settings(EDITION_LOT_MIN_EDITIONS=5, EDITION_LOT_WINDOW=2)
+class EditionLotTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.buyer = User.objects.create(username="buyer", first_name="Buyer")
+        cls.item = Item.objects.create(title="Item", royalties=Decimal("5"), creator=cls.creator)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+        response = self.client.post(
+            f"/api/users/me/items/{self.item.id}/mint/",
+            {
+                "ids": [{"from_id": 1, "to_id": 4}, {"from_id": 10, "to_id": 15}],
+                "sell_type": ItemSellType.INSTANT_BUY.value,
+                "price": "2.50",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def editions(self):
+        tokens = Token.objects.filter(collectible=self.item, owner=self.creator).order_by("token_number")
+        lots = EditionLot.objects.filter(collectible=self.item).order_by("first_token_number")
+        return (
+            list(tokens.values_list("token_number", "mint_id")),
+            list(lots.values_list("first_token_number", "first_mint_id", "count")),
+        )
+
+    def test_large_mints_keep_a_window_of_tokens_and_the_rest_in_lots(self):
+        self.assertEqual(self.editions(), ([(1, 1), (2, 2)], [(3, 3, 2), (5, 10, 6)]))
+        listing = Listing.objects.get(collectible=self.item)
+        self.assertEqual((listing.supply, listing.token.token_number), (10, 1))
+
+        data = self.client.get(f"/api/items/{self.item.id}/").json()
+        self.assertEqual([token["id"] for token in data["tokens"]][:1], [listing.token_id])
+        self.assertEqual(self.client.get(f"/api/tokens/{listing.token_id}/").json()["supply"], 10)
+
+    def test_purchases_replace_the_sold_token_from_the_lots(self):
+        self.client.force_authenticate(self.buyer)
+        for _ in range(3):
+            head_id = Listing.objects.get(collectible=self.item, owner=self.creator).token_id
+            response = self.client.post(f"/api/tokens/{head_id}/purchase/", {"price": "2.50"})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.editions(), ([(4, 4), (5, 10)], [(6, 11, 5)]))
+        self.assertEqual(Listing.objects.get(collectible=self.item, owner=self.creator).supply, 7)
+        self.assertEqual(Token.objects.filter(collectible=self.item, owner=self.buyer).count(), 3)
+
+    def test_a_group_left_with_only_lots_is_listed_by_their_first_edition(self):
+        Token.objects.filter(collectible=self.item).delete()
+        rebuild_listings([self.item.id])
+        listing = Listing.objects.get(collectible=self.item)
+        self.assertEqual((listing.supply, listing.token.token_number, listing.token.mint_id), (8, 3, 3))
+
+    def test_reading_the_metadata_of_an_edition_leaves_its_lot_whole(self):
+        editions = self.editions()
+        self.client.force_authenticate(None)
+        response = self.client.get(f"/api/metadata/{self.item.item_id}/7/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["token_number"], response.json()["owner"]), (7, "Creator"))
+        self.assertEqual(response.get("ETag"), self.client.get(f"/api/metadata/{self.item.item_id}/7/").get("ETag"))
+        response = self.client.get(f"/api/metadata/{self.item.item_id}/", {"token_numbers": "2,7,11"})
+        self.assertEqual([document["token_number"] for document in response.json()["results"]], [2, 7])
+        self.assertEqual(self.editions(), editions)
+        self.assertFalse(TokenMetadata.objects.filter(token_number=7).exists())
+        self.assertEqual(self.client.get(f"/api/metadata/{self.item.item_id}/11/").status_code, 404)
+
+
+@override_settings(EDITION_LOT_MIN_EDITIONS=5, EDITION_LOT_WINDOW=2)
+class BulkSaleChangeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.other = User.objects.create(username="other", first_name="Other")
+        cls.item = Item.objects.create(title="Item", royalties=Decimal("5"), creator=cls.creator)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+        response = self.client.post(
+            f"/api/users/me/items/{self.item.id}/mint/",
+            {"ids": [{"from_id": 1, "to_id": 10}], "sell_type": ItemSellType.INSTANT_BUY.value, "price": "2.50"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def bulk(self, data):
+        return self.client.post("/api/users/me/tokens/bulk/", data, format="json")
+
+    def supplies(self):
+        return dict(Listing.objects.filter(collectible=self.item).values_list("on_sale", "supply"))
+
+    def auction_first_token(self):
+        now = timezone.now()
+        auction = Auction.objects.create(
+            start_date=now, end_date=now + timedelta(days=1), starting_bidding_price=Decimal("2.50")
+        )
+        Token.objects.filter(collectible=self.item, token_number=1).update(
+            auction=auction, sell_type=ItemSellType.AUCTION.value
+        )
+        return auction
+
+    def test_delisting_part_of_a_listing_moves_its_first_editions(self):
+        listing = {"collectible": self.item.id, "on_sale": True}
+        response = self.bulk({"listing": listing, "on_sale": False, "count": 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 4)
+        self.assertEqual(len(response.data["ids"]), 2)
+        self.assertEqual(self.supplies(), {True: 6, False: 4})
+        lots = EditionLot.objects.filter(collectible=self.item).order_by("first_token_number")
+        # The listing left without tokens takes its new head from the lot.
+        self.assertEqual(
+            list(lots.values_list("first_token_number", "count", "on_sale")), [(3, 2, False), (6, 5, True)]
+        )
+        self.assertEqual(Token.objects.filter(collectible=self.item, on_sale=False, price=0).count(), 2)
+
+    def test_repricing_a_whole_listing(self):
+        listing = {"collectible": self.item.id, "on_sale": True}
+        response = self.bulk({"listing": listing, "on_sale": True, "price": "4"})
+        self.assertEqual((response.status_code, response.data["count"]), (200, 10))
+        self.assertEqual(set(Token.objects.filter(collectible=self.item).values_list("price", flat=True)), {4})
+        self.assertEqual(set(EditionLot.objects.filter(collectible=self.item).values_list("price", flat=True)), {4})
+        listing = Listing.objects.get(collectible=self.item)
+        self.assertEqual((listing.supply, listing.price), (10, 4))
+
+    def test_tokens_selected_by_id(self):
+        token = Token.objects.get(collectible=self.item, token_number=2)
+        response = self.bulk({"ids": [token.id], "on_sale": False})
+        self.assertEqual((response.status_code, response.data["ids"]), (200, [token.id]))
+        self.assertEqual(self.supplies(), {True: 9, False: 1})
+
+        response = self.bulk({"ids": [token.id], "on_sale": True, "price": "3"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.supplies(), {True: 10})
+
+    def test_invalid_changes_are_rejected(self):
+        token = Token.objects.get(collectible=self.item, token_number=1)
+        listing = {"collectible": self.item.id, "on_sale": True}
+        self.assertEqual(self.bulk({"listing": listing, "on_sale": True}).status_code, 400)
+        self.assertEqual(self.bulk({"listing": listing, "ids": [token.id], "on_sale": False}).status_code, 400)
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.bulk({"ids": [token.id], "on_sale": False}).status_code, 400)
+        response = self.bulk({"listing": listing, "on_sale": False})
+        self.assertEqual((response.status_code, response.data["count"]), (200, 0))
+        self.assertEqual(self.supplies(), {True: 10})
+
+    def test_tokens_on_auction_are_skipped(self):
+        self.auction_first_token()
+        listing = {"collectible": self.item.id, "on_sale": True}
+        response = self.bulk({"listing": listing, "on_sale": False, "count": 1})
+        self.assertEqual(response.data["ids"], [Token.objects.get(collectible=self.item, token_number=2).id])
+
+    def test_admin_removes_only_the_selected_tokens_from_sale(self):
+        auction = self.auction_first_token()
+        staff = User.objects.create(username="bulk-sale-staff", is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        response = self.client.post(
+            "/admin/items/token/",
+            {"action": "remove_from_sale", "_selected_action": Token.objects.values_list("pk", flat=True)},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Token.objects.filter(collectible=self.item, on_sale=False).count(), 2)
+        self.assertFalse(Auction.objects.filter(pk=auction.pk).exists())
+        # The editions in lots weren't selected; the first of them now represents the listing.
+        self.assertEqual(Token.objects.filter(collectible=self.item, on_sale=True).get().token_number, 3)
+        self.assertEqual(lot_supply(EditionLot.objects.filter(collectible=self.item, on_sale=True)), 7)
+        self.assertEqual(self.supplies(), {True: 8, False: 2})
+
+
+@override_settings(LIKE_FLUSH_SECONDS=3600)
+class LikeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.liker = User.objects.create(username="liker", first_name="Liker")
+        cls.items = create_listed_items(cls.creator, 3)
+
+    def setUp(self):
+        cache.clear()
+        get_like_buffer().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.liker)
+
+    def listing_likes(self, item):
+        return set(Listing.objects.filter(collectible=item).values_list("likes", flat=True))
+
+    def test_toggling_likes_and_unlikes(self):
+        item = self.items[0]
+        for liked in (True, False, True):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f"/api/items/{item.id}/like-toggle/")
+            self.assertEqual(response.data, {"liked": liked})
+            self.assertEqual(self.client.get(f"/api/items/{item.id}/like-toggle/").data, {"liked": liked})
+        self.assertEqual(list(item.likes.all()), [self.liker])
+        self.assertEqual(self.client.post("/api/items/0/like-toggle/").status_code, 404)
+
+    def test_like_counts_are_buffered_until_flushed(self):
+        item = self.items[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/items/{item.id}/like-toggle/")
+            item.likes.add(self.creator)
+        self.assertEqual(self.client.get(f"/api/items/{item.id}/").data["likes_count"], 2)
+        self.assertEqual(self.listing_likes(item), {0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flush_likes(), 1)
+        item.refresh_from_db()
+        self.assertEqual((item.likes_count, self.listing_likes(item)), (2, {2}))
+        self.assertEqual(self.client.get(f"/api/items/{item.id}/").data["likes_count"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.creator.like_set.clear()
+            self.client.post(f"/api/items/{item.id}/like-toggle/")
+        self.assertEqual(likes_counts([item.id]), {item.id: 0})
+        flush_likes()
+        self.assertEqual(self.listing_likes(item), {0})
+        self.assertEqual(flush_likes(), 0)
+
+    def test_a_claim_applied_before_a_crash_is_not_applied_again(self):
+        item = self.items[0]
+        buffer = get_like_buffer()
+        buffer.add(item.id, 1)
+        buffer.claim()
+        (key,) = buffer.claims()
+        # The flush committed, then died before releasing its claim.
+        LikeFlush.objects.create(key=key)
+        apply_likes(buffer.claimed_deltas(key), batch_size=1000)
+
+        self.assertEqual(flush_likes(), 0)
+        item.refresh_from_db()
+        self.assertEqual((item.likes_count, buffer.claims()), (1, []))
+
+    @override_settings(LIKE_FLUSH_SECONDS=0)
+    def test_the_local_buffer_is_flushed_by_the_process_that_fills_it(self):
+        item = self.items[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/items/{item.id}/like-toggle/")
+        self.assertEqual(self.listing_likes(item), {1})
+
+    def test_pages_read_the_buffer_once(self):
+        self.items[0].likes.add(self.liker)
+        counted = mock.patch.object(LocalLikeBuffer, "pending", autospec=True, side_effect=LocalLikeBuffer.pending)
+        with counted as pending:
+            items = self.client.get("/api/items/").data["results"]
+            self.assertEqual(pending.call_count, 1)
+            tokens = self.client.get("/api/tokens/").data["results"]
+            self.assertEqual(pending.call_count, 2)
+        self.assertEqual(sorted(item["likes_count"] for item in items), [0, 0, 0])
+        self.assertEqual(len(tokens), 3)
+
+    def test_liked_items_are_read_in_one_query(self):
+        self.items[0].likes.add(self.liker)
+        self.items[2].likes.add(self.liker, self.creator)
+        ids = ",".join(str(item.id) for item in self.items)
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/items/liked/?ids={ids},0")
+        self.assertEqual(response.data, {"liked": sorted([self.items[0].id, self.items[2].id])})
+
+        self.assertEqual(self.client.get("/api/items/liked/?ids=a").status_code, 400)
+        self.assertEqual(self.client.get("/api/items/liked/").status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(f"/api/items/liked/?ids={ids}").data, {"liked": []})
+
+
+class MediaInfoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create(username="creator", first_name="Creator")
+        cls.item = create_listed_items(cls.creator, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client = APIClient()
+
+    def test_saving_files_schedules_a_probe(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.item.file1.save("art.png", png(64, 48))
+            item_file = ItemFile.objects.create(item=self.item, file="items/file2/extra.png")
+        # Deferred tasks are partials of the executor's submit(_run, function, *args).
+        deferred = [getattr(callback, "args", ()) for callback in callbacks]
+        scheduled = [args[2:] for args in deferred if args[1:2] == (build_media_info,)]
+        self.assertEqual(
+            scheduled,
+            [
+                ("items.Item", self.item.id, "file1", self.item.file1.name),
+                ("items.ItemFile", item_file.id, "file", "items/file2/extra.png"),
+            ],
+        )
+
+    def test_image_info_is_served_until_the_file_changes(self):
+        content = png(64, 48)
+        self.item.file1.save("art.png", content)
+        item_file = ItemFile.objects.create(item=self.item, file=default_storage.save("items/file2/b.png", png(8, 4)))
+        self.assertTrue(build_media_info("items.Item", self.item.id, "file1", self.item.file1.name))
+        self.assertTrue(build_media_info("items.ItemFile", item_file.id, "file", item_file.file.name))
+
+        data = self.client.get(f"/api/items/{self.item.id}/").json()
+        self.assertEqual(
+            data["file1_info"],
+            {
+                "size": content.size,
+                "sha256": hashlib.sha256(content.file.getvalue()).hexdigest(),
+                "content_type": "image/png",
+                "width": 64,
+                "height": 48,
+                "duration": None,
+                "codec": "png",
+            },
+        )
+        # The file created with the item was never probed.
+        self.assertEqual(
+            [info and (info["width"], info["height"]) for info in data["files_info"]],
+            [None, (8, 4)],
+        )
+
+        document = self.client.get(f"/api/metadata/{self.item.item_id}/2/").json()
+        self.assertEqual(document["file1_info"], data["file1_info"])
+        self.assertEqual(document["files_info"], data["files_info"])
+
+        probed_name = self.item.file1.name
+        self.item.file1.save("other.png", png(2, 2))
+        self.assertIsNone(self.client.get(f"/api/items/{self.item.id}/").json()["file1_info"])
+        # Probes scheduled for a replaced file store nothing.
+        self.assertFalse(build_media_info("items.Item", self.item.id, "file1", probed_name))
+
+    @skipUnless(shutil.which(settings.FFPROBE_BINARY), "ffprobe is not installed")
+    def test_audio_duration_and_codec_are_probed(self):
+        self.item.file1.save("track.wav", wav(2))
+        self.assertTrue(build_media_info("items.Item", self.item.id, "file1", self.item.file1.name))
+        self.item.refresh_from_db()
+        info = self.item.file1_info
+        self.assertEqual((info["content_type"], info["codec"]), ("audio/x-wav", "pcm_s16le"))
+        self.assertAlmostEqual(info["duration"], 2, places=2)
+        self.assertIsNone(info["width"])
+
+
+class PurchaseTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.creator = User.objects.create(username="creator", first_name="Creator")
+        self.buyer = User.objects.create(username="buyer", first_name="Buyer")
+        # Committed for real here, so keep the media probes of the fixture files from running.
+        with mock.patch("items.media.defer"):
+            self.item = create_listed_items(self.creator, 1, editions=4)[0]
+        self.editions = {token.token_number: token for token in self.item.sold_set.all()}
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def purchase(self, number, **headers):
+        return self.client.post(f"/api/tokens/{self.editions[number].id}/purchase/", {"price": "1.00"}, **headers)
+
+    def listing(self):
+        listing = Listing.objects.get(collectible=self.item, owner=self.creator)
+        return listing.token.token_number, listing.supply
+
+    def test_buying_the_head_moves_the_listing_to_the_next_edition(self):
+        self.assertEqual(self.purchase(1).data["old_token"]["id"], self.editions[1].id)
+        self.assertEqual(self.listing(), (2, 3))
+        self.assertEqual(Listing.objects.get(collectible=self.item, owner=self.buyer).supply, 1)
+
+        self.assertEqual(self.purchase(3).status_code, 200)
+        self.assertEqual(self.listing(), (2, 2))
+
+    def test_purchases_skip_editions_held_by_other_buyers(self):
+        with locked_by_another_request(Token.objects.filter(pk=self.editions[1].pk)):
+            response = self.purchase(1)
+        self.assertEqual(response.data["old_token"]["id"], self.editions[2].id)
+        self.assertEqual(self.listing(), (1, 3))
+
+        with locked_by_another_request(Token.objects.filter(pk=self.editions[2].pk)):
+            self.assertEqual(self.purchase(1).status_code, 200)
+        # The head skips the edition the other buyer is holding.
+        self.assertEqual(self.listing(), (3, 2))
+
+    def test_purchases_conflict_when_every_edition_is_held(self):
+        with locked_by_another_request(Token.objects.filter(collectible=self.item, owner=self.creator)):
+            self.assertEqual(self.purchase(1).status_code, 409)
+        self.assertEqual(self.listing(), (1, 4))
+
+    @override_settings(PURCHASE_LOCK_TIMEOUT_MS=50)
+    def test_purchases_conflict_when_the_listing_stays_locked(self):
+        with locked_by_another_request(Listing.objects.filter(collectible=self.item, owner=self.creator)):
+            self.assertEqual(self.purchase(2).status_code, 409)
+        self.assertFalse(Token.objects.filter(owner=self.buyer).exists())
+
+    def test_repeated_idempotency_keys_replay_the_first_response(self):
+        first = self.purchase(2, HTTP_IDEMPOTENCY_KEY="purchase-1")
+        second = self.purchase(2, HTTP_IDEMPOTENCY_KEY="purchase-1")
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Token.objects.filter(owner=self.buyer).count(), 1)
+        self.assertEqual(self.purchase(3, HTTP_IDEMPOTENCY_KEY="purchase-1").status_code, 422)
+
+    def test_conflicts_are_not_stored_against_the_idempotency_key(self):
+        with locked_by_another_request(Token.objects.filter(collectible=self.item, owner=self.creator)):
+            self.assertEqual(self.purchase(1, HTTP_IDEMPOTENCY_KEY="purchase-1").status_code, 409)
+        response = self.purchase(1, HTTP_IDEMPOTENCY_KEY="purchase-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(self.listing(), (2, 3))
+
+
+class BidTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create(username="seller", first_name="Seller")
+        self.bidder = User.objects.create(username="bidder", first_name="Bidder")
+        with mock.patch("items.media.defer"):
+            items = create_listed_items(self.seller, 2, editions=1)
+        now = timezone.now()
+        self.tokens = []
+        for item in items:
+            auction = Auction.objects.create(start_date=now, end_date=now + timedelta(days=1), starting_bidding_price=1)
+            Token.objects.filter(collectible=item).update(auction=auction, sell_type=ItemSellType.AUCTION.value)
+            self.tokens.append(Token.objects.get(collectible=item))
+        rebuild_listings([item.id for item in items])
+        self.client = APIClient()
+        self.client.force_authenticate(self.bidder)
+
+    def bid(self, token, value, auction=None):
+        data = {"auction": auction or token.auction_id, "bid_value": value}
+        return self.client.post(f"/api/tokens/{token.id}/place-bid/", data)
+
+    def test_the_auction_is_locked_before_the_bid_is_validated(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.bid(self.tokens[0], "2.00").status_code, 200)
+        auction_reads = [query["sql"] for query in queries if 'FROM "items_auction"' in query["sql"]]
+        self.assertIn("FOR UPDATE", auction_reads[0])
+        auction = Auction.objects.get(pk=self.tokens[0].auction_id)
+        self.assertEqual((auction.current_bid, auction.bid_count), (Decimal("2.00"), 1))
+        self.assertEqual(self.bid(self.tokens[0], "2.00").status_code, 400)
+
+    def test_bids_validate_outside_a_transaction(self):
+        request = mock.Mock(user=self.bidder)
+        data = {"auction": self.tokens[0].auction_id, "bid_value": "2.00"}
+        self.assertTrue(BidSerializer(data=data, context={"request": request}).is_valid())
+
+    def test_bids_are_only_taken_on_the_auction_of_the_token(self):
+        response = self.bid(self.tokens[0], "2.00", auction=self.tokens[1].auction_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Bid.objects.exists())
+
+    @override_settings(BID_LOCK_TIMEOUT_MS=50)
+    def test_bids_conflict_while_another_bid_holds_the_auction(self):
+        with locked_by_another_request(Auction.objects.filter(pk=self.tokens[0].auction_id)):
+            self.assertEqual(self.bid(self.tokens[0], "2.00").status_code, 409)
+            self.assertEqual(self.bid(self.tokens[1], "2.00").status_code, 200)
+        self.assertEqual(list(Bid.objects.values_list("auction", flat=True)), [self.tokens[1].auction_id])
+
+
+@skipUnless(settings.REPLICA_DATABASES, "Set REPLICA_DATABASE_URLS to test replica routing")
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.replica = settings.REPLICA_DATABASES[0]
+        self.creator = User.objects.create(username="creator", first_name="Creator")
+        self.liker = User.objects.create(username="liker", first_name="Liker")
+        self.item = create_listed_items(self.creator, 1)[0]
+        self.token = self.item.sold_set.get(token_number=2)
+        build_documents(Token.objects.all())
+        self.client = APIClient()
+
+    def read(self, url):
+        """
+        returns: The aliases the GET's SELECTs ran on, besides the replica lag checks.
+        rtype: set
+        """
+        with override_settings(REPLICA_DATABASES=[self.replica]):
+            with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+                with CaptureQueriesContext(connections[self.replica]) as replica:
+                    response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        aliases = set()
+        for alias, queries in ((DEFAULT_DB_ALIAS, primary), (self.replica, replica)):
+            if any(query["sql"].startswith("SELECT") and "pg_is_in_recovery" not in query["sql"] for query in queries):
+                aliases.add(alias)
+        return aliases
+
+    def test_browsing_endpoints_read_from_the_replica(self):
+        # Anonymous list responses are cached, and their misses read from the primary
+        self.client.force_authenticate(self.liker)
+        for url in (
+            "/api/tokens/",
+            f"/api/tokens/{self.token.id}/",
+            "/api/items/",
+            f"/api/items/{self.item.id}/",
+            "/api/categories/",
+            f"/api/users/{self.creator.id}/tokens/owned/",
+            f"/api/metadata/{self.item.item_id}/2/",
+        ):
+            self.assertEqual(self.read(url), {self.replica}, url)
+
+    def test_anonymous_cache_misses_read_from_the_primary(self):
+        for url in ("/api/tokens/", "/api/items/", "/api/categories/"):
+            self.assertEqual(self.read(url), {DEFAULT_DB_ALIAS}, url)
+            self.assertEqual(self.read(url), set(), url)
+
+    def test_missing_documents_are_built_from_the_primary(self):
+        TokenMetadata.objects.all().delete()
+        self.assertEqual(self.read(f"/api/metadata/{self.item.item_id}/2/"), {self.replica, DEFAULT_DB_ALIAS})
+        self.assertTrue(TokenMetadata.objects.filter(token=self.token).exists())
+        self.assertEqual(self.read(f"/api/metadata/{self.item.item_id}/2/"), {self.replica})
+
+    def test_user_reads_from_the_primary_after_writing(self):
+        self.client.force_authenticate(self.liker)
+        self.assertEqual(self.read(f"/api/items/{self.item.id}/"), {self.replica})
+        with override_settings(REPLICA_DATABASES=[self.replica]):
+            self.client.post(f"/api/items/{self.item.id}/like-toggle/")
+        self.assertEqual(self.read(f"/api/items/{self.item.id}/"), {DEFAULT_DB_ALIAS})
+
+        self.client.force_authenticate(self.creator)
+        self.assertEqual(self.read(f"/api/items/{self.item.id}/"), {self.replica})
+
+    def test_lagging_replicas_fall_back_to_the_primary(self):
+        with override_settings(REPLICA_MAX_LAG_SECONDS=-1):
+            self.assertEqual(self.read("/api/tokens/"), {DEFAULT_DB_ALIAS})
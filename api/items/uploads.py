@@ -0,0 +1,246 @@
+import hashlib
+import posixpath
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .models import Item, ItemFile, UploadSession, UploadStatus, UploadTarget
+
+# S3 multipart uploads take at most 10,000 parts.
+MAX_PARTS = 10000
+
+TARGET_FIELDS = {
+    UploadTarget.FILE1.value: Item._meta.get_field("file1"),
+    UploadTarget.ITEM_FILE.value: ItemFile._meta.get_field("file"),
+}
+
+
+class S3MultipartUploads:
+    """
+    Clients PUT the parts to presigned S3 URLs and S3 assembles them, so the bytes never pass
+    through the API. Browsers need the bucket's CORS rules to expose the ETag header.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.client = storage.connection.meta.client
+
+    def _params(self, session):
+        key = self.storage._normalize_name(self.storage._clean_name(session.name))
+        return {"Bucket": self.storage.bucket_name, "Key": key, "UploadId": session.upload_id}
+
+    def start(self, session):
+        params = self._params(session)
+        del params["UploadId"]
+        params["ContentType"] = session.content_type or "application/octet-stream"
+        if self.storage.default_acl:
+            params["ACL"] = self.storage.default_acl
+        session.upload_id = self.client.create_multipart_upload(**params)["UploadId"]
+
+    def part_url(self, request, session, part_number):
+        return self.client.generate_presigned_url(
+            "upload_part",
+            Params={**self._params(session), "PartNumber": part_number},
+            ExpiresIn=settings.UPLOAD_URL_EXPIRY_SECONDS,
+        )
+
+    def uploaded_parts(self, session):
+        parts = {}
+        for page in self.client.get_paginator("list_parts").paginate(**self._params(session)):
+            for part in page.get("Parts", []):
+                parts[part["PartNumber"]] = {"etag": part["ETag"].strip('"'), "size": part["Size"]}
+        return parts
+
+    def assemble(self, session, parts):
+        self.client.complete_multipart_upload(
+            **self._params(session),
+            MultipartUpload={
+                "Parts": [{"PartNumber": number, "ETag": f'"{parts[number]["etag"]}"'} for number in sorted(parts)]
+            },
+        )
+        return session.name
+
+    def abort(self, session):
+        self.client.abort_multipart_upload(**self._params(session))
+
+
+class LocalUploads:
+    """
+    Stand-in for storages without multipart uploads, such as FileSystemStorage in development:
+    clients PUT the parts to the API, which keeps them until the upload completes.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def _directory(self, session):
+        return f"uploads/{session.pk}"
+
+    def _part_name(self, session, part_number):
+        return f"{self._directory(session)}/{part_number:05d}"
+
+    def start(self, session):
+        pass
+
+    def part_url(self, request, session, part_number):
+        url = reverse("upload-part", kwargs={"pk": session.pk, "part_number": part_number})
+        return request.build_absolute_uri(url)
+
+    def save_part(self, session, part_number, stream):
+        """
+        Stores a part read from `stream`.
+
+        returns: The part's ETag, the MD5 of its content like S3's.
+        rtype: str
+        """
+        digest = hashlib.md5()
+        with tempfile.TemporaryFile() as part:
+            for chunk in iter(lambda: stream.read(64 * 1024), b""):
+                digest.update(chunk)
+                part.write(chunk)
+                if part.tell() > session.part_size:
+                    raise ValidationError({"part": [f"Parts are at most {session.part_size} bytes"]})
+            part.seek(0)
+            name = self._part_name(session, part_number)
+            self.storage.delete(name)
+            self.storage.save(name, File(part))
+        return digest.hexdigest()
+
+    def uploaded_parts(self, session):
+        directory = self._directory(session)
+        if not self.storage.exists(directory):
+            return {}
+        parts = {}
+        for filename in self.storage.listdir(directory)[1]:
+            digest = hashlib.md5()
+            with self.storage.open(f"{directory}/{filename}") as part:
+                for chunk in part.chunks():
+                    digest.update(chunk)
+                parts[int(filename)] = {"etag": digest.hexdigest(), "size": part.size}
+        return parts
+
+    def assemble(self, session, parts):
+        with tempfile.TemporaryFile() as assembled:
+            for number in sorted(parts):
+                with self.storage.open(self._part_name(session, number)) as part:
+                    shutil.copyfileobj(part, assembled)
+            assembled.seek(0)
+            name = self.storage.save(session.name, File(assembled))
+        self.abort(session)
+        return name
+
+    def abort(self, session):
+        directory = self._directory(session)
+        if self.storage.exists(directory):
+            for filename in self.storage.listdir(directory)[1]:
+                self.storage.delete(f"{directory}/{filename}")
+
+
+def get_uploads():
+    if isinstance(default_storage, S3Boto3Storage):
+        return S3MultipartUploads(default_storage)
+    return LocalUploads(default_storage)
+
+
+def start_upload(user, item, target, filename, size, content_type=""):
+    """
+    Opens an upload session for a file of `size` bytes, to be attached to `item` as `target`.
+
+    rtype: UploadSession
+    """
+    name = TARGET_FIELDS[target].generate_filename(None, filename)
+    # Parts are written under the final name, so it has to be unique before the upload starts.
+    name = default_storage.get_alternative_name(*posixpath.splitext(name))
+    part_size = max(settings.UPLOAD_PART_SIZE, -(-size // MAX_PARTS))
+    session = UploadSession(
+        user=user, item=item, target=target, name=name, size=size, part_size=part_size, content_type=content_type
+    )
+    get_uploads().start(session)
+    session.save()
+    return session
+
+
+def verify_parts(session, uploaded, parts):
+    """
+    Checks the uploaded parts against the session's size and the ETags the client got for them.
+
+    returns: The problems found.
+    rtype: list[str]
+    """
+    problems = []
+    expected = range(1, session.part_count + 1)
+    missing = [number for number in expected if number not in uploaded]
+    if missing:
+        problems.append(f"Parts {missing} have not been uploaded")
+    unexpected = sorted(set(uploaded) - set(expected))
+    if unexpected:
+        problems.append(f"Parts {unexpected} are beyond the end of the file")
+    for number in expected[:-1]:
+        if number in uploaded and uploaded[number]["size"] != session.part_size:
+            problems.append(f"Part {number} is {uploaded[number]['size']} bytes instead of {session.part_size}")
+    if not missing and not unexpected and sum(part["size"] for part in uploaded.values()) != session.size:
+        problems.append(f"The parts don't add up to {session.size} bytes")
+
+    etags = {part["part_number"]: part["etag"].strip('"') for part in parts}
+    if set(etags) != set(expected):
+        problems.append("Send the ETag of every part")
+    for number, etag in sorted(etags.items()):
+        if number in uploaded and uploaded[number]["etag"] != etag:
+            problems.append(f"Part {number} doesn't match its ETag")
+    return problems
+
+
+def complete_upload(session, parts):
+    """
+    Verifies the uploaded parts, assembles them and attaches the file to the session's item.
+    Lock the session for the duration of the call.
+
+    `parts` lists the {"part_number", "etag"} the client got back for each part.
+    """
+    uploads = get_uploads()
+    uploaded = uploads.uploaded_parts(session)
+    problems = verify_parts(session, uploaded, parts)
+    if problems:
+        raise ValidationError({"parts": problems})
+
+    session.name = uploads.assemble(session, uploaded)
+    session.status = UploadStatus.COMPLETED.value
+    session.completed_at = timezone.now()
+    session.save(update_fields=["name", "status", "completed_at"])
+
+    if session.target == UploadTarget.FILE1.value:
+        item = session.item
+        item.file1 = session.name
+        item.save()
+    else:
+        ItemFile.objects.create(item_id=session.item_id, file=session.name)
+
+
+def abort_upload(session):
+    get_uploads().abort(session)
+    session.status = UploadStatus.ABORTED.value
+    session.save(update_fields=["status"])
+
+
+def purge_expired_uploads():
+    """
+    Aborts the upload sessions left open for longer than UPLOAD_SESSION_TTL.
+
+    returns: Number of aborted sessions.
+    rtype: int
+    """
+    expired = UploadSession.objects.filter(
+        status=UploadStatus.OPEN.value, created_at__lt=timezone.now() - settings.UPLOAD_SESSION_TTL
+    )
+    aborted = 0
+    for session in expired:
+        abort_upload(session)
+        aborted += 1
+    return aborted
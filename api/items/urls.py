@@ -13,12 +13,16 @@ category_patterns = [
 
 item_patterns = [
     path("", views.ItemViewset.as_view({"get": "list", "post": "create"})),
+    path("liked/", views.LikedItemsView.as_view()),
     path("<int:pk>/", views.ItemViewset.as_view({"get": "retrieve"})),
     path("<int:pk>/likes/", views.ItemLikes.as_view()),
     path("<int:pk>/like-toggle/", views.LikeItemToggle.as_view()),
+    path("<int:pk>/waveform/", views.ItemWaveformView.as_view()),
 ]
 
 urlpatterns = [
+    path("autocomplete/", views.Autocomplete.as_view()),
+    path("metadata/<item_id>/", views.TokenMetadataBatchView.as_view()),
     path("metadata/<item_id>/<token_number>/", views.TokenDetailsView.as_view()),
     path("items/", include(item_patterns)),
     path("categories/", include(category_patterns)),
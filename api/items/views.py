@@ -1,24 +1,41 @@
 from decimal import Decimal, InvalidOperation
 
-from django.db.models.aggregates import Count, Max
-from django.db.models.functions.comparison import Coalesce
-from django.db.models.query_utils import Q
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.http import Http404, HttpResponse
 from django.utils import timezone as dj_timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from rest_framework import generics, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from users.models import User
-from users.serializers import UserSerializer
+from users.serializers import UserAutocompleteSerializer, UserSerializer
+from utils.exceptions import Contention
+from utils.locks import lock_timeout
+from utils.pagination import CursorOrOffsetPagination
 from utils.permissions import IsAuthenticated
+from utils.replicas import reads_from_replica
+from utils.timeouts import statement_timeout
 
+from .auctions import settle_auction
+from .cache import CATEGORIES, ITEMS, TOKENS, cache_anonymous_response
+from .conditional import conditional_on_items, item_by_pk, item_by_token_pk
 from .filters import TokenFilter
-from .models import Category, Item, ItemSellType, Token
+from .idempotency import idempotent
+from .likes import liked_item_ids, toggle_like
+from .listings import listing_key, refresh_listing, take_from_listing
+from .lots import take_editions
+from .metadata import get_documents, render_document
+from .models import Auction, AuctionStatus, Category, EditionLot, Item, ItemSellType, Token, Waveform
+from .search import autocomplete_items, autocomplete_users, search_tokens
 from .serializers import (
     BidSerializer,
     CategorySerializer,
+    ItemAutocompleteSerializer,
     ItemSerializer,
-    TokenDetailsSerializer,
     TokenSerializer,
 )
 
@@ -28,12 +45,28 @@ class CategoryList(generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    @reads_from_replica
+    @cache_anonymous_response(CATEGORIES)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
 class ItemViewset(viewsets.ModelViewSet):
     permission_classes = (permissions.AllowAny,)
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
+    pagination_class = CursorOrOffsetPagination
+
+    def get_queryset(self):
+        return self.queryset.with_details(self.request.user).order_by("id")
+
+    @reads_from_replica
+    @conditional_on_items(item_by_pk, per_user=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
+    @reads_from_replica
+    @cache_anonymous_response(ITEMS, TOKENS)
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         query = request.GET.get("filter", "")
@@ -70,52 +103,58 @@ class ItemLikes(generics.ListAPIView):
 
 class LikeItemToggle(APIView):
     def get(self, request, pk):
-        user = request.user
-        if request.user.is_authenticated:
-            item = Item.objects.get(id=pk)
-            try:
-                item.likes.get(id=user.id)
-                return Response({"liked": True})
-            except:
-                return Response({"liked": False})
-        return Response({"liked": False})
+        return Response({"liked": pk in liked_item_ids(request.user, [pk])})
 
     def post(self, request, pk):
-        user = request.user
-        if request.user.is_authenticated:
-            item = Item.objects.get(id=pk)
-            try:
-                item.likes.get(id=user.id)
-                item.likes.remove(user)
-                return Response({"liked": False})
-            except User.DoesNotExist:
-                item.likes.add(user)
-                return Response({"liked": True})
-        return Response({"liked": False})
+        if not request.user.is_authenticated:
+            return Response({"liked": False})
+        with transaction.atomic():
+            liked = toggle_like(pk, request.user.id)
+        if liked is None:
+            raise Http404
+        return Response({"liked": liked})
+
+
+class LikedItemsView(APIView):
+    @reads_from_replica
+    def get(self, request, *args, **kwargs):
+        try:
+            item_ids = [int(item_id) for item_id in request.GET.get("ids", "").split(",") if item_id]
+        except ValueError:
+            return Response(data={"ids": ["Must be comma-separated integers"]}, status=status.HTTP_400_BAD_REQUEST)
+        if not item_ids or len(item_ids) > settings.LIKED_BATCH_SIZE:
+            return Response(
+                data={"ids": [f"Request between 1 and {settings.LIKED_BATCH_SIZE} items"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response({"liked": sorted(liked_item_ids(request.user, item_ids))})
 
 
 class TokenViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     permission_classes = (permissions.AllowAny,)
-    queryset = Token.objects.with_supply().select_related("collectible", "auction", "owner")
+    queryset = Token.objects.with_supply().select_related("auction__highest_bid", "owner").with_collectible()
     filterset_class = TokenFilter
     serializer_class = TokenSerializer
+    pagination_class = CursorOrOffsetPagination
+
+    @reads_from_replica
+    @conditional_on_items(item_by_token_pk)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_listed_queryset(self):
+        return (
+            Token.objects.listed()
+            .select_related("auction__highest_bid", "owner")
+            .with_collectible()
+            .filter(listing__is_live=True)
+        )
 
+    @reads_from_replica
+    @cache_anonymous_response(TOKENS, ITEMS)
     def list(self, request, *args, **kwargs):
-        token_ids = self.get_queryset().distinct("collectible", "owner", "on_sale").values_list("id", flat=True)
-        qs = self.get_queryset().filter(id__in=token_ids)
-
-        now = dj_timezone.now()
-        qs = qs.filter(
-            Q(on_sale=True),
-            (
-                ~Q(sell_type=ItemSellType.AUCTION.value)
-                | (Q(auction__start_date__lte=now) & Q(auction__end_date__gt=now))
-            ),
-        )
-        qs = qs.annotate(
-            current_price=Coalesce(Max("auction__bid_set__bid_value"), "auction__starting_bidding_price", "price"),
-            likes=Count("collectible__likes"),
-        )
+        qs = self.get_listed_queryset().order_by("listing__collectible", "listing__owner")
         queryset = self.filter_queryset(qs)
 
         page = self.paginate_queryset(queryset)
@@ -126,18 +165,43 @@ class TokenViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.Ge
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"], url_path="search")
+    @reads_from_replica
+    @cache_anonymous_response(TOKENS, ITEMS)
+    def search(self, request, *args, **kwargs):
+        query = request.GET.get("q", "").strip()
+        if not query:
+            return Response(data={"q": ["This field is required"]}, status=status.HTTP_400_BAD_REQUEST)
+
+        qs = search_tokens(self.get_listed_queryset(), query)
+        queryset = self.filter_queryset(qs.order_by("-rank", "listing__collectible", "listing__owner"))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=["post"], url_path="place-bid", permission_classes=[IsAuthenticated])
     def place_bid(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        serializer = BidSerializer(data=request.data, context={"request": request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic(), lock_timeout(settings.BID_LOCK_TIMEOUT_MS):
+            # Bids on the same auction queue on its row here, so each is validated against the one before it.
+            list(Auction.objects.select_for_update().filter(pk=instance.auction_id).values_list("pk", flat=True))
+            serializer = BidSerializer(data=request.data, context={"request": request, "token": instance})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            refresh_listing(*listing_key(instance))
 
+        instance = self.get_object()
         token_serializer = self.get_serializer(instance)
         return Response(token_serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["post"], url_path="purchase", permission_classes=[IsAuthenticated])
+    @idempotent
     def purchase(self, request, *args, **kwargs):
         user = request.user
         instance = self.get_object()
@@ -168,22 +232,56 @@ class TokenViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.Ge
 
         collectible = instance.collectible
         previous_owner = instance.owner
-        instance.on_sale = False
-        instance.is_sold = True
-        instance.owner = user
-        instance.save()
-
+        with transaction.atomic(), lock_timeout(settings.PURCHASE_LOCK_TIMEOUT_MS):
+            editions = Token.objects.filter(
+                collectible=collectible,
+                owner=previous_owner,
+                on_sale=True,
+                sell_type=ItemSellType.INSTANT_BUY.value,
+                price=instance.price,
+            )
+            # Buy the requested edition, or the next one of the same listing another buyer is not holding.
+            edition = (
+                editions.select_for_update(skip_locked=True, no_key=True)
+                .order_by(Case(When(pk=instance.pk, then=Value(0)), default=Value(1)), "token_number")
+                .first()
+            )
+            lots = EditionLot.objects.filter(
+                collectible=collectible,
+                owner=previous_owner,
+                on_sale=True,
+                sell_type=ItemSellType.INSTANT_BUY.value,
+                price=instance.price,
+            )
+            if edition is None:
+                # Every token of the listing is held by other buyers; take the next edition out of its lots.
+                edition = next(iter(take_editions(lots)), None)
+            if edition is None:
+                if editions.exists():
+                    raise Contention()
+                return Response(data={"token": ["Token is not on sale"]}, status=status.HTTP_400_BAD_REQUEST)
+
+            previous_key = listing_key(edition)
+            edition.on_sale = False
+            edition.is_sold = True
+            edition.owner = user
+            edition.save()
+            # Replace the sold token with one from the lots, unless another buyer is already doing so.
+            take_editions(lots, skip_locked=True)
+            take_from_listing(*previous_key, edition.pk)
+            refresh_listing(*listing_key(edition))
+
+        instance = self.get_queryset().get(pk=edition.pk)
         serializer = self.get_serializer(instance)
         response = {"old_token": serializer.data}
-        try:
-            new_instance = (
-                self.get_queryset()
-                .distinct("collectible", "owner")
-                .get(on_sale=True, collectible=collectible, owner=previous_owner)
-            )
-        except Token.DoesNotExist:
-            pass
-        else:
+        new_instance = (
+            Token.objects.listed()
+            .select_related("auction__highest_bid", "owner")
+            .with_collectible()
+            .filter(listing__collectible=collectible, listing__owner=previous_owner, listing__on_sale=True)
+            .first()
+        )
+        if new_instance is not None:
             new_serializer = self.get_serializer(new_instance)
             response.update({"new_token": new_serializer.data})
         return Response(response, status=status.HTTP_200_OK)
@@ -198,44 +296,105 @@ class TokenViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.Ge
         elif instance.auction.end_date >= dj_timezone.now():
             return Response(data={"Auction": ["Auction has not ended yet"]}, status=status.HTTP_400_BAD_REQUEST)
 
-        if instance.auction.highest_bidder_id:
-            highest_bidder = User.objects.filter(id=instance.auction.highest_bidder_id)[0]
-            instance.owner = highest_bidder
-        instance.on_sale = False
-        instance.is_sold = True
-        instance.auction = None
-        instance.sell_type = ItemSellType.NONE.value
-        instance.price = 0
-        instance.save()
+        # Lock order (auction, then token) matches the finalize_auctions worker.
+        with transaction.atomic(), lock_timeout(settings.BID_LOCK_TIMEOUT_MS):
+            auction = (
+                Auction.objects.select_for_update(of=("self",))
+                .select_related("highest_bid")
+                .get(pk=instance.auction_id)
+            )
+            token = Token.objects.select_for_update().get(pk=instance.pk)
+            if token.auction_id != auction.id or auction.status == AuctionStatus.SETTLED.value:
+                return Response(data={"Auction": ["Auction was already finalized"]}, status=status.HTTP_400_BAD_REQUEST)
+            settle_auction(auction, token)
 
+        instance = self.get_queryset().get(pk=instance.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class Autocomplete(APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get("q", "").strip()
+        try:
+            limit = min(max(int(request.GET.get("limit", 10)), 1), settings.AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            return Response(data={"limit": ["Must be an integer"]}, status=status.HTTP_400_BAD_REQUEST)
+        if len(query) < settings.AUTOCOMPLETE_MIN_LENGTH:
+            return Response({"users": [], "items": []})
+
+        with transaction.atomic(), statement_timeout(settings.AUTOCOMPLETE_TIMEOUT_MS):
+            users = list(autocomplete_users(query, limit))
+            items = list(autocomplete_items(query, limit))
+        return Response(
+            {
+                "users": UserAutocompleteSerializer(users, many=True, context={"request": request}).data,
+                "items": ItemAutocompleteSerializer(items, many=True, context={"request": request}).data,
+            }
+        )
+
+
 class TokenDetailsView(APIView):
+    @reads_from_replica
     def get(self, request, *args, **kwargs):
-        item_id = kwargs["item_id"]
-        token_number = kwargs["token_number"]
-        queryset = Token.objects.filter(token_number=token_number, collectible__item_id=item_id)
-        if len(queryset) != 1:
+        try:
+            token_number = int(kwargs["token_number"])
+        except ValueError:
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+        rows = get_documents(kwargs["item_id"], [token_number])
+        if not rows:
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+
+        built_at = int(rows[0].built_at.timestamp())
+        etag = quote_etag(f"{rows[0].built_at.timestamp():.6f}")
+        response = get_conditional_response(request, etag=etag, last_modified=built_at)
+        if response is None:
+            response = Response(render_document(request, rows[0].document), status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(built_at)
+        return response
+
+
+class ItemWaveformView(APIView):
+    """
+    Serves an audio item's waveform as WAVEFORM_PEAKS interleaved (min, max) int8 pairs.
+    """
+
+    permission_classes = (permissions.AllowAny,)
+
+    @reads_from_replica
+    def get(self, request, pk):
+        waveform = Waveform.objects.filter(item_id=pk, item__file1=F("source")).first()
+        if waveform is None:
             return Response({}, status=status.HTTP_404_NOT_FOUND)
-        token = queryset[0]
-        category_name = None
-        if token.collectible.category:
-            category_name = token.collectible.category.name
-
-        data = {
-            "token_number": token.token_number,
-            "name": token.collectible.title,
-            "description": token.collectible.description,
-            "category": category_name,
-            "file1": token.collectible.file1 or None,
-            "files": token.collectible.files.values_list("file", flat=True),
-            "creator": token.collectible.creator.display_name,
-            "owner": token.owner.display_name,
-            "is_360_video": token.collectible.is_360_video,
-        }
-        serializer = TokenDetailsSerializer(context={"request": request}, data=data)
-        if serializer.is_valid():
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        built_at = int(waveform.built_at.timestamp())
+        etag = quote_etag(f"{waveform.built_at.timestamp():.6f}")
+        response = get_conditional_response(request, etag=etag, last_modified=built_at)
+        if response is None:
+            response = HttpResponse(bytes(waveform.peaks), content_type="application/octet-stream")
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(built_at)
+        patch_cache_control(response, public=True, max_age=settings.WAVEFORM_CACHE_SECONDS)
+        return response
+
+
+class TokenMetadataBatchView(APIView):
+    @reads_from_replica
+    def get(self, request, *args, **kwargs):
+        try:
+            token_numbers = [int(number) for number in request.GET.get("token_numbers", "").split(",") if number]
+        except ValueError:
+            return Response(
+                data={"token_numbers": ["Must be comma-separated integers"]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if not token_numbers or len(token_numbers) > settings.METADATA_BATCH_SIZE:
+            return Response(
+                data={"token_numbers": [f"Request between 1 and {settings.METADATA_BATCH_SIZE} tokens"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        rows = get_documents(kwargs["item_id"], list(dict.fromkeys(token_numbers)))
+        return Response({"results": [render_document(request, row.document) for row in rows]})
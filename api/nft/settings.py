@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
     # Third-party apps
     "rest_framework",
     "rest_framework.authtoken",
@@ -72,6 +73,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "utils.replicas.PinPrimaryAfterWriteMiddleware",
 ]
 
 ROOT_URLCONF = "nft.urls"
@@ -103,6 +105,23 @@ DATABASES = {
     "default": env.db("DATABASE_URL", default="postgres://127.0.0.1:5432/celo-nft"),
 }
 
+# Read replicas the browsing endpoints read from, as comma-separated database URLs.
+# Tests read them through the default test database.
+REPLICA_DATABASES = []
+for number, url in enumerate(env.list("REPLICA_DATABASE_URLS", default=[]), start=1):
+    DATABASES[f"replica{number}"] = {**env.db_url_config(url), "TEST": {"MIRROR": "default"}}
+    REPLICA_DATABASES.append(f"replica{number}")
+
+DATABASE_ROUTERS = ["utils.replicas.ReplicaRouter"]
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# e.g. CACHE_URL=rediscache://127.0.0.1:6379/1 for the redis service in docker-compose.
+
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -209,3 +228,56 @@ REST_KNOX = {
     "TOKEN_TTL": None,
     "USER_SERIALIZER": "users.serializers.UserSelfSerializer",
 }
+
+# MARKETPLACE
+# ------------------------------------------------------------------------------
+# How long a bid may wait on a row lock held by a concurrent request
+# before failing with a retriable 409.
+BID_LOCK_TIMEOUT_MS = env.int("BID_LOCK_TIMEOUT_MS", default=250)
+# How long a purchase may wait for another purchase of the same listing, which holds the
+# listing row until it commits, before failing with a retriable 409.
+PURCHASE_LOCK_TIMEOUT_MS = env.int("PURCHASE_LOCK_TIMEOUT_MS", default=250)
+# How long purchase responses are kept for replay under their Idempotency-Key.
+IDEMPOTENCY_KEY_TTL = timedelta(hours=env.int("IDEMPOTENCY_KEY_TTL_HOURS", default=24))
+# How long anonymous feed responses are cached; writes invalidate them sooner.
+RESPONSE_CACHE_TIMEOUT = env.int("RESPONSE_CACHE_TIMEOUT", default=300)
+# Most token metadata documents returned by one batch request.
+METADATA_BATCH_SIZE = env.int("METADATA_BATCH_SIZE", default=100)
+# Typeahead: shortest query looked up, largest page and the per-statement latency budget.
+AUTOCOMPLETE_MIN_LENGTH = env.int("AUTOCOMPLETE_MIN_LENGTH", default=3)
+AUTOCOMPLETE_MAX_LIMIT = env.int("AUTOCOMPLETE_MAX_LIMIT", default=20)
+AUTOCOMPLETE_TIMEOUT_MS = env.int("AUTOCOMPLETE_TIMEOUT_MS", default=100)
+# Resumable media uploads: part size, largest file, how long part URLs and unfinished sessions last.
+UPLOAD_PART_SIZE = env.int("UPLOAD_PART_SIZE_MB", default=8) * 1024 * 1024
+UPLOAD_MAX_SIZE = env.int("UPLOAD_MAX_SIZE_MB", default=4096) * 1024 * 1024
+UPLOAD_URL_EXPIRY_SECONDS = env.int("UPLOAD_URL_EXPIRY_SECONDS", default=3600)
+UPLOAD_SESSION_TTL = timedelta(hours=env.int("UPLOAD_SESSION_TTL_HOURS", default=24))
+# Audio waveforms: peaks per track, the sample rate tracks are decoded at and how long clients cache them.
+FFMPEG_BINARY = env.str("FFMPEG_BINARY", default="ffmpeg")
+FFMPEG_TIMEOUT_SECONDS = env.int("FFMPEG_TIMEOUT_SECONDS", default=300)
+WAVEFORM_PEAKS = env.int("WAVEFORM_PEAKS", default=1000)
+WAVEFORM_SAMPLE_RATE = env.int("WAVEFORM_SAMPLE_RATE", default=8000)
+WAVEFORM_CACHE_SECONDS = env.int("WAVEFORM_CACHE_SECONDS", default=86400)
+# Reads the duration, dimensions and codec of uploaded audio and video.
+FFPROBE_BINARY = env.str("FFPROBE_BINARY", default="ffprobe")
+# Mints of more editions than this run as background jobs, which copy the tokens in chunks of MINT_CHUNK_SIZE.
+MINT_SYNC_EDITIONS = env.int("MINT_SYNC_EDITIONS", default=1000)
+MINT_CHUNK_SIZE = env.int("MINT_CHUNK_SIZE", default=10000)
+# Mints of at least this many editions keep all but the first EDITION_LOT_WINDOW of each listing
+# group in edition lots instead of one token each; 0 mints every edition as a token.
+EDITION_LOT_MIN_EDITIONS = env.int("EDITION_LOT_MIN_EDITIONS", default=0)
+EDITION_LOT_WINDOW = env.int("EDITION_LOT_WINDOW", default=16)
+# Most tokens a bulk sale change may select by id; listings can be changed whole.
+BULK_UPDATE_MAX_IDS = env.int("BULK_UPDATE_MAX_IDS", default=1000)
+# Most items the liked endpoint answers for in one request, e.g. every card of a page.
+LIKED_BATCH_SIZE = env.int("LIKED_BATCH_SIZE", default=500)
+# Like count changes are buffered in the cache (Redis in production) and flushed this often.
+LIKE_FLUSH_SECONDS = env.float("LIKE_FLUSH_SECONDS", default=5.0)
+# Threads per process running post-commit background work such as image renditions.
+BACKGROUND_WORKERS = env.int("BACKGROUND_WORKERS", default=2)
+# Replicas lagging more than this are skipped; their lag is measured at most once per check interval.
+REPLICA_MAX_LAG_SECONDS = env.int("REPLICA_MAX_LAG_SECONDS", default=2)
+REPLICA_LAG_CHECK_SECONDS = env.int("REPLICA_LAG_CHECK_SECONDS", default=1)
+# How long a user reads from the primary after a write. Keep it above the max lag
+# so the replica they return to already has their write.
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=5)
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:32
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_commission_rate'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='user_first_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='user_last_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        # Case-insensitive wallet address prefix lookups (wallet_token__istartswith)
+        migrations.RunSQL(
+            "CREATE INDEX user_wallet_token_prefix_idx ON users_user (UPPER(wallet_token::text) text_pattern_ops)",
+            "DROP INDEX user_wallet_token_prefix_idx",
+        ),
+    ]
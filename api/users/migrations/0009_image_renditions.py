@@ -0,0 +1,23 @@
+# Generated by Django 3.2.4 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_user_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cover_image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,13 +1,12 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models.base import Model
 from django.db.models.fields import EmailField
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from imagekit.models import ImageSpecField
-from imagekit.processors import Thumbnail
 from rest_framework.authtoken.models import Token
 
 
@@ -19,6 +18,9 @@ class User(AbstractUser):
     description = models.TextField(blank=True, default="")
     profile_image = models.ImageField(upload_to="profile_images/", blank=True, default="")
     cover_image = models.ImageField(upload_to="cover_images/", blank=True, default="")
+    # Maintained by items.renditions after the images change
+    profile_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    cover_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     twitter = models.CharField(max_length=128, blank=True, default="")
     instagram = models.CharField(max_length=128, blank=True, default="")
     messenger = models.CharField(max_length=128, blank=True, default="")
@@ -29,6 +31,13 @@ class User(AbstractUser):
         validators=[MinValueValidator(0), MaxValueValidator(100)],
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Typeahead lookups; the wallet prefix index is created with SQL in the migration
+            GinIndex(fields=["first_name"], opclasses=["gin_trgm_ops"], name="user_first_name_trgm_idx"),
+            GinIndex(fields=["last_name"], opclasses=["gin_trgm_ops"], name="user_last_name_trgm_idx"),
+        ]
+
     @property
     def display_name(self):
         if self.first_name:
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db.models import fields
+from items.renditions import RenditionsField
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
@@ -8,6 +9,8 @@ from . import models
 
 class UserSerializer(serializers.ModelSerializer):
     display_name = serializers.ReadOnlyField()
+    profile_image_renditions = RenditionsField("profile_image")
+    cover_image_renditions = RenditionsField("cover_image")
 
     class Meta:
         model = models.User
@@ -18,7 +21,9 @@ class UserSerializer(serializers.ModelSerializer):
             "display_name",
             "description",
             "profile_image",
+            "profile_image_renditions",
             "cover_image",
+            "cover_image_renditions",
             "twitter",
             "instagram",
             "messenger",
@@ -26,6 +31,15 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
 
+class UserAutocompleteSerializer(serializers.ModelSerializer):
+    display_name = serializers.ReadOnlyField()
+    profile_image_renditions = RenditionsField("profile_image")
+
+    class Meta:
+        model = models.User
+        fields = ["id", "display_name", "wallet_token", "profile_image", "profile_image_renditions"]
+
+
 class UserCreateSerializer(serializers.ModelSerializer):
     display_name = serializers.ReadOnlyField()
     password = serializers.CharField(write_only=True)
@@ -61,6 +75,8 @@ class UserProfilePicSerializer(serializers.ModelSerializer):
 
 class UserSelfSerializer(serializers.ModelSerializer):
     display_name = serializers.ReadOnlyField()
+    profile_image_renditions = RenditionsField("profile_image")
+    cover_image_renditions = RenditionsField("cover_image")
 
     class Meta:
         model = models.User
@@ -73,7 +89,9 @@ class UserSelfSerializer(serializers.ModelSerializer):
             "wallet_token",
             "description",
             "profile_image",
+            "profile_image_renditions",
             "cover_image",
+            "cover_image_renditions",
             "twitter",
             "instagram",
             "messenger",
@@ -19,7 +19,18 @@ urlpatterns = [
     ),
     path("me/items/<int:pk>/file/", views.UserItemViewSet.as_view({"put": "file"})),
     path("me/items/<int:pk>/mint/", views.UserItemViewSet.as_view({"post": "mint_tokens"})),
+    path("me/mint-jobs/<int:pk>/", views.MintJobView.as_view()),
+    path("me/tokens/bulk/", views.UserBulkUpdateTokensView.as_view()),
     path("me/tokens/<int:pk>/", views.UserSelfUpdateTokenView.as_view()),
+    path("me/uploads/", views.UploadSessionViewSet.as_view({"post": "create"})),
+    path("me/uploads/<int:pk>/", views.UploadSessionViewSet.as_view({"get": "retrieve", "delete": "destroy"})),
+    path("me/uploads/<int:pk>/urls/", views.UploadSessionViewSet.as_view({"post": "urls"})),
+    path(
+        "me/uploads/<int:pk>/parts/<int:part_number>/",
+        views.UploadSessionViewSet.as_view({"put": "part"}),
+        name="upload-part",
+    ),
+    path("me/uploads/<int:pk>/complete/", views.UploadSessionViewSet.as_view({"post": "complete"})),
     path("subscribe/", views.SubscriberView.as_view()),
     path("", include(router.urls)),
     path("", include(tokens_router.urls)),
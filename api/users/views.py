@@ -1,9 +1,20 @@
-from datetime import datetime
-
-from django.db.models.query_utils import Q
+from django.conf import settings
+from django.db import transaction
 from django.http import Http404
-from items.models import Item, ItemSellType, Token
-from items.serializers import ItemMintSerializer, ItemSerializer, TokenSerializer
+from items.listings import listing_key, refresh_listings
+from items.minting import run_mint_job
+from items.models import Item, MintJob, Token, UploadSession, UploadStatus
+from items.serializers import (
+    ItemMintSerializer,
+    ItemSerializer,
+    MintJobSerializer,
+    TokenBulkUpdateSerializer,
+    TokenSerializer,
+    UploadCompleteSerializer,
+    UploadPartsSerializer,
+    UploadSessionSerializer,
+)
+from items.uploads import LocalUploads, abort_upload, complete_upload, get_uploads
 from rest_framework import (
     generics,
     mixins,
@@ -15,7 +26,11 @@ from rest_framework import (
 )
 from rest_framework.decorators import action, permission_classes
 from rest_framework.response import Response
+from utils.locks import lock_timeout
+from utils.pagination import CursorOrOffsetPagination
 from utils.permissions import IsAuthenticated
+from utils.replicas import reads_from_replica
+from utils.tasks import defer
 
 from .filters import UserFilter
 from .models import User
@@ -99,16 +114,18 @@ class UserRetrieveMixin:
 
 class UserTokenListViewSet(UserRetrieveMixin, viewsets.GenericViewSet):
     permission_classes = (permissions.AllowAny,)
-    queryset = Token.objects.with_supply().select_related("collectible", "auction", "owner")
+    queryset = Token.objects.listed().select_related("auction__highest_bid", "owner").with_collectible()
     serializer_class = TokenSerializer
+    pagination_class = CursorOrOffsetPagination
 
     def get_queryset(self):
-        return self.queryset.distinct("collectible", "owner", "on_sale")
+        return self.queryset.order_by("listing__collectible", "listing__owner", "listing__on_sale")
 
     @action(detail=False)
+    @reads_from_replica
     def owned(self, request, pk=None, *args, **kwargs):
         user = self.get_user()
-        qs = self.get_queryset().filter(owner=user)
+        qs = self.get_queryset().filter(listing__owner=user)
 
         page = self.paginate_queryset(qs)
         if page is not None:
@@ -119,17 +136,10 @@ class UserTokenListViewSet(UserRetrieveMixin, viewsets.GenericViewSet):
         return Response(serializer.data)
 
     @action(detail=False, url_path="on-sale")
+    @reads_from_replica
     def on_sale(self, request, *args, **kwargs):
         user = self.get_user()
-        now = datetime.now()
-        qs = self.get_queryset().filter(
-            Q(owner=user),
-            Q(on_sale=True),
-            (
-                ~Q(sell_type=ItemSellType.AUCTION.value)
-                | (Q(auction__start_date__lte=now) & Q(auction__end_date__gt=now))
-            ),
-        )
+        qs = self.get_queryset().filter(listing__owner=user, listing__is_live=True)
 
         page = self.paginate_queryset(qs)
         if page is not None:
@@ -140,9 +150,10 @@ class UserTokenListViewSet(UserRetrieveMixin, viewsets.GenericViewSet):
         return Response(serializer.data)
 
     @action(detail=False)
+    @reads_from_replica
     def created(self, request, *args, **kwargs):
         user = self.get_user()
-        qs = self.get_queryset().filter(collectible__collaborators__user=user)
+        qs = self.get_queryset().filter(listing__collectible__in=Item.objects.filter(collaborators__user=user))
 
         page = self.paginate_queryset(qs)
         if page is not None:
@@ -153,9 +164,10 @@ class UserTokenListViewSet(UserRetrieveMixin, viewsets.GenericViewSet):
         return Response(serializer.data)
 
     @action(detail=False)
+    @reads_from_replica
     def likes(self, request, *args, **kwargs):
         user = self.get_user()
-        qs = self.get_queryset().filter(collectible__likes__id=user.id)
+        qs = self.get_queryset().filter(listing__collectible__likes__id=user.id)
 
         page = self.paginate_queryset(qs)
         if page is not None:
@@ -168,13 +180,31 @@ class UserTokenListViewSet(UserRetrieveMixin, viewsets.GenericViewSet):
 
 class UserSelfUpdateTokenView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = Token.objects.with_supply().select_related("collectible", "auction", "owner")
+    queryset = Token.objects.with_supply().select_related("auction__highest_bid", "owner").with_collectible()
     serializer_class = TokenSerializer
 
     def get_queryset(self):
         user = self.request.user
         return self.queryset.filter(owner=user)
 
+    def perform_update(self, serializer):
+        previous_key = listing_key(serializer.instance)
+        with transaction.atomic():
+            token = serializer.save()
+            refresh_listings([previous_key, listing_key(token)])
+
+
+class UserBulkUpdateTokensView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = TokenBulkUpdateSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic(), lock_timeout(settings.BID_LOCK_TIMEOUT_MS):
+            result = serializer.change_sale(request.user)
+        return Response(result)
+
 
 class UserItemViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
@@ -183,7 +213,7 @@ class UserItemViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        return self.queryset.filter(creator=user)
+        return self.queryset.filter(creator=user).with_details(user).order_by("id")
 
     @action(detail=True, methods=["put"], parser_classes=[parsers.MultiPartParser])
     def file(self, request, pk=None, *args, **kwargs):
@@ -200,12 +230,101 @@ class UserItemViewSet(viewsets.ModelViewSet):
 
         serializer = ItemMintSerializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
-        serializer.mint_tokens(instance, serializer.validated_data)
-
+        with transaction.atomic():
+            job = serializer.create_mint_job(instance, request.user)
+            if job.total > settings.MINT_SYNC_EDITIONS:
+                # Large mints run in the background; clients poll the job for its progress.
+                defer(run_mint_job, job.pk)
+                return Response(MintJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+            run_mint_job(job.pk)
+
+        instance = self.get_queryset().get(pk=instance.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class MintJobView(generics.RetrieveAPIView):
+    """
+    Progress of a background mint started by POST me/items/<pk>/mint/.
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = MintJobSerializer
+    queryset = MintJob.objects.all()
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user)
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable uploads of an item's file1 or additional files. Create a session, request the
+    part URLs, PUT each part to its URL and complete the session with the parts' ETags.
+    Retrieving a session lists the parts already uploaded, so an interrupted upload resumes
+    with the missing ones.
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user)
+
+    def get_open_session(self, lock=False):
+        session = self.get_object()
+        if lock:
+            session = self.get_queryset().select_for_update().get(pk=session.pk)
+        if session.status != UploadStatus.OPEN.value:
+            raise Http404
+        return session
+
+    def retrieve(self, request, *args, **kwargs):
+        session = self.get_object()
+        data = self.get_serializer(session).data
+        parts = get_uploads().uploaded_parts(session) if session.status == UploadStatus.OPEN.value else {}
+        data["parts"] = [{"part_number": number, **parts[number]} for number in sorted(parts)]
+        return Response(data)
+
+    def destroy(self, request, *args, **kwargs):
+        abort_upload(self.get_open_session())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["post"])
+    def urls(self, request, *args, **kwargs):
+        session = self.get_open_session()
+        serializer = UploadPartsSerializer(data=request.data, context={"session": session})
+        serializer.is_valid(raise_exception=True)
+        uploads = get_uploads()
+        return Response(
+            {
+                "urls": {
+                    number: uploads.part_url(request, session, number)
+                    for number in serializer.validated_data["part_numbers"]
+                }
+            }
+        )
+
+    @action(detail=True, methods=["put"])
+    def part(self, request, part_number, *args, **kwargs):
+        uploads = get_uploads()
+        session = self.get_open_session()
+        if not isinstance(uploads, LocalUploads) or not 1 <= part_number <= session.part_count:
+            raise Http404
+        etag = uploads.save_part(session, part_number, request.stream)
+        return Response({"part_number": part_number, "etag": etag}, headers={"ETag": f'"{etag}"'})
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, *args, **kwargs):
+        serializer = UploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            session = self.get_open_session(lock=True)
+            complete_upload(session, serializer.validated_data["parts"])
+        item = Item.objects.with_details(request.user).get(pk=session.item_id)
+        return Response(ItemSerializer(item, context=self.get_serializer_context()).data)
+
+
 class SubscriberView(views.APIView):
     def post(self, request):
         serializer = SubscriberSerializer(data=request.data)
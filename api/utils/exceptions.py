@@ -0,0 +1,28 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class Contention(APIException):
+    """
+    Raised when a row needed by the request is locked by a concurrent request.
+
+    The client can safely retry after the `Retry-After` header's delay.
+    """
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This resource is being updated by another request. Please try again."
+    default_code = "contention"
+
+    def __init__(self, detail=None, code=None, wait=1):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class QueryTimeout(APIException):
+    """
+    Raised when a query runs past the statement timeout of its endpoint.
+    """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "This request took too long. Please try again."
+    default_code = "query_timeout"
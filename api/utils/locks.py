@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from psycopg2.errorcodes import LOCK_NOT_AVAILABLE
+
+from .exceptions import Contention
+
+
+@contextmanager
+def lock_timeout(milliseconds, using=DEFAULT_DB_ALIAS):
+    """
+    Bounds how long row locks taken in the current transaction may wait.
+
+    Lock waits longer than `milliseconds` abort the statement and are raised as
+    Contention, so a hot row turns into a fast retriable error instead of a
+    queue of blocked workers. Must be used inside transaction.atomic().
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("SET LOCAL lock_timeout = %s", [f"{int(milliseconds)}ms"])
+    try:
+        yield
+    except OperationalError as error:
+        if getattr(error.__cause__, "pgcode", None) == LOCK_NOT_AVAILABLE:
+            raise Contention() from error
+        raise
@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from functools import reduce
+
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks past the last row of the previous page.
+
+    The queryset's own ordering is used as the keyset, with the primary key
+    appended as a unique tiebreaker, so any `sort_by` ordering pages stably
+    and no count query is run.
+    """
+
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    offset_query_param = "offset"
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = 100
+    default_ordering = ("id",)
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.ordering = self.get_ordering(queryset, view)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset_filter(position))
+            except (TypeError, ValueError, ValidationError):
+                # A cursor whose values do not fit the columns of the ordering was not issued here.
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset.order_by(*self.ordering)[: self.limit + 1])
+        self.has_next = len(results) > self.limit
+        self.page = results[: self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([("next", self.get_next_link()), ("results", data)]))
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(request.query_params[self.limit_query_param], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_ordering(self, queryset, view):
+        ordering = [str(field) for field in queryset.query.order_by if isinstance(field, str)]
+        if not ordering:
+            ordering = list(getattr(view, "keyset_ordering", self.default_ordering))
+
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            descending = ordering[-1].startswith("-")
+            ordering.append("-id" if descending else "id")
+        return ordering
+
+    def get_keyset_filter(self, position):
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        clauses = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {f.lstrip("-"): value for f, value in zip(self.ordering[:index], position[:index])}
+            clauses.append(Q(**equal) & Q(**{f"{name}__{lookup}": position[index]}))
+        return reduce(lambda left, right: left | right, clauses)
+
+    def get_position(self, instance):
+        return [self.get_field_value(instance, field.lstrip("-")) for field in self.ordering]
+
+    def get_field_value(self, instance, path):
+        *relations, name = path.split("__")
+        for relation in relations:
+            try:
+                instance = getattr(instance, relation)
+            except ObjectDoesNotExist:
+                return None
+        field = next((f for f in instance._meta.concrete_fields if f.name == name), None)
+        if field is not None:
+            return getattr(instance, field.attname)
+        return getattr(instance, name)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param, "")
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(json.dumps(position, default=str).encode("utf-8")).decode("ascii")
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+
+class CursorOrOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination that switches to keyset pagination when a `cursor`
+    query parameter is sent (empty for the first page).
+
+    Keeps the old `count`/`offset` responses available for existing clients.
+    """
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,28 @@
+from django.db import connections, router
+
+
+def update_returning(queryset, **changes):
+    """
+    Applies `changes` to the rows of `queryset`, honouring its ordering and slice, in one
+    UPDATE that locks the rows as it selects them. Must be used inside transaction.atomic().
+
+    returns: The primary keys of the updated rows.
+    rtype: list
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+
+    rows = queryset.using(using).select_for_update(of=("self",)).values("pk")
+    select_sql, select_params = rows.query.get_compiler(using).as_sql()
+    fields = [model._meta.get_field(name) for name in changes]
+    assignments = ", ".join(f"{quote(field.column)} = %s" for field in fields)
+    values = [field.get_db_prep_save(changes[field.name], connection) for field in fields]
+    pk = quote(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {pk} IN ({select_sql}) RETURNING {pk}",
+            [*values, *select_params],
+        )
+        return [row[0] for row in cursor.fetchall()]
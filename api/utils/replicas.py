@@ -0,0 +1,156 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Alias the current request reads from; None reads from the primary.
+_read_alias = ContextVar("read_alias", default=None)
+
+# Seconds the replica's replay is behind the primary. A replica that has replayed all
+# the WAL it received is current even if the primary has been idle since the last commit.
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def _in_transaction():
+    # Reads inside a transaction must see its writes.
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+class ReplicaRouter:
+    """
+    Routes reads to the replica picked for the current request and everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or _in_transaction():
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def replica_lag(alias):
+    """
+    Measures how far a replica's replay is behind the primary.
+
+    returns: The lag in seconds, or None when the replica is unreachable or hasn't replayed anything yet.
+    rtype: float
+    """
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(REPLICA_LAG_SQL)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        connections[alias].close()
+        return None
+    return None if lag is None else float(lag)
+
+
+def is_replica_fresh(alias):
+    """
+    Whether a replica is reachable and at most REPLICA_MAX_LAG_SECONDS behind the primary.
+    The lag is measured at most once every REPLICA_LAG_CHECK_SECONDS.
+
+    rtype: bool
+    """
+    key = f"replica-lag:{alias}"
+    lag = cache.get(key)
+    if lag is None:
+        lag = replica_lag(alias)
+        lag = float("inf") if lag is None else lag
+        cache.set(key, lag, timeout=settings.REPLICA_LAG_CHECK_SECONDS)
+    return lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+
+def _pin_key(user_id):
+    return f"pin-primary:{user_id}"
+
+
+def pin_to_primary(user):
+    """
+    Reads the user's requests from the primary for the next REPLICA_PIN_SECONDS.
+    """
+    cache.set(_pin_key(user.pk), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return user.is_authenticated and cache.get(_pin_key(user.pk), False)
+
+
+def replica_for(request):
+    """
+    Picks the replica a request reads from.
+
+    returns: A fresh replica's alias, or None when the request reads from the primary.
+    rtype: str
+    """
+    if not settings.REPLICA_DATABASES or _in_transaction() or is_pinned_to_primary(request.user):
+        return None
+    replicas = random.sample(settings.REPLICA_DATABASES, len(settings.REPLICA_DATABASES))
+    return next((alias for alias in replicas if is_replica_fresh(alias)), None)
+
+
+@contextmanager
+def reads_from(alias):
+    """
+    Routes the reads in the block to the database `alias`, or to the primary when it is None.
+    """
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_from_replica(view_method):
+    """
+    Serves safe requests to a view method from a read replica.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return view_method(self, request, *args, **kwargs)
+        with reads_from(replica_for(request)):
+            return view_method(self, request, *args, **kwargs)
+
+    return wrapper
+
+
+class PinPrimaryAfterWriteMiddleware:
+    """
+    Pins a user to the primary after a successful write (bid, purchase, mint, like...),
+    so their next reads see it while the replicas catch up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            settings.REPLICA_DATABASES
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and request.user.is_authenticated
+        ):
+            pin_to_primary(request.user)
+        return response
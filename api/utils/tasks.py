@@ -0,0 +1,35 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix="background")
+    return _executor
+
+
+def _run(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(function, "__name__", function))
+    finally:
+        # Worker threads hold their own connections; don't leave them open between tasks.
+        connections.close_all()
+
+
+def defer(function, *args):
+    """
+    Runs `function(*args)` on a background thread once the current transaction commits,
+    so the task sees the committed rows and the request doesn't wait for it.
+    """
+    transaction.on_commit(partial(_get_executor().submit, _run, function, *args))
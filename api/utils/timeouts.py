@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from psycopg2.errorcodes import QUERY_CANCELED
+
+from .exceptions import QueryTimeout
+
+
+@contextmanager
+def statement_timeout(milliseconds, using=DEFAULT_DB_ALIAS):
+    """
+    Bounds how long each statement in the current transaction may run.
+
+    Statements running longer than `milliseconds` are cancelled and raised as
+    QueryTimeout, so a slow lookup can't hold a worker past its latency budget.
+    Must be used inside transaction.atomic().
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("SET LOCAL statement_timeout = %s", [f"{int(milliseconds)}ms"])
+    try:
+        yield
+    except OperationalError as error:
+        if getattr(error.__cause__, "pgcode", None) == QUERY_CANCELED:
+            raise QueryTimeout() from error
+        raise